@@ -23,7 +23,7 @@ def classFactory(iface):  # pylint: disable=invalid-name
 
  
 
-import importlib, warnings
+import importlib.util, warnings
  
 def check_package(package_name):
     spec = importlib.util.find_spec(package_name)
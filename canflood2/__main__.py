@@ -0,0 +1,9 @@
+'''
+headless batch runner. see cli.py
+
+    python -m canflood2 path/to/project.canflood2
+'''
+import sys
+from .cli import main
+
+sys.exit(main())
@@ -18,11 +18,11 @@ from pandas.testing import assert_series_equal, assert_frame_equal
 from .hp.assertions import assert_intersection, assert_series_match, assert_sqlite_table_exists
 
 from .db_tools import (
-    sql_to_df, assert_df_template_match,
+    sql_to_df, assert_df_template_match, get_expos_store_refs_d, get_projDB_conn,
     )
     
 from .parameters import (
-    project_db_schema_d, hazDB_schema_d, projDB_schema_modelTables_d,
+    project_db_schema_d, hazDB_schema_d, projDB_schema_modelTables_d, projDB_optional_tables_l,
  
     )
 
@@ -59,7 +59,7 @@ def assert_projDB_fp(fp, **kwargs):
     assert fp.endswith('.canflood2')
     
     try:
-        with sqlite3.connect(fp) as conn:
+        with get_projDB_conn(fp) as conn:
             assert_projDB_conn(conn, **kwargs)
     
     except Exception as e:
@@ -70,7 +70,7 @@ def assert_projDB_fp(fp, **kwargs):
  
 
 def assert_projDB_conn(conn,
-                   expected_tables=list(project_db_schema_d.keys()),
+                   expected_tables=[k for k in project_db_schema_d.keys() if not k in projDB_optional_tables_l],
                    check_consistency=False,
                    ):
  
@@ -81,7 +81,7 @@ def assert_projDB_conn(conn,
     df_d = dict()
     missing_tables = []
     for table_name in expected_tables:
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view') AND name=?", (table_name,))
         if not cursor.fetchone():
             missing_tables.append(table_name)
             
@@ -136,6 +136,11 @@ def assert_projDB_conn(conn,
             if not set(model_table_names).issubset(tables_dx.values.flatten()):
                 raise AssertionError(f'orphaned model tables: {set(model_table_names) - set(tables_dx.values.flatten())}')
             
+        #shared exposures without a model view (see db_tools.drop_unreferenced_expos)
+        orphan_l = [k for k, v in get_expos_store_refs_d(conn).items() if len(v)==0]
+        if len(orphan_l)>0:
+            raise AssertionError(f'orphaned exposure store tables: {orphan_l}')
+            
             
         #=======================================================================
         # vfuncs
@@ -203,7 +208,7 @@ def assert_hazDB_conn(conn,expected_tables=list(hazDB_schema_d.keys())):
 
     missing_tables = []
     for table_name in expected_tables:
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view') AND name=?", (table_name,))
         if not cursor.fetchone():
             missing_tables.append(table_name)
 
@@ -0,0 +1,434 @@
+'''
+Created on Oct 18, 2026
+
+@author: cef
+
+synthetic scaling benchmarks for the core engine (no QGIS layers or tutorial data)
+
+builds project databases directly from the parameters schemas, times each run stage (see core.Run_profiler),
+    and compares the results against a stored baseline
+
+usage:
+    python -m canflood2.bench
+    python -m canflood2.bench --assets 1000 10000 100000 1000000 --events 4 16 --levels L1 L2
+    python -m canflood2.bench --save-baseline  #store this machine's results for later comparisons
+    python -m canflood2.bench --plot --trace-memory --repeats 1
+
+exit codes:
+    0: all cases ran (and none were slower than the baseline)
+    1: one or more cases were slower than the baseline
+    2: bad arguments
+'''
+#===============================================================================
+# IMPORTS-------------
+#===============================================================================
+import os, sys, argparse, logging, sqlite3, itertools, time
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+
+from .hp.logr import get_log_stream
+from .hp.basic import get_mp_context, get_peak_rss_mb
+from .hp.sql import close_sqlite_conns
+
+from .db_tools import df_to_sql
+from .parameters import project_db_schema_d, projDB_schema_modelTables_d, home_dir
+from .core import Model, Run_profiler, _get_proj_meta_d
+from .cli import Headless_projDB
+
+exit_codes_d = {'success':0, 'slower':1, 'bad_input':2}
+
+#case parameters {name: default}
+bench_case_d = {'asset_cnt':1000, 'event_cnt':4, 'fg_cnt':1, 'tag_cnt':10, 'level':'L2'}
+
+bench_dir = os.path.join(home_dir, 'bench')
+
+#===============================================================================
+# builders------------------
+#===============================================================================
+def build_projDB(fp, asset_cnt=1000, event_cnt=4, fg_cnt=1, tag_cnt=10, level='L2',
+                 seed=0, logger=None):
+    """build a project database with a single ready model (c1_0) from random data
+
+    depths are mostly within the vfunc range with ~5% dry assets on the frequent events
+
+    Parameters
+    ----------
+    asset_cnt: int
+        number of assets (table_finv has asset_cnt x fg_cnt rows)
+    event_cnt: int
+        number of hazard events (ARIs from 2 to 1000 years)
+    fg_cnt: int
+        number of function groups per asset
+    tag_cnt: int
+        number of vfuncs (L2 only)
+    level: str
+        'L1' (binary impacts: (depth>0) x scale, then capped) or 'L2' (vfuncs)
+
+    Returns
+    -------
+    Model
+        on a Headless_projDB parent
+    """
+    if logger is None: logger = get_log_stream(name='canflood2')
+    log = logger.getChild('build_projDB')
+
+    assert level in ['L1', 'L2'], f'bad level: {level}'
+    assert event_cnt>1, 'need at least 2 events'
+
+    rng = np.random.default_rng(seed)
+
+    if os.path.exists(fp):
+        close_sqlite_conns(fp)
+        os.remove(fp)
+
+    #===========================================================================
+    # project tables
+    #===========================================================================
+    df_d = {k:v.copy() for k, v in project_db_schema_d.items() if not v is None}
+
+    d = _get_proj_meta_d(log)
+    d.update(dict(function_name='build_projDB', misc='synthetic benchmark'))
+    df_d['01_project_meta'] = pd.DataFrame(d)
+
+    #hazard events (ARIs)
+    df = df_d['04_haz_meta']
+    df.loc[df['varName']=='probability_type', 'value'] = '1'
+
+    ari_ar = np.geomspace(2, 1000, event_cnt)
+    df_d['05_haz_events'] = pd.DataFrame({'event_name':[f'haz_{i:04d}' for i in range(event_cnt)],
+        'prob':ari_ar, 'metadata':'synthetic', 'layer_id':'', 'layer_fp':''}
+        ).astype(df_d['05_haz_events'].dtypes.to_dict())
+
+    #vfuncs: monotonic curves from -1 to 4m
+    tag_l = [f'bench_{i:04d}' for i in range(tag_cnt)] if level=='L2' else ['L1_dummy']
+    if level=='L2':
+        df_d['06_vfunc_index'] = pd.DataFrame('synthetic', columns=df_d['06_vfunc_index'].columns,
+                                              index=pd.Index(tag_l, name='tag'))
+
+        df_l = list()
+        for tag in tag_l:
+            n = rng.integers(4, 12)
+            df_l.append(pd.DataFrame({'tag':tag,
+                'exposure':np.sort(rng.choice(np.arange(-100, 400), n, replace=False))/100.0,
+                'impact':np.sort(rng.uniform(0, 1000, n)).round(2)}))
+
+        df_d['07_vfunc_data'] = pd.concat(df_l, ignore_index=True)
+
+    log.debug(f'writing {len(df_d)} project tables to\n    {fp}')
+    with sqlite3.connect(fp) as conn:
+        for k, df in df_d.items():
+            df_to_sql(df, k, conn, if_exists='replace')
+
+    #===========================================================================
+    # model
+    #===========================================================================
+    parent = Headless_projDB(fp, logger=logger)
+    model = Model(parent=parent, category_code='c1', modelid=0, logger=logger)
+    parent.model_index_d = {'c1':{0:model}}
+
+    #parameters (see Main_dialog_modelSuite._add_model)
+    param_df = projDB_schema_modelTables_d['table_parameters'].copy()
+    for k, v in {**model.get_index_d(), 'expo_level':f'synthetic ({level})', 'finv_vlay':'synthetic',
+                 'finv_elevType':'relative', 'finv_indexField':'id', 'asset_label':'bench', 'consq_label':'bench',
+                 'ead_lowPtail':'extrapolate', 'ead_highPtail':'none'}.items():
+        param_df.loc[param_df['varName']==k, 'value'] = str(v)
+
+    with sqlite3.connect(fp) as conn:
+        df_to_sql(param_df, model.get_table_names(['table_parameters'])[0], conn, if_exists='replace',
+                  template_prefix=model.template_prefix_str)
+
+    parent.update_model_index_dx(model)
+    model.update_parameter_d()
+
+    #asset inventory
+    asset_index = pd.Index(np.arange(asset_cnt, dtype='int64')*3 + 1, name='indexField') #not a range
+    finv_index = pd.MultiIndex.from_product([asset_index, np.arange(fg_cnt, dtype='int64')],
+                                            names=['indexField', 'fg_index'])
+    n = len(finv_index)
+
+    finv_dx = pd.DataFrame({
+        'scale':rng.uniform(0.5, 3, n).round(2),
+        'elev':rng.uniform(0, 1.5, n).round(2),
+        'tag':np.repeat(rng.choice(tag_l, asset_cnt), fg_cnt),
+        'cap':np.where(rng.random(n)<0.5, np.nan, rng.uniform(100, 1500, n).round(0))},
+        index=finv_index)
+
+    #ground elevations and water surfaces (rising with the ARI)
+    gels_df = pd.DataFrame({'dem_samples':rng.uniform(-1, 1, asset_cnt).round(3)}, index=asset_index)
+
+    wse_ar = gels_df['dem_samples'].values[:, None] + rng.uniform(0, 3, asset_cnt)[:, None] + np.linspace(0, 1.5, event_cnt)[None, :]
+
+    dry_cnt_ar = np.where(rng.random(asset_cnt)<0.05, rng.integers(1, event_cnt, asset_cnt), 0)
+    wse_ar[np.arange(event_cnt)[None, :] < dry_cnt_ar[:, None]] = np.nan
+
+    expos_df = pd.DataFrame(wse_ar.round(4), index=asset_index, columns=df_d['05_haz_events']['event_name'].values)
+
+    with model.unit_of_work(logger=log):
+        model.set_tables({'table_finv':finv_dx, 'table_expos':expos_df, 'table_gels':gels_df})
+
+    log.debug(f'built {model.name} w/ {n} assets x {event_cnt} events')
+
+    return model
+
+#===============================================================================
+# runners------------------
+#===============================================================================
+def run_case(case_d, work_dir=None, trace_memory=False, keep=False):
+    """build and run a single benchmark case
+
+    Returns
+    -------
+    pd.DataFrame
+        one row per run stage (see core.Run_profiler) plus 'build' and 'total'
+    """
+    if work_dir is None: work_dir = bench_dir
+    os.makedirs(work_dir, exist_ok=True)
+    log = get_log_stream(name=f'canflood2.bench', level=logging.WARNING)
+
+    case_d = {**bench_case_d, **case_d}
+    fp = os.path.join(work_dir, 'bench_' + '_'.join([f'{v}' for v in case_d.values()]) + '.canflood2')
+
+    build_profile, run_profile = [Run_profiler(category_code='c1', modelid=0, trace_memory=trace_memory) for _ in range(2)]
+    try:
+        with build_profile.stage('build') as rec:
+            model = build_projDB(fp, **case_d, logger=log)
+            rec['rows_out'] = case_d['asset_cnt']*case_d['fg_cnt']*case_d['event_cnt']
+
+        start = time.perf_counter()
+        model.run_model(use_cache=False, profile=run_profile, logger=log)
+        wall_secs = time.perf_counter() - start
+
+    finally:
+        if not keep and os.path.exists(fp):
+            close_sqlite_conns(fp)
+            os.remove(fp)
+
+    total_d = {'stage':'total', 'wall_secs':wall_secs, 'peak_rss_mb':get_peak_rss_mb(),
+               'cpu_secs':run_profile.get_df()['cpu_secs'].sum()}
+
+    df = pd.concat([build_profile.get_df(), run_profile.get_df(), pd.DataFrame([total_d])], ignore_index=True)
+
+    return df.drop(columns=['run_id', 'category_code', 'modelid', 'version']).assign(**case_d)
+
+
+def run_suite(case_l, work_dir=None, repeats=1, isolate=True, trace_memory=False, logger=None):
+    """run the benchmark cases
+
+    Parameters
+    ----------
+    repeats: int
+        runs of each case. the fastest run of each stage is kept
+    isolate: bool
+        run each case in a fresh process (so peak_rss_mb and the in-memory caches are not carried between runs)
+
+    Returns
+    -------
+    pd.DataFrame
+        run_case() results
+    """
+    if logger is None: logger = get_log_stream(name='canflood2')
+    log = logger.getChild('run_suite')
+
+    df_l = list()
+    for i, case_d in enumerate(case_l):
+        log.info(f'({i+1}/{len(case_l)}) {case_d}')
+
+        run_df_l = list()
+        for _ in range(repeats):
+            if isolate:
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_mp_context()) as pool:
+                    run_df_l.append(pool.submit(run_case, case_d, work_dir=work_dir, trace_memory=trace_memory).result())
+            else:
+                run_df_l.append(run_case(case_d, work_dir=work_dir, trace_memory=trace_memory))
+
+        df = pd.concat(run_df_l, ignore_index=True)
+        df = df.loc[df.groupby('stage', sort=False)['wall_secs'].idxmin()].reset_index(drop=True)
+
+        log.info(f'    finished in %.2f secs'%df.loc[df['stage']=='total', 'wall_secs'].iloc[0])
+        df_l.append(df)
+
+    return pd.concat(df_l, ignore_index=True)
+
+
+def get_case_l(**kwargs):
+    """cartesian product of the case parameters {name: list of values}"""
+    d = {k:kwargs.get(k, [v]) for k, v in bench_case_d.items()}
+    return [dict(zip(d.keys(), t)) for t in itertools.product(*d.values())]
+
+#===============================================================================
+# analysis------------------
+#===============================================================================
+def get_scaling_df(df, size='asset_cnt'):
+    """log-log slope of the wall time (and memory) versus size for each stage
+
+    ~1: linear scaling. only groups with 2+ sizes are returned
+    """
+    group_l = [k for k in bench_case_d.keys() if not k==size] + ['stage']
+
+    d = dict()
+    for keys, gdf in df.groupby(group_l):
+        gdf = gdf.loc[gdf['wall_secs']>0]
+        if gdf[size].nunique()<2:
+            continue
+
+        x = np.log(gdf[size].astype(float))
+        d[keys] = {'wall_secs_exp':np.polyfit(x, np.log(gdf['wall_secs']), 1)[0],
+                   'peak_rss_mb_exp':np.polyfit(x, np.log(gdf['peak_rss_mb']), 1)[0],
+                   'size_min':gdf[size].min(), 'size_max':gdf[size].max()}
+
+    return pd.DataFrame.from_dict(d, orient='index').rename_axis(group_l)
+
+
+def compare_baseline(df, baseline_df, tolerance=1.25, min_secs=0.05):
+    """wall time ratio against the baseline for each case and stage
+
+    stages faster than min_secs (in both) are too noisy to flag
+
+    Returns
+    -------
+    pd.DataFrame
+        wall_secs, wall_secs_baseline, ratio, and slower for the matching cases
+    """
+    keys_l = list(bench_case_d.keys()) + ['stage']
+
+    df = df.merge(baseline_df.loc[:, keys_l + ['wall_secs']].astype(df.loc[:, keys_l].dtypes.to_dict()),
+                  on=keys_l, how='inner', suffixes=('', '_baseline')).set_index(keys_l)
+
+    df['ratio'] = df['wall_secs']/df['wall_secs_baseline']
+    df['slower'] = (df['ratio']>tolerance) & (df[['wall_secs', 'wall_secs_baseline']].max(axis=1)>min_secs)
+
+    return df.loc[:, ['wall_secs', 'wall_secs_baseline', 'ratio', 'slower']]
+
+
+def plot_scaling(df, ofp, size='asset_cnt'):
+    """time and memory versus size (one line per stage) for each case group"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    group_l = [k for k in bench_case_d.keys() if not k==size]
+
+    grouped = list(df.groupby(group_l))
+    fig, ax_ar = plt.subplots(2, len(grouped), figsize=(5*len(grouped), 8), squeeze=False)
+
+    for j, (keys, gdf) in enumerate(grouped):
+        for stage, sdf in gdf.groupby('stage', sort=False):
+            sdf = sdf.sort_values(size)
+            ax_ar[0, j].plot(sdf[size], sdf['wall_secs'], marker='o', label=stage)
+            ax_ar[1, j].plot(sdf[size], sdf['peak_rss_mb'], marker='o', label=stage)
+
+        ax_ar[0, j].set_title(', '.join([f'{k}={v}' for k, v in zip(group_l, keys)]), fontsize=8)
+        ax_ar[0, j].set_ylabel('wall time (secs)')
+        ax_ar[1, j].set_ylabel('peak RSS (MB)')
+        ax_ar[1, j].set_xlabel(size)
+        for ax in ax_ar[:, j]:
+            ax.set_xscale('log')
+            ax.set_yscale('log')
+
+    ax_ar[0, 0].legend(fontsize=8)
+
+    fig.savefig(ofp, dpi=100)
+    plt.close(fig)
+
+    return ofp
+
+#===============================================================================
+# main------------------
+#===============================================================================
+def get_parser():
+    parser = argparse.ArgumentParser(prog='canflood2.bench',
+                                     description='synthetic scaling benchmarks for the CanFlood2 core engine')
+    parser.add_argument('-a', '--assets', nargs='+', type=int, default=[1000, 10000, 100000],
+                        help='asset counts. default: 1000 10000 100000')
+    parser.add_argument('-e', '--events', nargs='+', type=int, default=[bench_case_d['event_cnt']],
+                        help='hazard event counts')
+    parser.add_argument('--fgs', nargs='+', type=int, default=[bench_case_d['fg_cnt']],
+                        help='function groups per asset')
+    parser.add_argument('--tags', nargs='+', type=int, default=[bench_case_d['tag_cnt']],
+                        help='vfunc counts (L2)')
+    parser.add_argument('--levels', nargs='+', default=[bench_case_d['level']], choices=['L1', 'L2'])
+    parser.add_argument('-r', '--repeats', type=int, default=3,
+                        help='runs of each case (the fastest of each stage is kept). default: 3')
+    parser.add_argument('-o', '--out-dir', default=bench_dir,
+                        help=f'results directory. default: {bench_dir}')
+    parser.add_argument('-b', '--baseline', default=None,
+                        help='baseline results (.csv). default: baseline.csv in the results directory')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='write these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help='flag stages slower than the baseline by this ratio. default: 1.25')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='also record the exact peak allocation of each stage (slow)')
+    parser.add_argument('--no-isolate', action='store_true',
+                        help='run all cases in this process')
+    parser.add_argument('--plot', action='store_true',
+                        help='write the scaling curves (.png)')
+    parser.add_argument('-l', '--log-level', default='INFO',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    return parser
+
+
+def main(argv=None):
+    """console entry point. returns the exit code"""
+    args = get_parser().parse_args(argv)
+
+    log = get_log_stream(name='canflood2', level=getattr(logging, args.log_level))
+
+    if min(args.assets + args.events + args.fgs + args.tags + [args.repeats])<1 or min(args.events)<2:
+        log.error(f'counts must be positive (and 2+ events)')
+        return exit_codes_d['bad_input']
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    baseline_fp = args.baseline if not args.baseline is None else os.path.join(args.out_dir, 'baseline.csv')
+
+    #===========================================================================
+    # run
+    #===========================================================================
+    case_l = get_case_l(asset_cnt=args.assets, event_cnt=args.events, fg_cnt=args.fgs, tag_cnt=args.tags,
+                        level=args.levels)
+
+    df = run_suite(case_l, work_dir=args.out_dir, repeats=args.repeats, isolate=not args.no_isolate,
+                   trace_memory=args.trace_memory, logger=log)
+
+    ofp = os.path.join(args.out_dir, f'bench_{datetime.now().strftime("%Y%m%d-%H%M%S")}.csv')
+    df.to_csv(ofp, index=False)
+    log.info(f'wrote {len(df)} results to\n    {ofp}')
+
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        log.info(f'wall time (secs)\n{df.pivot_table(index=list(bench_case_d.keys()), columns="stage", values="wall_secs", sort=False)}')
+
+        scaling_df = get_scaling_df(df)
+        if len(scaling_df)>0:
+            log.info(f'scaling exponents\n{scaling_df}')
+
+    if args.plot:
+        log.info(f'wrote scaling curves to\n    {plot_scaling(df, ofp.replace(".csv", ".png"))}')
+
+    #===========================================================================
+    # baseline
+    #===========================================================================
+    result = exit_codes_d['success']
+    if args.save_baseline:
+        df.to_csv(baseline_fp, index=False)
+        log.info(f'saved baseline to\n    {baseline_fp}')
+
+    elif os.path.exists(baseline_fp):
+        cdf = compare_baseline(df, pd.read_csv(baseline_fp), tolerance=args.tolerance)
+
+        with pd.option_context('display.max_columns', None, 'display.width', 200):
+            log.info(f'compared {len(cdf)} stages to the baseline\n{cdf}')
+
+        if cdf['slower'].any():
+            log.warning(f'{cdf["slower"].sum()} stages slower than the baseline by >{args.tolerance}x')
+            result = exit_codes_d['slower']
+    else:
+        log.info(f'no baseline found at {baseline_fp} (see --save-baseline)')
+
+    return result
+
+
+if __name__ == '__main__':
+    sys.exit(main())
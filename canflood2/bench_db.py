@@ -0,0 +1,272 @@
+'''
+Created on Oct 18, 2026
+
+@author: cef
+
+micro-benchmarks for the projDB persistence layer (db_tools.df_to_sql and db_tools.sql_to_df)
+
+splits the time of each call into:
+    validation: template lookups, nan and duplicate scans (db_tools._get_write_params, _get_read_params)
+    sqlite: time inside the sqlite3 module (execute, fetch, and commit. includes the table_info pragmas)
+    conversion: the remainder (pandas to_sql/read_sql framing, dtype and index rebuilds, wide encodings)
+
+usage:
+    python -m canflood2.bench_db
+    python -m canflood2.bench_db --assets 1000 100000 --events 8 --repeats 5
+'''
+#===============================================================================
+# IMPORTS-------------
+#===============================================================================
+import os, sys, argparse, logging, sqlite3, tempfile, shutil, time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+import numpy as np
+
+from .hp.logr import get_log_stream
+from .hp.sql import close_sqlite_conns
+
+from .db_tools import df_to_sql, sql_to_df, _get_write_params, _get_read_params
+from .bench import build_projDB, bench_dir
+
+#tables to benchmark {label: (model table, impacts_storage)}
+bench_db_tables_d = {
+    'table_parameters':('table_parameters', None), #small
+    'table_finv':('table_finv', None), #multiindex
+    'table_expos':('table_expos', None), #wide
+    'table_impacts':('table_impacts', 'long'), #long (the largest table)
+    'table_impacts (wide)':('table_impacts', 'wide'),
+    }
+
+#===============================================================================
+# classes------------------
+#===============================================================================
+class Timed_cursor(sqlite3.Cursor):
+    """cursor that adds the time spent in sqlite to its connection's sqlite_secs"""
+
+    def execute(self, *args, **kwargs):
+        with self.connection._timer():
+            return super().execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        with self.connection._timer():
+            return super().executemany(*args, **kwargs)
+
+    def fetchone(self):
+        with self.connection._timer():
+            return super().fetchone()
+
+    def fetchmany(self, *args, **kwargs):
+        with self.connection._timer():
+            return super().fetchmany(*args, **kwargs)
+
+    def fetchall(self):
+        with self.connection._timer():
+            return super().fetchall()
+
+
+class Timed_connection(sqlite3.Connection):
+    """sqlite3 connection that accumulates the time spent in sqlite
+
+    usage: sqlite3.connect(fp, factory=Timed_connection)
+    """
+    sqlite_secs = 0.0
+
+    @contextmanager
+    def _timer(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sqlite_secs += time.perf_counter() - start
+
+    def cursor(self, factory=Timed_cursor):
+        return super().cursor(factory)
+
+    def execute(self, *args, **kwargs):
+        return self.cursor().execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        return self.cursor().executemany(*args, **kwargs)
+
+    def commit(self):
+        with self._timer():
+            return super().commit()
+
+#===============================================================================
+# runners------------------
+#===============================================================================
+def get_model_tables_d(work_dir, asset_cnt=1000, event_cnt=4, fg_cnt=1, level='L2', logger=None):
+    """model tables of a synthetic model (see bench.build_projDB) {label: (table_name, template_prefix, df)}"""
+    fp = os.path.join(work_dir, f'bench_db_{asset_cnt}.canflood2')
+
+    model = build_projDB(fp, asset_cnt=asset_cnt, event_cnt=event_cnt, fg_cnt=fg_cnt, level=level, logger=logger)
+    model.run_model(use_cache=False, profile=False, logger=logger)
+
+    df_d = model.get_tables(list({v[0] for v in bench_db_tables_d.values()}), result_as_dict=True)
+
+    close_sqlite_conns(fp)
+    os.remove(fp)
+
+    return {label:(model.get_table_names([k])[0], model.template_prefix_str, df_d[k])
+            for label, (k, _) in bench_db_tables_d.items()}
+
+
+def _fresh(df):
+    """copy w/ a new index (pandas caches has_duplicates on the index)"""
+    return df.set_axis(df.index.copy(deep=True), axis=0)
+
+
+def time_table(df, table_name, fp, template_prefix=None, impacts_storage=None):
+    """time one write (df_to_sql + commit) and one read (sql_to_df) of the table
+
+    Returns
+    -------
+    dict
+        {op: {total_secs, validation_secs, sqlite_secs, conversion_secs}}
+    """
+    if os.path.exists(fp):
+        os.remove(fp)
+
+    res_d = dict()
+    #===========================================================================
+    # write
+    #===========================================================================
+    with sqlite3.connect(fp, factory=Timed_connection) as conn:
+        start = time.perf_counter()
+        _get_write_params(_fresh(df), table_name, template_prefix=template_prefix)
+        validation_secs = time.perf_counter() - start
+
+        data_df = _fresh(df)
+        conn.sqlite_secs = 0.0
+        start = time.perf_counter()
+        df_to_sql(data_df, table_name, conn, template_prefix=template_prefix, impacts_storage=impacts_storage)
+        conn.commit()
+
+        res_d['write'] = {'total_secs':time.perf_counter() - start, 'validation_secs':validation_secs,
+                          'sqlite_secs':conn.sqlite_secs}
+    conn.close()
+
+    #===========================================================================
+    # read
+    #===========================================================================
+    with sqlite3.connect(fp, factory=Timed_connection) as conn:
+        start = time.perf_counter()
+        _get_read_params(table_name, conn, template_prefix=template_prefix)
+        validation_secs = time.perf_counter() - start - conn.sqlite_secs #pragmas are counted as sqlite
+
+        conn.sqlite_secs = 0.0
+        start = time.perf_counter()
+        sql_to_df(table_name, conn, template_prefix=template_prefix)
+
+        res_d['read'] = {'total_secs':time.perf_counter() - start, 'validation_secs':validation_secs,
+                         'sqlite_secs':conn.sqlite_secs}
+    conn.close()
+
+    os.remove(fp)
+
+    for d in res_d.values():
+        d['conversion_secs'] = d['total_secs'] - d['validation_secs'] - d['sqlite_secs']
+
+    return res_d
+
+
+def run_bench_db(asset_cnt_l=[1000, 10000, 100000], event_cnt=4, fg_cnt=1, repeats=3, work_dir=None,
+                 logger=None):
+    """time df_to_sql and sql_to_df on each table of bench_db_tables_d
+
+    the fastest of the repeats is kept (for each component)
+
+    Returns
+    -------
+    pd.DataFrame
+        one row per asset count, table, and operation
+    """
+    if logger is None: logger = get_log_stream(name='canflood2')
+    log = logger.getChild('run_bench_db')
+
+    if work_dir is None: work_dir = bench_dir
+    os.makedirs(work_dir, exist_ok=True)
+    temp_dir = tempfile.mkdtemp(dir=work_dir)
+
+    quiet_log = log.getChild('model')
+    quiet_log.setLevel(logging.WARNING)
+
+    rec_l = list()
+    try:
+        for asset_cnt in asset_cnt_l:
+            log.info(f'building tables for {asset_cnt} assets')
+            tables_d = get_model_tables_d(temp_dir, asset_cnt=asset_cnt, event_cnt=event_cnt, fg_cnt=fg_cnt,
+                                          logger=quiet_log)
+
+            for label, (table_name, template_prefix, df) in tables_d.items():
+                impacts_storage = bench_db_tables_d[label][1]
+
+                res_l = [time_table(df, table_name, os.path.join(temp_dir, 'bench_db.sqlite'),
+                                    template_prefix=template_prefix, impacts_storage=impacts_storage)
+                         for _ in range(repeats)]
+
+                for op in res_l[0].keys():
+                    d = pd.DataFrame([res_d[op] for res_d in res_l]).min().to_dict()
+                    d['conversion_secs'] = max(d['total_secs'] - d['validation_secs'] - d['sqlite_secs'], 0.0)
+
+                    rec_l.append({'asset_cnt':asset_cnt, 'table':label, 'op':op, 'rows':len(df),
+                                  'columns':len(df.columns), **d, 'rows_per_sec':len(df)/d['total_secs']})
+
+                log.debug(f'{label} {rec_l[-2:]}')
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    df = pd.DataFrame(rec_l)
+
+    #shares of the total
+    for k in ['validation', 'sqlite', 'conversion']:
+        df[f'{k}_frac'] = df[f'{k}_secs']/df['total_secs']
+
+    return df.set_index(['asset_cnt', 'table', 'op'])
+
+#===============================================================================
+# main------------------
+#===============================================================================
+def get_parser():
+    parser = argparse.ArgumentParser(prog='canflood2.bench_db',
+                                     description='micro-benchmarks for the CanFlood2 projDB reads and writes')
+    parser.add_argument('-a', '--assets', nargs='+', type=int, default=[1000, 10000, 100000],
+                        help='asset counts. default: 1000 10000 100000')
+    parser.add_argument('-e', '--events', type=int, default=4, help='hazard events. default: 4')
+    parser.add_argument('--fgs', type=int, default=1, help='function groups per asset. default: 1')
+    parser.add_argument('-r', '--repeats', type=int, default=3,
+                        help='runs of each read and write (the fastest is kept). default: 3')
+    parser.add_argument('-o', '--out-dir', default=bench_dir,
+                        help=f'results directory. default: {bench_dir}')
+    parser.add_argument('-l', '--log-level', default='INFO',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    return parser
+
+
+def main(argv=None):
+    """console entry point. returns the exit code"""
+    args = get_parser().parse_args(argv)
+
+    log = get_log_stream(name='canflood2', level=getattr(logging, args.log_level))
+
+    if min(args.assets + [args.fgs, args.repeats])<1 or args.events<2:
+        log.error(f'counts must be positive (and 2+ events)')
+        return 2
+
+    df = run_bench_db(asset_cnt_l=args.assets, event_cnt=args.events, fg_cnt=args.fgs, repeats=args.repeats,
+                      work_dir=args.out_dir, logger=log)
+
+    ofp = os.path.join(args.out_dir, f'bench_db_{datetime.now().strftime("%Y%m%d-%H%M%S")}.csv')
+    df.to_csv(ofp)
+    log.info(f'wrote {len(df)} results to\n    {ofp}')
+
+    with pd.option_context('display.max_columns', None, 'display.width', 200, 'display.precision', 4):
+        log.info(f'summary\n{df.drop(columns=["validation_secs", "sqlite_secs", "conversion_secs"])}')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
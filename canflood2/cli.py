@@ -0,0 +1,343 @@
+'''
+Created on Oct 18, 2026
+
+@author: cef
+
+headless batch runner for project databases (no Qt dialogs)
+
+usage:
+    python -m canflood2 path/to/project.canflood2
+    python -m canflood2 path/to/project.canflood2 --models c1_0 c2_1 --log-level DEBUG
+    python -m canflood2 path/to/project.canflood2 --workers 8
+    python -m canflood2 path/to/project.canflood2 --max-memory-mb 2000  #very large inventories
+    python -m canflood2 path/to/project.canflood2 --force  #recompute unchanged models too
+
+exit codes:
+    0: all requested models ran
+    1: one or more models failed
+    2: bad arguments or project database
+'''
+#===============================================================================
+# IMPORTS-------------
+#===============================================================================
+import os, sys, argparse, logging, queue
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+import numpy as np
+
+from .hp.logr import get_log_stream
+from .hp.basic import get_mp_context
+
+from .projDB import Main_dialog_projDB
+from .core import Model, Model_table_assertions, Run_profiler
+from .assertions import assert_projDB_fp
+
+exit_codes_d = {'success':0, 'model_failed':1, 'bad_input':2}
+
+#===============================================================================
+# classes------------------
+#===============================================================================
+class Headless_projDB(Main_dialog_projDB, Model_table_assertions):
+    """parent for Models without the Main_dialog
+
+    see also tests.test_03_core.Main_dialog_emulator"""
+
+    def __init__(self, projDB_fp, read_only=False, logger=None):
+        if logger is None: logger = get_log_stream(name='canflood2')
+        assert_projDB_fp(projDB_fp, check_consistency=True)
+
+        self.projDB_fp = projDB_fp
+        self.projDB_read_only = read_only
+        self.logger = logger
+        self.model_index_d = dict()
+
+        self.logger.debug(f'Headless_projDB initiated on \n    {projDB_fp}')
+
+    def get_projDB_fp(self):
+        """override the parent method (no lineEdit)"""
+        return self.projDB_fp
+
+    def load_models(self, logger=None):
+        """instance a Model for each entry in the model suite index"""
+        if logger is None: logger = self.logger
+        log = logger.getChild('load_models')
+
+        model_index_dx = self.projDB_get_tables(['03_model_suite_index'])[0]
+
+        for category_code, modelid in model_index_dx.index:
+            model = Model(parent=self, category_code=category_code, modelid=modelid, logger=self.logger)
+
+            assert 'table_parameters' in model.get_table_names_all(result_as_dict=True), \
+                f'no parameters table found for model {model.name}'
+
+            model.update_parameter_d()
+
+            if not category_code in self.model_index_d:
+                self.model_index_d[category_code] = dict()
+            self.model_index_d[category_code][modelid] = model
+
+        log.info(f'loaded {len(model_index_dx)} models from {os.path.basename(self.projDB_fp)}')
+
+        return self.model_index_d
+
+    def get_models_d(self, model_names=None):
+        """get {name: Model} for the requested model names (all if None)"""
+        models_d = {model.name:model for d in self.model_index_d.values() for model in d.values()}
+
+        if model_names is None:
+            return models_d
+
+        miss_l = set(model_names) - set(models_d.keys())
+        if len(miss_l)>0:
+            raise KeyError(f'requested models not found in project database: {miss_l}')
+
+        return {k:models_d[k] for k in model_names}
+
+    def run_models(self, model_names=None, max_workers=1, logger=None, **kwargs):
+        """run the requested models (all if None) and summarize
+
+        failed models are logged and recorded, the remaining models are still run
+
+        Parameters
+        ----------
+        max_workers: int
+            number of worker processes. 1: run sequentially in this process
+            see iter_models_pool()
+
+        Returns
+        -------
+        pd.DataFrame
+            status, result_ead, runtime_secs, and error for each model
+        """
+        if logger is None: logger = self.logger
+        log = logger.getChild('run_models')
+
+        models_d = self.get_models_d(model_names=model_names)
+        max_workers = min(max_workers, len(models_d))
+        log.info(f'running {len(models_d)} models w/ {max_workers} workers')
+
+        rec_d = dict()
+        start_time = datetime.now()
+        #=======================================================================
+        # process pool
+        #=======================================================================
+        if max_workers>1:
+            for key, result in iter_models_pool(self.projDB_fp, [(m.category_code, m.modelid) for m in models_d.values()],
+                                                max_workers=max_workers, use_cache=kwargs.get('use_cache', True), logger=log):
+                model = self.model_index_d[key[0]][key[1]]
+                try:
+                    if isinstance(result, Exception):
+                        raise result
+
+                    _, df_d, param_d, profile = result
+                    model._commit_tables(df_d, param_d=param_d, projDB_fp=self.projDB_fp, logger=log, profile=profile)
+                    result_ead, status, error = param_d['result_ead'], model.status, ''
+                except Exception as e:
+                    log.error(f'failed to run model {model.name} w/ error:\n    {e}')
+                    result_ead, status, error = np.nan, 'failed', str(e)
+
+                #wall time from the start of the pool
+                rec_d[model.name] = {'status':status, 'result_ead':result_ead,
+                               'runtime_secs':(datetime.now() - start_time).total_seconds(),
+                               'error':error}
+
+            rec_d = {k:rec_d[k] for k in models_d.keys()} #restore the requested order
+
+        #=======================================================================
+        # sequential
+        #=======================================================================
+        else:
+            for i, (name, model) in enumerate(models_d.items()):
+                log.info(f'({i+1}/{len(models_d)}) running model {name}')
+                start_time = datetime.now()
+                try:
+                    _, result_ead = model.run_model(projDB_fp=self.projDB_fp, logger=log, **kwargs)
+                    status, error = model.status, ''
+                except Exception as e:
+                    log.error(f'failed to run model {name} w/ error:\n    {e}')
+                    result_ead, status, error = np.nan, 'failed', str(e)
+
+                rec_d[name] = {'status':status, 'result_ead':result_ead,
+                               'runtime_secs':(datetime.now() - start_time).total_seconds(),
+                               'error':error}
+
+        return pd.DataFrame.from_dict(rec_d, orient='index',
+                                      columns=['status', 'result_ead', 'runtime_secs', 'error']).rename_axis('name')
+
+class Queue_progressBar(object):
+    """stand-in for a QProgressBar within a worker process
+
+    posts each new value to a queue for the parent process to apply"""
+
+    def __init__(self, progress_queue, key):
+        self.progress_queue = progress_queue
+        self.key = key
+        self._value = 0
+
+    def value(self):
+        return self._value
+
+    def setValue(self, value):
+        self._value = value
+        self.progress_queue.put((self.key, value))
+
+#===============================================================================
+# process pool------------------
+#===============================================================================
+def run_model_worker(projDB_fp, category_code, modelid, progress_queue=None, use_cache=True):
+    """compute a single model in a worker process
+
+    reads the projDB but writes nothing (the parent process is the single writer)
+
+    Returns
+    -------
+    tuple
+        see Model.compute_model(), plus the Run_profiler (pass to Model._commit_tables())
+    """
+    log = get_log_stream(name=f'canflood2.worker_{os.getpid()}', level=logging.WARNING)
+
+    parent = Headless_projDB(projDB_fp, read_only=True, logger=log)
+    model = Model(parent=parent, category_code=category_code, modelid=modelid, logger=log)
+    model.update_parameter_d()
+
+    progressBar = None
+    if not progress_queue is None:
+        progressBar = Queue_progressBar(progress_queue, (category_code, modelid))
+
+    profile = Run_profiler(category_code=category_code, modelid=modelid)
+
+    return (*model.compute_model(projDB_fp=projDB_fp, progressBar=progressBar, logger=log, use_cache=use_cache,
+                                profile=profile), profile)
+
+
+def iter_models_pool(projDB_fp, model_keys, max_workers=None, progress_fn=None, use_cache=True, logger=None):
+    """compute models in a process pool, yielding each result as it finishes
+
+    writing is left to the caller (e.g., Model._commit_tables()) so the projDB has a single writer
+
+    Parameters
+    ----------
+    model_keys: list
+        (category_code, modelid) for each model
+    max_workers: int, optional
+        number of worker processes. defaults to the cpu count
+    progress_fn: callable, optional
+        progress_fn(key, value) is called (in this process) as each worker's progress changes
+    use_cache: bool
+        skip stages whose inputs are unchanged since the last run (see Model.get_stale_stages_d)
+
+    Yields
+    ------
+    tuple
+        key, result (see run_model_worker) or the exception raised by the worker
+    """
+    if logger is None: logger = get_log_stream(name='canflood2')
+    log = logger.getChild('iter_models_pool')
+
+    ctx = get_mp_context()
+
+    with ctx.Manager() as manager, ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx) as pool:
+        progress_queue = manager.Queue() if progress_fn is not None else None
+
+        future_d = {pool.submit(run_model_worker, projDB_fp, *key, progress_queue=progress_queue, use_cache=use_cache):key
+                    for key in model_keys}
+
+        log.info(f'submitted {len(future_d)} models to {max_workers or os.cpu_count()} workers')
+
+        def drain_progress():
+            if progress_queue is None:
+                return
+            while True:
+                try:
+                    key, value = progress_queue.get_nowait()
+                except queue.Empty:
+                    break
+                progress_fn(key, value)
+
+        pending_s = set(future_d.keys())
+        while len(pending_s)>0:
+            done_s, pending_s = wait(pending_s, timeout=0.1, return_when=FIRST_COMPLETED)
+            drain_progress()
+
+            for future in done_s:
+                key = future_d[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = e
+
+                log.debug(f'finished model {key}')
+                yield key, result
+
+#===============================================================================
+# runners------------------
+#===============================================================================
+def get_parser():
+    parser = argparse.ArgumentParser(prog='canflood2',
+                                     description='run CanFlood2 models from a project database without the QGIS dialogs')
+    parser.add_argument('projDB_fp', help='project database (.canflood2) to run. results are written here')
+    parser.add_argument('-m', '--models', nargs='+', default=None,
+                        help='names of the models to run (e.g., c1_0). default: all models')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='number of worker processes (models are computed in parallel, written by this process). default: 1')
+    parser.add_argument('--stage-writes', action='store_true',
+                        help='write each stage result to the projDB (run_model(in_memory=False))')
+    parser.add_argument('--max-memory-mb', type=float, default=None,
+                        help='memory budget for the damage table. streams blocks of assets through the projDB (implies --stage-writes)')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='recompute all stages (by default, stages with unchanged inputs are skipped)')
+    parser.add_argument('-l', '--log-level', default='INFO',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    return parser
+
+
+def main(argv=None):
+    """console entry point. returns the exit code"""
+    args = get_parser().parse_args(argv)
+
+    log = get_log_stream(name='canflood2', level=getattr(logging, args.log_level))
+    start_time = datetime.now()
+
+    if args.workers>1 and (args.stage_writes or args.max_memory_mb is not None):
+        log.error(f'--stage-writes and --max-memory-mb are not supported with --workers>1')
+        return exit_codes_d['bad_input']
+
+    #===========================================================================
+    # load
+    #===========================================================================
+    projDB_fp = os.path.abspath(args.projDB_fp)
+    try:
+        parent = Headless_projDB(projDB_fp, logger=log)
+        parent.load_models()
+        parent.get_models_d(model_names=args.models) #check the names
+    except Exception as e:
+        log.error(f'failed to load project database {projDB_fp} w/ error:\n    {e}')
+        return exit_codes_d['bad_input']
+
+    #===========================================================================
+    # run
+    #===========================================================================
+    summary_df = parent.run_models(model_names=args.models, max_workers=args.workers,
+                                   in_memory=not args.stage_writes, use_cache=not args.force,
+                                   max_memory_mb=args.max_memory_mb)
+
+    #===========================================================================
+    # wrap
+    #===========================================================================
+    fail_cnt = (summary_df['status']=='failed').sum()
+
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        log.info(f'summary\n{summary_df.drop(columns="error")}')
+
+    log.info(f'finished {len(summary_df)} models ({fail_cnt} failed) in {datetime.now() - start_time}')
+
+    if fail_cnt>0:
+        return exit_codes_d['model_failed']
+
+    return exit_codes_d['success']
+
+
+if __name__ == '__main__':
+    sys.exit(main())
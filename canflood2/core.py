@@ -3,7 +3,10 @@ Created on Mar 6, 2025
 
 @author: cef
 '''
-import os, sys, platform, sqlite3, copy
+import os, sys, platform, sqlite3, copy, json, time, tracemalloc, uuid, getpass
+from contextlib import contextmanager, nullcontext
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 from datetime import datetime
 
@@ -17,20 +20,26 @@ from scipy import interpolate, integrate
 # IMPORTS-----
 #===============================================================================
 
-from .hp.basic import view_web_df as view
+from .hp.basic import view_web_df as view, get_mp_context, get_peak_rss_mb
 from .hp.assertions import assert_index_match
-from .hp.sql import get_table_names, pd_dtype_to_sqlite_type
+from .hp.pd import get_data_hash
+from .hp.jit import numba_available, get_impacts_jit
+from .hp.sql import (
+    get_table_names, pd_dtype_to_sqlite_type, sqlite_transaction, get_sqlite_file_signature,
+    get_table_populated_d,
+    )
 from . import __version__
 
 
-from .db_tools import (get_template_df, assert_df_template_match)
+from .db_tools import (get_template_df, assert_df_template_match, iter_impacts_chunks, filter_df)
 
 from .assertions import (
     assert_projDB_fp, assert_hazDB_fp, assert_df_matches_projDB_schema, assert_projDB_conn,
     assert_series_match
     )
 from .parameters import (
-    projDB_schema_modelTables_d, project_db_schema_d,  modelTable_params_d
+    projDB_schema_modelTables_d, project_db_schema_d,  modelTable_params_d, impacts_engine_l, impacts_backend_l,
+    mc_targets_d, mc_chunk_cells, mc_asset_band_mb, run_stages_d, impacts_row_bytes, vfunc_cache_size, vfunc_grid_max_cells
     )
 
 import canflood2.parameters as parameters
@@ -59,6 +68,78 @@ class ModelNotReadyError(Exception):
     """Exception raised when the model is not ready to run."""
  
 
+class Run_profiler(object):
+    """per-stage wall time, cpu time, peak memory, and row counts of a model run
+    
+    written to the 08_run_profile table by Model._commit_tables() (one row per stage)
+    picklable, so a worker process can return it (see cli.run_model_worker)
+    
+    trace_memory: also record the exact peak allocation of each stage with tracemalloc
+        (slows the run ~3x). otherwise only the cheap process peak RSS is recorded
+    """
+    
+    def __init__(self, category_code=None, modelid=None, trace_memory=False):
+        self.run_id = f'{datetime.now().strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}'
+        self.category_code, self.modelid = category_code, modelid
+        self.trace_memory = trace_memory
+        self.rec_l = list()
+        self._rec = None #current stage
+        
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """time a stage. set 'rows_out' (or 'rows_in') on the yielded record
+        
+        stages should not be nested (tracemalloc has a single peak). nothing is recorded on an exception
+        """
+        rec = {'stage':name, 'rows_in':rows_in, 'rows_out':None}
+        
+        #peak memory above the start of the stage
+        own_trace = self.trace_memory and not tracemalloc.is_tracing()
+        if own_trace:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            mem_start = tracemalloc.get_traced_memory()[0]
+        
+        start_time, wall_start, cpu_start = datetime.now(), time.perf_counter(), time.process_time()
+        self._rec = rec
+        try:
+            yield rec
+            
+            wall_secs = time.perf_counter() - wall_start
+            rec.update({'start_time':start_time.isoformat(timespec='seconds'), 
+                        'wall_secs':wall_secs, 'cpu_secs':time.process_time() - cpu_start,
+                        'peak_rss_mb':get_peak_rss_mb(),
+                        'peak_traced_mb':(tracemalloc.get_traced_memory()[1] - mem_start)/1e6 if self.trace_memory else np.nan,
+                        'rows_per_sec':np.nan if (rec['rows_out'] is None or wall_secs==0) else rec['rows_out']/wall_secs})
+            
+            self.rec_l.append(rec)
+        finally:
+            self._rec = None
+            if own_trace:
+                tracemalloc.stop()
+                
+    def set_rows(self, rows_in=None, rows_out=None):
+        """set the row counts of the current stage"""
+        if self._rec is None:
+            return
+        for k, v in {'rows_in':rows_in, 'rows_out':rows_out}.items():
+            if not v is None:
+                self._rec[k] = int(v)
+                
+    def get_stage_names(self):
+        return [rec['stage'] for rec in self.rec_l]
+                
+    def get_df(self):
+        """08_run_profile rows"""
+        template_df = project_db_schema_d['08_run_profile']
+        
+        df = pd.DataFrame(self.rec_l).assign(run_id=self.run_id, category_code=self.category_code,
+                modelid=self.modelid, version=__version__).reindex(columns=template_df.columns)
+        
+        return df.astype(template_df.dtypes.to_dict())
+    
+
 
 class Model_run_methods(object):
     """organizer for the model run methods"""
@@ -67,8 +148,32 @@ class Model_run_methods(object):
                   projDB_fp=None,
                   progressBar=None,
                   logger=None,
+                  in_memory=True,
+                  use_cache=True,
+                  max_memory_mb=None,
+                  profile=True,
                   ):
-        """run the model"""
+        """run the model
+        
+        Parameters
+        ----------
+        in_memory: bool
+            True: pass the tables between stages in memory and write all results once at the end
+            False: each stage writes its result table and the next stage reads it back from the projDB
+            
+        use_cache: bool
+            skip stages whose inputs are unchanged since the last run (see get_stale_stages_d)
+            
+        max_memory_mb: float, optional
+            memory budget for table_impacts (for very large inventories)
+            blocks of assets are streamed through the damage calculation into the projDB
+                and read back in blocks by the next stage. forces in_memory=False
+                
+        profile: bool or Run_profiler
+            record the time, memory, and rows of each stage to the 08_run_profile table
+                pass Run_profiler(trace_memory=True) for the exact peak allocation of each stage
+                nothing is recorded if all stages were skipped
+        """
  
         #=======================================================================
         # defaults
@@ -76,28 +181,160 @@ class Model_run_methods(object):
         if logger is None: logger=self.logger
         log = logger.getChild('run_model')
         start_time= datetime.now()        
- 
-                
-        def add_to_prog(increment):
-            """helper for adding to the progress bar"""
-            if progressBar is not None:
-                current_value = progressBar.value()
-                if current_value<100:
-                    progressBar.setValue(current_value + increment)
-                
-        add_to_prog(5)
         
         if projDB_fp is None:
             projDB_fp = self.parent.get_projDB_fp()
             
+        skwargs = dict(projDB_fp=projDB_fp, logger=log)
+        
+        if not max_memory_mb is None:
+            in_memory=False
             
+        if isinstance(profile, Run_profiler):
+            profiler = profile
+        else:
+            profiler = Run_profiler(category_code=self.category_code, modelid=self.modelid) if profile else None
         #=======================================================================
-        # prechecks
+        # in memory
         #=======================================================================
-        self.assert_is_ready(logger=log)
+        if in_memory:
+            result, df_d, param_d = self.compute_model(progressBar=progressBar, use_cache=use_cache, 
+                                                       profile=profiler, **skwargs)
+            
+            self._commit_tables(df_d, param_d=param_d, profile=profiler, **skwargs)
+            _add_to_progressBar(progressBar, 5)
+            
+        #=======================================================================
+        # stage by stage
+        #=======================================================================
+        else:
+            with self._profiling(profiler):
+                with self._profile_stage('prechecks'):
+                    self._run_prechecks(progressBar=progressBar, **skwargs)
+                    
+                    fingerprint_d, stale_d = self.get_stale_stages_d(use_cache=use_cache, **skwargs)
+            
+                #compute damages 
+                if stale_d['impacts']:
+                    with self._profile_stage('impacts'):
+                        _ = self._table_impacts_to_db(max_memory_mb=max_memory_mb, **skwargs)
+                _add_to_progressBar(progressBar, 10)
+                
+                #simplify and add EAD to clumns
+                if stale_d['impacts_prob']:
+                    with self._profile_stage('impacts_prob'):
+                        _ = self._table_impacts_prob_to_db(max_memory_mb=max_memory_mb, **skwargs)
+                _add_to_progressBar(progressBar, 10)
+                
+                #row-wise EAD
+                if stale_d['ead']:
+                    with self._profile_stage('ead'):
+                        _ = self._table_ead_to_db(**skwargs)
+                _add_to_progressBar(progressBar, 10)
+                
+                #model-wide EAD
+                if stale_d['ead_total']:
+                    with self._profile_stage('ead_total'):
+                        result = self._set_ead_total(**skwargs)
+                else:
+                    result = self._get_ead_total_stored(projDB_fp=projDB_fp)
+                _add_to_progressBar(progressBar, 10)
+                
+                with self._profile_stage('write'):
+                    self.set_parameter_value('run_fingerprints', json.dumps(fingerprint_d), projDB_fp=projDB_fp)
+                
+            if any(stale_d.values()) and not profiler is None:
+                self.parent.projDB_set_tables({'08_run_profile':profiler.get_df()}, projDB_fp=projDB_fp, 
+                                              if_exists='append', logger=log)
+ 
+        
+        log.info(f'finished running model  in {datetime.now()-start_time} w/ EAD={result}')
+        
+        return result
+    
+    def compute_model(self,
+                  projDB_fp=None,
+                  progressBar=None,
+                  logger=None,
+                  use_cache=True,
+                  profile=None,
+                  ):
+        """run the model stages in memory without writing anything to the projDB
+        
+        safe to call from a worker process (see cli.iter_models_pool)
+        
+        Parameters
+        ----------
+        use_cache: bool
+            skip stages whose inputs are unchanged since the last run (see get_stale_stages_d)
+            
+        profile: Run_profiler, optional
+            records each stage. pass to _commit_tables() to write
+        
+        Returns
+        -------
+        tuple
+            result: (table_impacts_sum, result_ead) as returned by _set_ead_total()
+            df_d: recomputed result tables {template name: DataFrame}
+            param_d: result parameters {varName: value}
+            pass the latter two to _commit_tables() to write
+        """
+        if logger is None: logger=self.logger
+        log = logger.getChild('compute_model')
+        
+        if projDB_fp is None:
+            projDB_fp = self.parent.get_projDB_fp()
+            
+        with self._profiling(profile):
+            with self._profile_stage('prechecks'):
+                self._run_prechecks(projDB_fp=projDB_fp, progressBar=progressBar, logger=log)
+                
+                fingerprint_d, stale_d = self.get_stale_stages_d(projDB_fp=projDB_fp, logger=log, use_cache=use_cache)
+            
+            skwargs = dict(projDB_fp=projDB_fp, logger=log, write=False)
+            df_d = dict()
+            
+            #compute damages 
+            impacts_dx = None #loaded by the next stage
+            if stale_d['impacts']:
+                with self._profile_stage('impacts'):
+                    impacts_dx = df_d['table_impacts'] = self._table_impacts_to_db(**skwargs)
+            _add_to_progressBar(progressBar, 10)
+            
+            #simplify and add EAD to clumns
+            if stale_d['impacts_prob']:
+                with self._profile_stage('impacts_prob'):
+                    impacts_prob_df = df_d['table_impacts_prob'] = self._table_impacts_prob_to_db(impacts_dx=impacts_dx, **skwargs)
+            elif stale_d['ead'] or stale_d['ead_total']:
+                impacts_prob_df = self.get_tables(['table_impacts_prob'], projDB_fp=projDB_fp)[0]
+            _add_to_progressBar(progressBar, 10)
+            
+            #row-wise EAD
+            if stale_d['ead']:
+                with self._profile_stage('ead'):
+                    df_d['table_ead'] = self._table_ead_to_db(impacts_prob_df=impacts_prob_df, **skwargs)
+            _add_to_progressBar(progressBar, 10)
+            
+            #model-wide EAD
+            if stale_d['ead_total']:
+                with self._profile_stage('ead_total'):
+                    result = self._set_ead_total(impacts_prob_df=impacts_prob_df, **skwargs)
+                df_d['table_impacts_sum'] = result[0]
+            else:
+                result = self._get_ead_total_stored(projDB_fp=projDB_fp)
+            _add_to_progressBar(progressBar, 10)
+        
+        log.debug(f'computed {len(df_d)} tables')
+        
+        return result, df_d, {'result_ead':result[1], 'run_fingerprints':json.dumps(fingerprint_d)}
+    
+    def _run_prechecks(self, projDB_fp=None, progressBar=None, logger=None):
+        _add_to_progressBar(progressBar, 5)
+        
+        self.assert_is_ready(logger=logger)
         
         assert_projDB_fp(projDB_fp, check_consistency=True)
-        log.info(f'running model from {os.path.basename(projDB_fp)}')
+        logger.info(f'running model from {os.path.basename(projDB_fp)}')
         
         """too tricky to work witha  single connection
         most things are setup to work of the filepath
@@ -105,36 +342,141 @@ class Model_run_methods(object):
         
             assert_projDB_conn(conn, check_consistency=True)
         """
-        add_to_prog(5)
+        _add_to_progressBar(progressBar, 5)
+        
+    def get_stage_fingerprints(self, projDB_fp=None, logger=None):
+        """hash the inputs of each run stage
+        
+        each hash includes that of the upstream stage (see parameters.run_stages_d)
+            so an input change invalidates everything downstream
+        
+        Returns
+        -------
+        dict
+            {stage: hex digest}
+        """
+        if logger is None: logger = self.logger
+        log = logger.getChild('fingerprints')
+        if projDB_fp is None:
+            projDB_fp = self.parent.get_projDB_fp()
+            
         #=======================================================================
-        # run sequence
+        # damages
         #=======================================================================
-        skwargs = dict(projDB_fp=projDB_fp, logger=log)
+        finv_elevType = self.get_parameter_value('finv_elevType', projDB_fp=projDB_fp)
+        expo_level = self.get_parameter_value('expo_level', projDB_fp=projDB_fp)
         
-        #compute damages 
-        self._table_impacts_to_db(**skwargs)
-        add_to_prog(10)
+        finv_dx, expos_df = self.get_tables(['table_finv', 'table_expos'], projDB_fp=projDB_fp)
         
-        #simplify and add EAD to clumns
-        self._table_impacts_prob_to_db(**skwargs)
-        add_to_prog(10)
+        dem_df = None
+        if finv_elevType=='relative':
+            dem_df = self.get_tables(['table_gels'], projDB_fp=projDB_fp)[0]
+            
+        #only the curves used by this model
+        vfunc_index_df, vfunc_data_df = None, None
+        if 'L2' in expo_level:
+            vfunc_index_df, vfunc_data_df = self.parent.projDB_get_tables(['06_vfunc_index', '07_vfunc_data'], projDB_fp=projDB_fp)
+            tags = finv_dx['tag'].unique()
+            vfunc_index_df = vfunc_index_df.loc[vfunc_index_df.index.isin(tags)]
+            vfunc_data_df = vfunc_data_df.loc[vfunc_data_df['tag'].isin(tags)]
+            
+        #=======================================================================
+        # chain
+        #=======================================================================
+        d = dict()
+        d['impacts'] = get_data_hash(__version__, expo_level, finv_elevType, 
+                                     finv_dx, expos_df, dem_df, vfunc_index_df, vfunc_data_df,
+                                     self.get_impacts_storage(projDB_fp=projDB_fp), #re-encode on change
+                                     self.get_float_dtype(projDB_fp=projDB_fp))
         
-        #row-wise EAD
-        self._table_ead_to_db(**skwargs)
-        add_to_prog(10)
+        d['impacts_prob'] = get_data_hash(d['impacts'], self._get_haz_events_aep(projDB_fp=projDB_fp, logger=log))
         
-        #model-wide EAD
-        result = self._set_ead_total(**skwargs)
-        add_to_prog(10)
+        d['ead'] = get_data_hash(d['impacts_prob'])
         
- 
+        d['ead_total'] = get_data_hash(d['impacts_prob'], 
+            *self._get_ead_tail_params(projDB_fp=projDB_fp, logger=log))
         
-        log.info(f'finished running model  in {datetime.now()-start_time} w/ EAD={result}')
+        assert set(d.keys())==set(run_stages_d.keys())
         
-        return result
+        return d
+    
+    def get_stale_stages_d(self, projDB_fp=None, logger=None, use_cache=True):
+        """determine which run stages need to be recomputed
         
-    def _table_impacts_to_db(self, projDB_fp=None, logger=None, precision=3):
-        """compute the damages and write to the database"""
+        a stage is stale if its fingerprint differs from the one stored by the last run,
+            its result table is missing or empty, or its upstream stage is stale
+        
+        Returns
+        -------
+        tuple
+            fingerprint_d: {stage: hex digest} for the current inputs (see get_stage_fingerprints)
+            stale_d: {stage: bool}
+        """
+        if logger is None: logger = self.logger
+        log = logger.getChild('stale_stages')
+        if projDB_fp is None:
+            projDB_fp = self.parent.get_projDB_fp()
+            
+        fingerprint_d = self.get_stage_fingerprints(projDB_fp=projDB_fp, logger=log)
+        
+        #=======================================================================
+        # load the last run
+        #=======================================================================
+        stored_d = dict()
+        if use_cache:
+            param_s = self.get_table_parameters(projDB_fp=projDB_fp).set_index('varName')['value']
+            
+            if not pd.isnull(param_s.get('run_fingerprints', np.nan)):
+                stored_d = json.loads(param_s['run_fingerprints'])
+                
+            #the stored EAD goes with table_impacts_sum
+            if pd.isnull(param_s.get('result_ead', np.nan)):
+                stored_d.pop('ead_total', None)
+                
+        populated_d = self.get_model_tables_populated_d(projDB_fp=projDB_fp)
+        
+        #=======================================================================
+        # check each stage
+        #=======================================================================
+        stale_d = dict()
+        for stage, (table_name, upstream) in run_stages_d.items():
+            stale_d[stage] = (stored_d.get(stage, None)!=fingerprint_d[stage]) or (
+                not populated_d.get(table_name, False)) or (
+                    False if upstream is None else stale_d[upstream])
+                
+        log.debug(f'stale stages: {[k for k, v in stale_d.items() if v]}')
+        
+        return fingerprint_d, stale_d
+    
+    def _get_ead_total_stored(self, projDB_fp=None):
+        """load the result of the last _set_ead_total()"""
+        df = self.get_tables(['table_impacts_sum'], projDB_fp=projDB_fp)[0]
+        return df, float(self.get_parameter_value('result_ead', projDB_fp=projDB_fp))
+        
+    def _table_impacts_to_db(self, projDB_fp=None, logger=None, precision=3,
+                             engine='vectorized', write=True, max_memory_mb=None,
+                             ):
+        """compute the damages and write to the database
+        
+        Parameters
+        ----------
+        write: bool
+            write the result to the projDB (False for in_memory runs)
+            
+        engine: str
+            damage calculation engine (see parameters.impacts_engine_l)
+                vectorized: single pass over all tags w/ stacked vfunc curve arrays
+                loop: legacy loop on each tag
+                
+        max_memory_mb: float, optional
+            memory budget for the result. blocks of assets are computed and appended to the projDB
+                in a single transaction (see get_impacts_chunk_rows). requires write=True
+                
+        Returns
+        ----------
+        pd.DataFrame
+            table_impacts (None when chunked) in the precision of the float_dtype parameter
+        """
         
         #=======================================================================
         # defaults
@@ -142,11 +484,110 @@ class Model_run_methods(object):
         if logger is None: logger = self.logger
         log = logger.getChild('_table_impacts_to_db')
         
-        
+        assert engine in impacts_engine_l, f'bad engine: {engine}'
         
         #=======================================================================
         # load data-------
         #=======================================================================
+        expos_df, finv_dx, dem_df, vfunc_data_df = self._get_impacts_inputs(projDB_fp=projDB_fp, logger=log)
+        
+        dtype = self.get_float_dtype(projDB_fp=projDB_fp)
+        
+        self._profile_rows(rows_in=len(finv_dx), rows_out=len(finv_dx)*len(expos_df.columns))
+ 
+        #=======================================================================
+        # chunked-------
+        #=======================================================================
+        if not max_memory_mb is None:
+            assert write, 'chunked damages must be written'
+            assert self._uow_d is None, 'chunked damages can not be held in a unit_of_work'
+            
+            chunk_l = get_index_chunks(finv_dx.index.get_level_values('indexField'), 
+                               max(1, get_impacts_chunk_rows(max_memory_mb)//len(expos_df.columns)))
+            
+            log.info(f'computing damages for {len(finv_dx)} assets in {len(chunk_l)} chunks w/ max_memory_mb={max_memory_mb}')
+            
+            def iter_chunks():
+                for index_ar in chunk_l:
+                    finv_chunk_dx = finv_dx.loc[finv_dx.index.get_level_values('indexField').isin(index_ar)]
+                    
+                    yield self._get_impacts_dx(expos_df=expos_df.loc[expos_df.index.isin(index_ar)],
+                            finv_dx=finv_chunk_dx, 
+                            dem_df=None if dem_df is None else dem_df.loc[dem_df.index.isin(index_ar)],
+                            vfunc_data_df=vfunc_data_df, precision=precision, engine=engine, dtype=dtype, logger=log)
+                    
+            self._commit_tables({'table_impacts':iter_chunks()}, projDB_fp=projDB_fp, logger=log)
+            
+            log.info(f'finished computing damages in {len(chunk_l)} chunks')
+            
+            return None
+        
+        #=======================================================================
+        # compute-------
+        #=======================================================================
+        log.info(f'computing damages for {finv_dx["tag"].nunique()} ftags w/ engine=\'{engine}\'')
+        
+        mresult_dx = self._get_impacts_dx(expos_df=expos_df, finv_dx=finv_dx, dem_df=dem_df, vfunc_data_df=vfunc_data_df, 
+                       precision=precision, engine=engine, dtype=dtype, logger=log)
+        log.info(f'finished computing damages w/ {mresult_dx.shape}')
+        
+        #=======================================================================
+        # write to projDB
+        #=======================================================================
+        """
+        mresult_dx.index.dtypes
+        """
+        if write:
+            self.set_tables({'table_impacts':mresult_dx}, projDB_fp=projDB_fp)
+ 
+        
+        return mresult_dx
+    """
+    mresult_dx.dtypes
+    """
+    
+    def _get_impacts_dx(self, finv_dx=None, engine='vectorized', dtype='float64', **kwargs):
+        """compute and check the impacts of some assets with the requested engine
+        
+        dtype: str
+            precision of the result columns (see float_dtype parameter)
+        
+        Returns
+        ----------
+        pd.DataFrame
+                                       exposure  ...  impact_capped
+        indexField nestID event_names            ...               
+        14879      0      haz_0050       -1.572  ...   31122.812250
+        """
+        if engine=='vectorized':
+            mresult_dx = self._get_impacts_dx_vectorized(finv_dx=finv_dx, dtype=dtype, **kwargs)
+        elif engine=='loop':
+            mresult_dx = self._get_impacts_dx_loop(finv_dx=finv_dx, **kwargs).astype(dtype, copy=False)
+        else:
+            raise KeyError(engine)
+ 
+        #=======================================================================
+        # #check
+        #=======================================================================        
+        #check the index matches the finv_dx        
+        mresult_dx_index_check = mresult_dx.index.droplevel('event_names').drop_duplicates().sort_values()
+        self.assert_finv_index_match(mresult_dx_index_check, finv_index=finv_dx.index)
+        #assert mresult_dx_index_check.equals(finv_dx.index.sort_values()), 'Index mismatch'
+        
+        return mresult_dx
+    
+    def _get_impacts_inputs(self, projDB_fp=None, logger=None):
+        """load and check the inputs for the damage calculation
+        
+        see _table_impacts_to_db() and run_model_mc()
+        
+        Returns
+        ----------
+        tuple
+            expos_df, finv_dx, dem_df (None for absolute elevations), vfunc_data_df (None for L1)
+        """
+        log = logger.getChild('inputs')
+        
         #=======================================================================
         # #model exposure and inventory
         #=======================================================================
@@ -191,29 +632,112 @@ class Model_run_methods(object):
         
             assert set(finv_dx['tag']).issubset(vfunc_index_df.index), 'missing tags'
             
-            #get grouper for vfuncs
-            g_vfunc = vfunc_data_df.round(precision).groupby('tag')
-            
         elif 'L1' in self.param_d['expo_level']:
             log.debug(f'L1 model vfunc patching')
             
             assert len(finv_dx['tag'].unique())==1, 'L1 models must have a single dummy tag'
             
             finv_dx['tag'] = 'L1_dummy' #patch the tag for L1 models'
+            
+            vfunc_data_df=None
  
         
         else:
             raise KeyError(f'unrecognized expo_level: {self.param_d["expo_level"]}')
+            
+        return expos_df, finv_dx, dem_df, vfunc_data_df
+    
+    def _get_impacts_dx_vectorized(self, expos_df=None, finv_dx=None, dem_df=None, vfunc_data_df=None,
+                                   precision=3, dtype='float64', logger=None):
+        """compute the impacts for all tags in a single pass
+        
+        assets are aligned to the exposures by position
+            then all depths are interpolated against the stacked vfunc curves at once
+            
+        should match _get_impacts_dx_loop() exactly
+        """
+        log = logger.getChild('vectorized')
         
- 
         #=======================================================================
-        # compute-------
+        # prep inventory
+        #=======================================================================
+        finv_dx = finv_dx.sort_index()
+        event_names = expos_df.columns.sort_values()
+        
+        #positions of each asset on the exposure table
+        ifield_ar = finv_dx.index.get_level_values('indexField')
+        expos_pos_ar = expos_df.index.get_indexer(ifield_ar)
+        assert not np.any(expos_pos_ar==-1), 'failed to align assets to exposures'
+        
         #=======================================================================
+        # depths
+        #=======================================================================
+        #WSE (or depth) per asset row
+        deps_ar = expos_df.loc[:, event_names].to_numpy(dtype=float)[expos_pos_ar, :]
+        
+        #adjust for DEM
+        if not dem_df is None:
+            gels_ar = dem_df.iloc[:, 0].to_numpy(dtype=float)[dem_df.index.get_indexer(ifield_ar)]
+            deps_ar = deps_ar - gels_ar[:, None]
+            
+        #adjust for asset height (elev)
+        """ TODO: support WSH"""
+        deps_ar = np.round(deps_ar - finv_dx['elev'].to_numpy(dtype=float)[:, None], precision)
+        
+        negative_bx = deps_ar<0 #does not count nulls
+        if negative_bx.any():
+            log.warning(f'got {negative_bx.sum()}/{deps_ar.size} negative depths')
+            
+        #=======================================================================
+        # compute
+        #=======================================================================
+        #broadcast the asset parameters onto the events
+        shape = deps_ar.shape
+        
+        impact_ar, impact_scaled_ar, impact_capped_ar = get_impacts_from_depths(
+            deps_ar.ravel(),
+            tag_ar=np.repeat(finv_dx['tag'].to_numpy(), shape[1]),
+            scale_ar=np.repeat(finv_dx['scale'].to_numpy(dtype=float), shape[1]),
+            cap_ar=np.repeat(finv_dx['cap'].to_numpy(dtype=float), shape[1]),
+            vfunc_data_df=vfunc_data_df, precision=precision, dtype=dtype)
+        
+        #=======================================================================
+        # assemble
+        #=======================================================================
+        #asset x event index (matches the sorted order of the raveled arrays)
+        index = pd.MultiIndex.from_arrays([
+            np.repeat(ifield_ar.to_numpy(), shape[1]),
+            np.repeat(finv_dx.index.get_level_values('fg_index').to_numpy(), shape[1]),
+            np.tile(event_names.to_numpy(), shape[0]),            
+            ], names=['indexField', 'fg_index', 'event_names'])
+        
+        mresult_dx = pd.DataFrame({
+            'exposure':deps_ar.ravel().astype(dtype, copy=False), 'impact':impact_ar, 
+            'impact_scaled':impact_scaled_ar, 'impact_capped':impact_capped_ar,
+            }, index=index)
+        
+        log.debug(f'computed {mresult_dx.shape} impacts w/ {np.isnan(deps_ar).sum()} null exposures')
+        
+        return mresult_dx
+        
+        
+    def _get_impacts_dx_loop(self, expos_df=None, finv_dx=None, dem_df=None, vfunc_data_df=None,
+                             precision=3, logger=None):
+        """compute the impacts by looping on each tag (unique damage function)
+        
+        legacy engine. see _get_impacts_dx_vectorized()
+        """
+        log = logger.getChild('loop')
+        
+        if not vfunc_data_df is None:
+            #get grouper for vfuncs
+            g_vfunc = vfunc_data_df.round(precision).groupby('tag')
+        
         #loop on each tag (unique damage function)
         result_d = dict()
         
         g = finv_dx.groupby('tag')
-        log.info(f'computing damages for {len(g)} ftags')
+        
         for i, (tag, gdf) in enumerate(g):
             log.debug(f'computing damages for {i+1}/{len(g)} tag=\'{tag}\' w/ {len(gdf)} assets')
             
@@ -375,46 +899,24 @@ class Model_run_methods(object):
  
         # Drop the 'tag' level from the index
         mresult_dx = mresult_dx.droplevel('tag').reorder_levels(['indexField', 'fg_index', 'event_names']).sort_index()
-        """
-                                       exposure  ...  impact_capped
-        indexField nestID event_names            ...               
-        14879      0      haz_0050       -1.572  ...   31122.812250
- 
-        
-        Index(['exposure', 'impact', 'impact_scaled', 'impact_capped'], dtype='object')
-        """
- 
-        #=======================================================================
-        # #check
-        #=======================================================================        
-        #check the index matches the finv_dx        
-        mresult_dx_index_check = mresult_dx.index.droplevel('event_names').drop_duplicates().sort_values()
-        assert_finv_match(mresult_dx_index_check)
-        #assert mresult_dx_index_check.equals(finv_dx.index.sort_values()), 'Index mismatch'
-
-        log.info(f'finished computing damages w/ {mresult_dx.shape}')
-        
-        #=======================================================================
-        # write to projDB
-        #=======================================================================
-        """
-        mresult_dx.index.dtypes
-        """
-        self.set_tables({'table_impacts':mresult_dx}, projDB_fp=projDB_fp)
- 
         
         return mresult_dx
-    """
-    mresult_dx.dtypes
-    """
-    
-    def _table_impacts_prob_to_db(self, projDB_fp=None, logger=None):
+
+    def _table_impacts_prob_to_db(self, projDB_fp=None, logger=None, impacts_dx=None, write=True,
+                                  max_memory_mb=None):
         """compute and set the simple impacts table
         
         this is a condensed and imputed version of the impacts table
         decided to make this separate as users will expect something like this
             but we want to maintain the complete table for easier back end calcs
             
+        Parameters
+        ----------
+        impacts_dx: pd.DataFrame, optional
+            table_impacts. loaded from the projDB if not passed
+            
+        max_memory_mb: float, optional
+            memory budget for reading table_impacts. read in blocks of assets (see get_impacts_chunk_rows)
             
         Returns
         ----------------
@@ -439,17 +941,37 @@ class Model_run_methods(object):
         #=======================================================================
         # load data
         #=======================================================================
-        impacts_dx = self.get_tables(['table_impacts'], projDB_fp=projDB_fp)[0]
+        if impacts_dx is None and max_memory_mb is None:
+            impacts_dx = self.get_tables(['table_impacts'], projDB_fp=projDB_fp)[0]
         
-        log.debug(f'loaded impacts w/ {impacts_dx.shape}')
+            log.debug(f'loaded impacts w/ {impacts_dx.shape}')
         
         #=======================================================================
         # simplifyt
         #=======================================================================
         
         #sum on fg_index and retrieve impacts
-        df = impacts_dx['impact_capped'].groupby(['indexField', 'event_names']).sum()
-        df = df.unstack('event_names').fillna(0.0)
+        if not impacts_dx is None:
+            s = impacts_dx['impact_capped'].astype(float, copy=False).groupby(['indexField', 'event_names']).sum()
+            self._profile_rows(rows_in=len(impacts_dx))
+            
+        else: #chunked
+            table_name = self.get_table_names(['table_impacts'])[0]
+            
+            rows_in = 0
+            with self.parent.projDB_get_conn(projDB_fp) as conn:
+                s_l = list()
+                for chunk_df in iter_impacts_chunks(conn, table_name, chunksize=get_impacts_chunk_rows(max_memory_mb)):
+                    s_l.append(chunk_df.groupby(['indexField', 'event_names'])['impact_capped'].sum())
+                    rows_in+=len(chunk_df)
+                s = pd.concat(s_l)
+                
+            self._profile_rows(rows_in=rows_in)
+                
+            assert s.index.is_unique, f'assets are not contiguous in {table_name}'
+            log.debug(f'summed impacts in chunks to {s.shape}')
+            
+        df = s.unstack('event_names').fillna(0.0)
         
         
         #=======================================================================
@@ -458,30 +980,7 @@ class Model_run_methods(object):
         #=======================================================================
         # haz events
         #=======================================================================
-        haz_events_df = self.parent.projDB_get_tables(['05_haz_events'], projDB_fp=projDB_fp)[0]
-        
-        haz_events_s = haz_events_df.set_index('event_name')['prob']
-        
-        #get probability type    
-        haz_meta_s = self.parent.projDB_get_tables(['04_haz_meta'], projDB_fp=projDB_fp)[0].set_index('varName')['value']
-        
-        if haz_meta_s['probability_type']=='0':
-            probability_type = 'AEP'
-        elif haz_meta_s['probability_type']=='1':
-            probability_type = 'ARI'
-        else:
-            raise KeyError(f'bad probability_type: {haz_meta_s["probability_type"]}')
- 
-
-        log.debug(f'retrieved {len(haz_events_s)} events w/ probability_type=\'{probability_type}\'')
-        
-        #convert to AEP
-        if probability_type=='AEP':
-            pass
-        else:
-            haz_events_s = 1/haz_events_s
-            
-        haz_events_s = haz_events_s.rename('AEP')
+        haz_events_s = self._get_haz_events_aep(projDB_fp=projDB_fp, logger=log)
         
         #=======================================================================
         # remap
@@ -499,7 +998,10 @@ class Model_run_methods(object):
         #=======================================================================
         # write
         #=======================================================================
-        self.set_tables({'table_impacts_prob':impacts_prob_df}, projDB_fp=projDB_fp)
+        self._profile_rows(rows_out=len(impacts_prob_df))
+        
+        if write:
+            self.set_tables({'table_impacts_prob':impacts_prob_df}, projDB_fp=projDB_fp)
         
         return impacts_prob_df
         
@@ -507,14 +1009,56 @@ class Model_run_methods(object):
         
         
     
-    def _table_ead_to_db(self, projDB_fp=None, logger=None,
+    def _get_haz_events_aep(self, projDB_fp=None, logger=None):
+        """load the AEP of each hazard event
+        
+        Returns
+        ----------
+        pd.Series
+            AEP values indexed by event_name
+        """
+        log = logger.getChild('haz_events')
+        
+        haz_events_df = self.parent.projDB_get_tables(['05_haz_events'], projDB_fp=projDB_fp)[0]
+        
+        haz_events_s = haz_events_df.set_index('event_name')['prob']
+        
+        #get probability type    
+        haz_meta_s = self.parent.projDB_get_tables(['04_haz_meta'], projDB_fp=projDB_fp)[0].set_index('varName')['value']
+        
+        if haz_meta_s['probability_type']=='0':
+            probability_type = 'AEP'
+        elif haz_meta_s['probability_type']=='1':
+            probability_type = 'ARI'
+        else:
+            raise KeyError(f'bad probability_type: {haz_meta_s["probability_type"]}')
+ 
 
+        log.debug(f'retrieved {len(haz_events_s)} events w/ probability_type=\'{probability_type}\'')
+        
+        #convert to AEP
+        if probability_type=='AEP':
+            pass
+        else:
+            haz_events_s = 1/haz_events_s
+            
+        haz_events_s = haz_events_s.rename('AEP')
+        
+        return haz_events_s
+    
+    def _table_ead_to_db(self, projDB_fp=None, logger=None,
+                         impacts_prob_df=None, write=True,
                          
                          ):
         """compute the row-wise EAD from the damages and write to the database
         
         see CanFloodv1: riskcom.RiskModel.calc_ead()
         
+        Parameters
+        ----------
+        impacts_prob_df: pd.DataFrame, optional
+            table_impacts_prob. loaded from the projDB if not passed
+        
         Returns
         ----------------
         pd.DataFrame
@@ -542,7 +1086,10 @@ class Model_run_methods(object):
         #=======================================================================
         # damages
         #=======================================================================
-        impacts_df_raw = self.get_tables(['table_impacts_prob'], projDB_fp=projDB_fp)[0]
+        if impacts_prob_df is None:
+            impacts_prob_df = self.get_tables(['table_impacts_prob'], projDB_fp=projDB_fp)[0]
+            
+        impacts_df_raw = impacts_prob_df.copy()
         impacts_df_raw.columns = impacts_df_raw.columns.astype(float).rename('AEP')
 
         self.assert_impacts_prob_df(impacts_df_raw)
@@ -575,7 +1122,7 @@ class Model_run_methods(object):
         # calc areas
         #=======================================================================
         log.debug(f'computing areas for {impacts_df.shape}')
-        ead_df = impacts_df.apply(get_area_from_ser, axis=1).rename('ead').to_frame()
+        ead_df = get_area_from_df(impacts_df).rename('ead').to_frame()
 
         #=======================================================================
         # calc EAD
@@ -589,18 +1136,27 @@ class Model_run_methods(object):
         # write to projDB
         #=======================================================================
  
-        self.set_tables({'table_ead':ead_df}, projDB_fp=projDB_fp)
+        self._profile_rows(rows_in=len(impacts_df_raw), rows_out=len(ead_df))
+        
+        if write:
+            self.set_tables({'table_ead':ead_df}, projDB_fp=projDB_fp)
         
         return ead_df
     
     def _set_ead_total(self, projDB_fp=None, logger=None,
                        ead_lowPtail=None, ead_highPtail=None,
                          ead_lowPtail_user=None, ead_highPtail_user=None,
+                         impacts_prob_df=None, write=True,
                          ):
         """compute the model-wide EAD with fancy tails
         
         NOTE: we don't use the row-wise EAD as we want fancier tails
         
+        Parameters
+        ----------
+        impacts_prob_df: pd.DataFrame, optional
+            table_impacts_prob. loaded from the projDB if not passed
+        
         Returns
         ----------------
         pd.DataFrame
@@ -628,7 +1184,10 @@ class Model_run_methods(object):
         #=======================================================================
         # damages
         #=======================================================================
-        impacts_df = self.get_tables(['table_impacts_prob'], projDB_fp=projDB_fp)[0]
+        if impacts_prob_df is None:
+            impacts_prob_df = self.get_tables(['table_impacts_prob'], projDB_fp=projDB_fp)[0]
+            
+        impacts_df = impacts_prob_df.copy()
         impacts_df.columns = impacts_df.columns.astype(float).rename('AEP')
 
         self.assert_impacts_prob_df(impacts_df)
@@ -637,28 +1196,10 @@ class Model_run_methods(object):
         #=======================================================================
         # risk params
         #=======================================================================
-        #get the params
-        param_s = self.get_table_parameters(projDB_fp=projDB_fp).set_index('varName')['value']
-        
-        if ead_lowPtail is None:
-            ead_lowPtail = param_s['ead_lowPtail']
-        if ead_highPtail is None:
-            ead_highPtail = param_s['ead_highPtail']
- 
-        
-        #check
-        assert ead_lowPtail in modelTable_params_allowed_d['ead_lowPtail'], f'bad ead_lowPtail: {ead_lowPtail}'
-        assert ead_highPtail in modelTable_params_allowed_d['ead_highPtail'], f'bad ead_highPtail: {ead_highPtail}'
-        
-        if 'user' in ead_lowPtail:
-            if ead_lowPtail_user is None:
-                ead_lowPtail_user = float(param_s['ead_lowPtail_user'])
- 
-        if 'user' in ead_highPtail:
-            if ead_highPtail_user is None:
-                ead_highPtail_user = float(param_s['ead_highPtail_user'])
-            
-        log.debug(f'loaded risk params ead_lowPtail=\'{ead_lowPtail}\' ead_highPtail=\'{ead_highPtail}\'')
+        ead_lowPtail, ead_highPtail, ead_lowPtail_user, ead_highPtail_user = self._get_ead_tail_params(
+            projDB_fp=projDB_fp, logger=log,
+            ead_lowPtail=ead_lowPtail, ead_highPtail=ead_highPtail,
+            ead_lowPtail_user=ead_lowPtail_user, ead_highPtail_user=ead_highPtail_user)
         
         
         #=======================================================================
@@ -748,18 +1289,314 @@ class Model_run_methods(object):
         #=======================================================================
         df = impacts_s.to_frame().reset_index()
         #df.dtypes
-        self.set_tables({'table_impacts_sum':df}, projDB_fp=projDB_fp)
+        self._profile_rows(rows_in=len(impacts_df), rows_out=len(df))
         
-        #=======================================================================
-        # set parameter value
-        #=======================================================================
-        self.set_parameter_value('result_ead', result_ead, projDB_fp=projDB_fp)
+        if write:
+            self.set_tables({'table_impacts_sum':df}, projDB_fp=projDB_fp)
+        
+            #===================================================================
+            # set parameter value
+            #===================================================================
+            self.set_parameter_value('result_ead', result_ead, projDB_fp=projDB_fp)
         
         
         log.info(f'finished computing EAD w/ {result_ead}')
         
         return df, result_ead
         
+    def _get_ead_tail_params(self, projDB_fp=None, logger=None,
+                             ead_lowPtail=None, ead_highPtail=None,
+                             ead_lowPtail_user=None, ead_highPtail_user=None):
+        """load the EAD tail parameters (where not passed) and check them
+        
+        Returns
+        ----------
+        tuple
+            ead_lowPtail, ead_highPtail, ead_lowPtail_user, ead_highPtail_user
+        """
+        log = logger.getChild('tail_params')
+        
+        #get the params
+        param_s = self.get_table_parameters(projDB_fp=projDB_fp).set_index('varName')['value']
+        
+        if ead_lowPtail is None:
+            ead_lowPtail = param_s['ead_lowPtail']
+        if ead_highPtail is None:
+            ead_highPtail = param_s['ead_highPtail']
+ 
+        
+        #check
+        assert ead_lowPtail in modelTable_params_allowed_d['ead_lowPtail'], f'bad ead_lowPtail: {ead_lowPtail}'
+        assert ead_highPtail in modelTable_params_allowed_d['ead_highPtail'], f'bad ead_highPtail: {ead_highPtail}'
+        
+        if 'user' in ead_lowPtail:
+            if ead_lowPtail_user is None:
+                ead_lowPtail_user = float(param_s['ead_lowPtail_user'])
+ 
+        if 'user' in ead_highPtail:
+            if ead_highPtail_user is None:
+                ead_highPtail_user = float(param_s['ead_highPtail_user'])
+            
+        log.debug(f'loaded risk params ead_lowPtail=\'{ead_lowPtail}\' ead_highPtail=\'{ead_highPtail}\'')
+        
+        return ead_lowPtail, ead_highPtail, ead_lowPtail_user, ead_highPtail_user
+    
+    def get_ead_tail_sweep(self, tail_configs, 
+                           impacts_prob_df=None,
+                           projDB_fp=None, logger=None):
+        """compute the model-wide EAD for many tail configurations at once
+        
+        only the tails depend on these parameters, so the impacts are summed once
+            and all configurations are integrated in one call (see get_ead_from_impacts_ar())
+        nothing is written to the projDB
+        
+        Parameters
+        ----------
+        tail_configs: pd.DataFrame or list of dicts
+            one row per configuration w/ any of 
+                ead_lowPtail, ead_highPtail, ead_lowPtail_user, ead_highPtail_user
+            missing or null values are taken from the model parameters
+        impacts_prob_df: pd.DataFrame, optional
+            table_impacts_prob. loaded from the projDB if not passed
+            
+        Returns
+        ----------
+        pd.DataFrame
+            tail parameters and ead for each configuration
+        """
+        #=======================================================================
+        # defaults
+        #=======================================================================
+        if logger is None: logger = self.logger
+        log = logger.getChild('get_ead_tail_sweep')
+        if projDB_fp is None:
+            projDB_fp = self.parent.get_projDB_fp()
+            
+        col_l = ['ead_lowPtail', 'ead_highPtail', 'ead_lowPtail_user', 'ead_highPtail_user']
+        
+        configs_df = pd.DataFrame(tail_configs).reset_index(drop=True)
+        assert len(configs_df)>0, 'no tail configurations passed'
+        
+        miss_l = set(configs_df.columns) - set(col_l)
+        assert len(miss_l)==0, f'unrecognized tail parameters: {miss_l}'
+        
+        #=======================================================================
+        # risk params
+        #=======================================================================
+        rec_l = list()
+        for i, row in configs_df.reindex(columns=col_l).iterrows():
+            rec_l.append(self._get_ead_tail_params(projDB_fp=projDB_fp, logger=log,
+                **{k:None if pd.isnull(v) else v for k,v in row.items()}))
+            
+        params_df = pd.DataFrame(rec_l, columns=col_l).rename_axis('config')
+        
+        for k in ['ead_lowPtail_user', 'ead_highPtail_user']:
+            params_df[k] = params_df[k].astype(float)
+        
+        #=======================================================================
+        # damages
+        #=======================================================================
+        if impacts_prob_df is None:
+            impacts_prob_df = self.get_tables(['table_impacts_prob'], projDB_fp=projDB_fp)[0]
+            
+        impacts_df = impacts_prob_df.copy()
+        impacts_df.columns = impacts_df.columns.astype(float).rename('AEP')
+
+        self.assert_impacts_prob_df(impacts_df)
+        
+        impacts_s = impacts_df.sum(axis=0).sort_index(ascending=True)
+        
+        #=======================================================================
+        # integrate
+        #=======================================================================
+        log.debug(f'computing EAD for {len(params_df)} tail configurations on {len(impacts_s)} events')
+        
+        params_df['ead'] = get_ead_from_impacts_ar(
+            np.tile(impacts_s.values, (len(params_df), 1)), impacts_s.index.values,
+            params_df['ead_lowPtail'].values, params_df['ead_highPtail'].values,
+            ead_lowPtail_user=params_df['ead_lowPtail_user'].values, 
+            ead_highPtail_user=params_df['ead_highPtail_user'].values)
+        
+        log.info(f'finished computing EAD for {len(params_df)} tail configurations')
+        
+        return params_df
+        
+class Model_mc_methods(object):
+    """organizer for the Monte Carlo uncertainty methods"""
+    
+    def run_model_mc(self,
+                     n_realizations=100,
+                     dist_d=None,
+                     quantiles=(0.05, 0.5, 0.95),
+                     seed=None,
+                     chunk_size=None,
+                     max_workers=None,
+                     max_band_mb=None,
+                     projDB_fp=None,
+                     logger=None,
+                     precision=3,
+                     ):
+        """propagate input uncertainty to the EAD with Monte Carlo realizations
+        
+        each realization perturbs the depths (asset elevations and hazard samples) and the vfunc impacts
+            then follows the run_model() chain 
+            (_table_impacts_to_db > _table_impacts_prob_to_db > _table_ead_to_db and _set_ead_total)
+        realizations are computed in vectorized chunks spread across worker processes
+            nothing is written to the projDB
+        memory does not grow with the realizations x assets
+            chunks are reduced as they arrive (model-wide EAD, per-asset sums, and the kept realizations)
+        
+        Parameters
+        ----------
+        n_realizations: int
+            number of realizations
+        dist_d: dict
+            {target: (numpy.random.Generator method name, kwargs)} for each perturbed target
+            see parameters.mc_targets_d. e.g.,
+                {'elev':('normal', {'scale':0.1}), 'vfunc':('lognormal', {'sigma':0.2})}
+            targets not in dist_d are not perturbed
+        quantiles: tuple
+            quantiles for the model-wide EAD and the per-asset bands
+        seed: int, optional
+            each realization has its own random stream spawned from this seed
+                so results do not depend on chunk_size or max_workers
+        chunk_size: int, optional
+            realizations per chunk. defaults to fill parameters.mc_chunk_cells
+        max_workers: int, optional
+            number of worker processes. defaults to the cpu count. 1: compute in this process
+        max_band_mb: float, optional
+            memory cap for the per-asset EAD kept for the asset quantiles. defaults to parameters.mc_asset_band_mb
+                when exceeded, the quantiles are taken from a seeded sample of the realizations (the mean is exact)
+            
+        Returns
+        ----------------
+        pd.Series
+            model-wide EAD mean and quantiles
+        pd.DataFrame
+            per-asset EAD mean and quantiles (confidence bands)
+        pd.Series
+            model-wide EAD of each realization
+        """
+        #=======================================================================
+        # defaults
+        #=======================================================================
+        if logger is None: logger=self.logger
+        log = logger.getChild('run_model_mc')
+        start_time= datetime.now()
+        
+        if projDB_fp is None:
+            projDB_fp = self.parent.get_projDB_fp()
+            
+        if dist_d is None:
+            dist_d = dict()
+            
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+            
+        if max_band_mb is None:
+            max_band_mb = mc_asset_band_mb
+            
+        #=======================================================================
+        # prechecks
+        #=======================================================================
+        self.assert_is_ready(logger=log)
+        
+        for target, (dist_name, _) in dist_d.items():
+            assert target in mc_targets_d, f'bad perturbation target: {target}'
+            assert hasattr(np.random.Generator, dist_name), f'bad distribution: {dist_name}'
+            
+        #=======================================================================
+        # load data
+        #=======================================================================
+        expos_df, finv_dx, dem_df, vfunc_data_df = self._get_impacts_inputs(projDB_fp=projDB_fp, logger=log)
+        
+        inputs_d = get_mc_inputs_d(expos_df, finv_dx, dem_df, vfunc_data_df,
+                                   self._get_haz_events_aep(projDB_fp=projDB_fp, logger=log),
+                                   dist_d=dist_d, 
+                                   tail_params=self._get_ead_tail_params(projDB_fp=projDB_fp, logger=log),
+                                   precision=precision)
+        
+        #=======================================================================
+        # chunk
+        #=======================================================================
+        if chunk_size is None:
+            chunk_size = max(1, mc_chunk_cells//inputs_d['deps'].size)
+            
+        #enough chunks to keep the workers busy
+        chunk_size = max(1, min(chunk_size, int(np.ceil(n_realizations/max_workers))))
+        
+        seed_seq = np.random.SeedSequence(seed)
+        seed_l = seed_seq.spawn(n_realizations)
+        
+        #realizations kept for the asset quantiles (independent of the chunking)
+        n_assets = len(inputs_d['assets'])
+        band_cnt = min(n_realizations, max(1, int(max_band_mb*1e6/8/n_assets)))
+        if band_cnt<n_realizations:
+            keep_ar = np.sort(np.random.default_rng(seed_seq.spawn(1)[0]).choice(n_realizations, band_cnt, replace=False))
+            log.warning(f'per-asset quantiles from a sample of {band_cnt}/{n_realizations} realizations '+\
+                        f'(max_band_mb={max_band_mb})')
+        else:
+            keep_ar = np.arange(n_realizations)
+        
+        #(seeds, kept positions within the chunk)
+        chunks_l = list()
+        for i in range(0, n_realizations, chunk_size):
+            j = min(i+chunk_size, n_realizations)
+            k0, k1 = np.searchsorted(keep_ar, [i, j])
+            chunks_l.append((seed_l[i:j], keep_ar[k0:k1]-i))
+        
+        log.info(f'computing {n_realizations} realizations on {inputs_d["deps"].shape} depths '+\
+                 f'in {len(chunks_l)} chunks w/ {max_workers} workers')
+        
+        #=======================================================================
+        # compute
+        #=======================================================================
+        ead_l = list()
+        asset_sum_ar = np.zeros(n_assets)
+        asset_band_ar = np.empty((n_assets, band_cnt)) #assets x kept realizations
+        band_i = 0
+        
+        if max_workers>1 and len(chunks_l)>1:
+            pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=get_mp_context(),
+                                       initializer=_init_mc_worker, initargs=(inputs_d,))
+            result_iter = iter_pool_bounded(pool, _get_mc_chunk_worker, chunks_l, max_pending=2*max_workers)
+        else:
+            pool = nullcontext()
+            result_iter = (get_mc_chunk_summary(inputs_d, *chunk) for chunk in chunks_l)
+            
+        with pool:
+            for ead_ar, chunk_sum_ar, chunk_band_ar in result_iter: #in order
+                ead_l.append(ead_ar)
+                asset_sum_ar+= chunk_sum_ar
+                asset_band_ar[:, band_i:band_i+chunk_band_ar.shape[1]] = chunk_band_ar
+                band_i+=chunk_band_ar.shape[1]
+                
+        assert band_i==band_cnt
+        ead_ar = np.concatenate(ead_l)
+        
+        #=======================================================================
+        # summarize
+        #=======================================================================
+        ead_s = pd.Series(ead_ar, index=pd.RangeIndex(n_realizations, name='realization'), name='ead')
+        
+        null_bx = ead_s.isna()
+        if null_bx.any():
+            log.warning(f'{null_bx.sum()}/{len(null_bx)} realizations could not extrapolate the highPtail (null EAD)')
+            
+        stat_names = ['mean'] + [f'q{q:g}' for q in quantiles]
+        
+        ead_stats_s = pd.Series([ead_s.mean()] + ead_s.quantile(list(quantiles)).tolist(), 
+                                index=stat_names, name='ead')
+        
+        asset_ead_df = pd.DataFrame(
+            np.column_stack([asset_sum_ar/n_realizations, np.quantile(asset_band_ar, quantiles, axis=1).T]),
+            index=inputs_d['assets'], columns=stat_names)
+        
+        log.info(f'finished {n_realizations} realizations in {datetime.now()-start_time} w/ EAD\n{ead_stats_s}')
+        
+        return ead_stats_s, asset_ead_df, ead_s
+    
+    
 class Model_table_assertions(object):
     """organizer for the model table assertions"""
     def assert_finv_index_match(self, index_test, finv_index = None, projDB_fp=None):
@@ -858,7 +1695,7 @@ class Model_table_assertions(object):
 
  
     
-class Model(Model_run_methods, Model_table_assertions):
+class Model(Model_run_methods, Model_mc_methods, Model_table_assertions):
     """skinny helper functions for dealing with an individual model 
     on the model suite tab
     
@@ -888,6 +1725,13 @@ class Model(Model_run_methods, Model_table_assertions):
     #result_ead=None
     param_d=None
     
+    _param_cache_d=None #in-memory table_parameters. see get_table_parameters()
+    _param_batch_d=None #pending parameter values. see parameter_batch()
+    _uow_d=None #pending tables. see unit_of_work()
+    _uow_append_d=None #pending project table rows. see append_project_tables()
+    _profile=None #active Run_profiler. see _profiling()
+    _populated_cache_d=None #table row checks. see get_model_tables_populated_d()
+    
     compile_model_tables = [k for k,v in modelTable_params_d.items() if v['phase']=='compile'] 
     
  
@@ -919,10 +1763,14 @@ class Model(Model_run_methods, Model_table_assertions):
         
     def get_model_index_ser(self,
                             param_df=None,
+                            table_names_d=None,
                              **kwargs):
         """get row from model index for this model
         
         we assume the UI has been written to hte projDB
+        
+        table_names_d: optional {template name: table name} of this model's tables
+            loaded from the projDB if not passed
         """
         #model_index_dx = self.parent.get_model_index_dx()
         modelid = self.modelid
@@ -944,10 +1792,10 @@ class Model(Model_run_methods, Model_table_assertions):
         #=======================================================================
         # table names
         #=======================================================================
-        table_names_d = {k:np.nan for k in projDB_schema_modelTables_d.keys()}
-        table_names_d.update(self.get_table_names_all(result_as_dict=True))
-        
-        s = pd.concat([s, pd.Series(table_names_d)], axis=0) 
+        if table_names_d is None:
+            table_names_d = self.get_table_names_all(result_as_dict=True)
+            
+        s = pd.concat([s, pd.Series({**{k:np.nan for k in projDB_schema_modelTables_d.keys()}, **table_names_d})], axis=0) 
         
         #=======================================================================
         # results
@@ -994,9 +1842,8 @@ class Model(Model_run_methods, Model_table_assertions):
         if projDB_fp is None:
             projDB_fp = self.parent.get_projDB_fp()
     
-        with sqlite3.connect(projDB_fp) as conn:
-            table_names = get_table_names(conn)
-            match_l = [k for k in table_names if f'model_{self.name}' in k]
+        table_names = get_table_names(self.parent.projDB_get_conn(projDB_fp))
+        match_l = [k for k in table_names if f'model_{self.name}' in k]
     
         if result_as_dict:
             return {k.replace(self.template_prefix_str, ''): k for k in match_l}
@@ -1004,27 +1851,79 @@ class Model(Model_run_methods, Model_table_assertions):
             return match_l
 
     
-    def get_tables(self,table_names_l, result_as_dict=False, **kwargs):
-        """load model specific tables from generic table names"""
+    def get_tables(self,table_names_l, result_as_dict=False, columns=None, filters=None, **kwargs):
+        """load model specific tables from generic table names
+        
+        within a unit_of_work(), pending tables are served from memory
+        
+        columns, filters: partial reads, e.g., filters={'indexField':[1, 2], 'event_names':'0100yr'} 
+            (see db_tools.sql_to_df)"""
         assert isinstance(table_names_l, list), type(table_names_l)
-        names_d = self.get_table_names(table_names_l, result_as_dict=True)
+        pending_d = dict() if self._uow_d is None else self._uow_d
+        
+        read_l = [k for k in table_names_l if not k in pending_d]
+        names_d = self.get_table_names(read_l, result_as_dict=True)
         
         full_names = list(names_d.values())             
         
-                
-        tables =  self.parent.projDB_get_tables(full_names,template_prefix=self.template_prefix_str, **kwargs)
+        if len(full_names)>0:
+            tables =  self.parent.projDB_get_tables(full_names,template_prefix=self.template_prefix_str, 
+                                                    columns=columns, filters=filters, **kwargs)
+        else:
+            tables = list()
+            
+        tables_d = dict(zip(read_l, tables))
+        tables_d.update({k:filter_df(pending_d[k], columns=columns, filters=filters).copy() 
+                         for k in table_names_l if k in pending_d})
         
         if result_as_dict:
-            return dict(zip(table_names_l, tables))
+            return {k:tables_d[k] for k in table_names_l}
         else:
-            return tables
+            return [tables_d[k] for k in table_names_l]
         
     
-    def get_table_parameters(self, **kwargs):
-        """special loader for the parameters"""
-        df_raw = self.get_tables(['table_parameters'], **kwargs)[0]
+    def get_table_parameters(self, projDB_fp=None, use_cache=True):
+        """special loader for the parameters
+        
+        held in memory (write-through from set_tables)
+            and reloaded whenever the projDB file has been changed by someone else
+            see get_sqlite_file_signature()
+        a table_parameters pending in a unit_of_work() is returned first
+        """
+        if projDB_fp is None:
+            projDB_fp = self.parent.get_projDB_fp()
+            
+        if not self._uow_d is None:
+            if 'table_parameters' in self._uow_d:
+                return format_table_parameters(self._uow_d['table_parameters'])
+            
+        d = self._param_cache_d
+        if (not use_cache) or (d is None) or (d['projDB_fp']!=projDB_fp) or (
+            d['signature']!=get_sqlite_file_signature(projDB_fp)):
+            
+            df_raw = self.get_tables(['table_parameters'], projDB_fp=projDB_fp)[0]
+            self._set_param_cache(format_table_parameters(df_raw), projDB_fp)
         
-        return format_table_parameters(df_raw)
+        return self._param_cache_d['df'].copy()
+    
+    def _set_param_cache(self, param_df, projDB_fp):
+        """store the parameters as they are in the projDB right now"""
+        self._param_cache_d = {'projDB_fp':projDB_fp, 'df':param_df.copy(), 
+                               'signature':get_sqlite_file_signature(projDB_fp)}
+        
+    def _restamp_param_cache(self, projDB_fp):
+        """mark the cached parameters as current after our own write to some other table"""
+        if not self._param_cache_d is None:
+            if self._param_cache_d['projDB_fp']==projDB_fp:
+                self._param_cache_d['signature'] = get_sqlite_file_signature(projDB_fp)
+    
+    def get_impacts_storage(self, projDB_fp=None):
+        """on-disk encoding for table_impacts (see parameters.impacts_storage_d)"""
+        return get_impacts_storage(self.get_table_parameters(projDB_fp=projDB_fp))
+    
+    def get_float_dtype(self, projDB_fp=None):
+        """precision of the damages ('float64' or 'float32')"""
+        return get_float_dtype(self.get_table_parameters(projDB_fp=projDB_fp))
     
     def get_table_parameters_fg(self, params_df=None):
         """get function Group parameters"""
@@ -1086,8 +1985,49 @@ class Model(Model_run_methods, Model_table_assertions):
  
 
     
+    def get_model_tables_populated_d(self, projDB_fp=None):
+        """check which of this model's tables exist and have rows (without loading them)
+        
+        cached against the projDB file signature (see get_sqlite_file_signature)
+        
+        Returns
+        -------
+        dict
+            {template table name: True (has rows) or False (empty)}. missing tables are omitted
+        """
+        if projDB_fp is None:
+            projDB_fp = self.parent.get_projDB_fp()
+            
+        signature = get_sqlite_file_signature(projDB_fp)
+        
+        d = self._populated_cache_d
+        if (d is None) or (d['projDB_fp']!=projDB_fp) or (d['signature']!=signature):
+            names_d = self.get_table_names(list(projDB_schema_modelTables_d.keys()), result_as_dict=True)
+            
+            populated_d = get_table_populated_d(self.parent.projDB_get_conn(projDB_fp), list(names_d.values()))
+                
+            self._populated_cache_d = {'projDB_fp':projDB_fp, 'signature':signature,
+                'd':{k:populated_d[v] for k, v in names_d.items() if v in populated_d}}
+            
+        return self._populated_cache_d['d'].copy()
+    
     def set_tables(self, df_d, **kwargs):
-        """write the tables to the project database"""
+        """write the tables to the project database
+        
+        within a unit_of_work(), the tables are held until the unit is committed"""
+        
+        projDB_fp = kwargs.get('projDB_fp', None)
+        if projDB_fp is None:
+            projDB_fp = self.parent.get_projDB_fp()
+            
+        #store parameter values as text (as they are read back)
+        if 'table_parameters' in df_d:
+            df_d = {**df_d, 'table_parameters':normalize_table_parameters(df_d['table_parameters'])}
+            
+        if not self._uow_d is None:
+            self.get_table_names(list(df_d.keys())) #check the names
+            self._uow_d.update({k:df.copy() for k, df in df_d.items()})
+            return
         
         #recase the names
 
@@ -1099,7 +2039,9 @@ class Model(Model_run_methods, Model_table_assertions):
         df_d_recast = dict(zip(table_names, df_d.values()))
         
         # Write the tables to the project database
-        result =  self.parent.projDB_set_tables(df_d_recast, template_prefix=self.template_prefix_str, **kwargs)
+        result =  self.parent.projDB_set_tables(df_d_recast, template_prefix=self.template_prefix_str, 
+                                                impacts_storage=self.get_impacts_storage(projDB_fp=projDB_fp), 
+                                                float_dtype=self.get_float_dtype(projDB_fp=projDB_fp), **kwargs)
         
         #=======================================================================
         # #handle updates
@@ -1107,7 +2049,12 @@ class Model(Model_run_methods, Model_table_assertions):
         names_d = dict(zip(df_d.keys(), table_names ))
         for template_name, full_name in names_d.items():
             if template_name=='table_parameters':
+                #write-through
+                self._set_param_cache(format_table_parameters(df_d[template_name]), projDB_fp)
+                
                 self.parent.update_model_index_dx(self)
+                self._restamp_param_cache(projDB_fp)
+                
                 self.update_parameter_d()
                 
             #add the table name to the parameters
@@ -1124,19 +2071,219 @@ class Model(Model_run_methods, Model_table_assertions):
     def get_parameter_value(self, varName, projDB_fp=None):
         """wrapper to get a single project parameter value
         
-        could set the parameters as a dictionary for faster retrival
-            but then we need to worry about updating....
+        served from the parameter cache (see get_table_parameters)
+            pending values of an open parameter_batch() are returned first
         """
+        if not self._param_batch_d is None:
+            if varName in self._param_batch_d:
+                return self._param_batch_d[varName]
+            
         param_df = self.get_table_parameters(projDB_fp=projDB_fp)
         return param_df.loc[param_df['varName']==varName, 'value'].values[0]
     
     def set_parameter_value(self, varName, value, projDB_fp=None):
-        """wrapper to set a single project parameter value"""
-        param_df = self.get_table_parameters(projDB_fp=projDB_fp)
-        param_df.loc[param_df['varName']==varName, 'value'] = value
+        """wrapper to set a single project parameter value
+        
+        within a parameter_batch(), the value is held until the batch is flushed
+        """
+        if not self._param_batch_d is None:
+            self._param_batch_d[varName] = normalize_parameter_value(value)
+            return
+        
+        self.set_parameter_values({varName:value}, projDB_fp=projDB_fp)
+        
+    def set_parameter_values(self, value_d, projDB_fp=None):
+        """set several parameter values with a single write"""
+        param_df = add_missing_parameters(self.get_table_parameters(projDB_fp=projDB_fp), list(value_d.keys()))
+        
+        for varName, value in value_d.items():
+            param_df.loc[param_df['varName']==varName, 'value'] = value
         
         self.set_tables({'table_parameters':param_df}, projDB_fp=projDB_fp)
         
+    @contextmanager
+    def parameter_batch(self, projDB_fp=None):
+        """collect set_parameter_value() calls and flush them in a single write on exit
+        
+        nested batches are flushed by the outermost. nothing is written on an exception
+        """
+        if not self._param_batch_d is None: #already batching
+            yield self._param_batch_d
+            return
+        
+        self._param_batch_d = dict()
+        try:
+            yield self._param_batch_d
+            value_d = self._param_batch_d
+        finally:
+            self._param_batch_d = None
+            
+        if len(value_d)>0:
+            self.set_parameter_values(value_d, projDB_fp=projDB_fp)
+        
+    @contextmanager
+    def _profiling(self, profile):
+        """make profile the active Run_profiler (for _profile_stage() and _profile_rows())"""
+        if profile is None or not self._profile is None: #not profiling or already active
+            yield self._profile
+            return
+        
+        self._profile = profile
+        try:
+            yield profile
+        finally:
+            self._profile = None
+            
+    def _profile_stage(self, name):
+        """Run_profiler.stage() of the active profiler (or a dummy)"""
+        if self._profile is None:
+            return nullcontext(dict())
+        return self._profile.stage(name)
+    
+    def _profile_rows(self, rows_in=None, rows_out=None):
+        """set the row counts of the current stage (if profiling)"""
+        if not self._profile is None:
+            self._profile.set_rows(rows_in=rows_in, rows_out=rows_out)
+    
+    def append_project_tables(self, df_d, logger=None):
+        """append rows to project tables (e.g. 09_expos_store)
+        
+        within a unit_of_work(), the rows are held and appended in the same transaction as the model tables"""
+        if not self._uow_d is None:
+            for table_name, df in df_d.items():
+                self._uow_append_d.setdefault(table_name, list()).append(df.copy())
+            return
+        
+        self.parent.projDB_set_tables(df_d, if_exists='append', logger=logger)
+        
+    @contextmanager
+    def unit_of_work(self, projDB_fp=None, logger=None, profile=None):
+        """collect set_tables() and set_parameter_value() calls and commit them once on exit
+        
+        while open, tables and parameter values are held in memory (and served by the getters)
+            and compute_status() is deferred
+        on exit, everything is written in a single transaction 
+            then the model index, parameters, and status are updated once
+        nested units are committed by the outermost. nothing is written on an exception
+        
+        profile: Run_profiler, optional
+            active within the unit and written with the commit (see _commit_tables)
+        """
+        if not self._uow_d is None: #already open
+            yield self._uow_d
+            return
+        
+        if projDB_fp is None:
+            projDB_fp = self.parent.get_projDB_fp()
+            
+        #take over the parameter batch (unless some outer batch already owns it)
+        own_batch = self._param_batch_d is None
+        if own_batch:
+            self._param_batch_d = dict()
+        
+        self._uow_d, self._uow_append_d = dict(), dict()
+        try:
+            with self._profiling(profile):
+                yield self._uow_d
+            df_d, append_d = self._uow_d, self._uow_append_d
+            param_d = self._param_batch_d if own_batch else dict()
+        finally:
+            self._uow_d, self._uow_append_d = None, None
+            if own_batch:
+                self._param_batch_d = None
+                
+        if len(df_d)>0 or len(param_d)>0 or len(append_d)>0:
+            self._commit_tables(df_d, param_d=param_d, append_d=append_d, projDB_fp=projDB_fp, logger=logger, 
+                                profile=profile)
+        
+    def _commit_tables(self, df_d, param_d=dict(), append_d=dict(), projDB_fp=None, logger=None, profile=None):
+        """write several tables and parameter values to the projDB in a single transaction
+        
+        equivalent to the set_tables() and set_parameter_value() calls for each table
+            but the parameters, model index, and status are only updated once
+        a table may also be passed as an iterable of chunks (see _table_impacts_to_db)
+        
+        append_d: dict
+            project table name: list of DataFrames to append after the model tables (see append_project_tables)
+        
+        profile: Run_profiler, optional
+            the write is recorded as a stage and the rows are appended to 08_run_profile in the same transaction
+        """
+        #=======================================================================
+        # defaults
+        #=======================================================================
+        if logger is None: logger = self.logger
+        log = logger.getChild('_commit_tables')
+        if projDB_fp is None:
+            projDB_fp = self.parent.get_projDB_fp()
+            
+        df_d = df_d.copy()
+        
+        #=======================================================================
+        # update parameters
+        #=======================================================================
+        params_passed = 'table_parameters' in df_d
+        if params_passed:
+            param_df = df_d.pop('table_parameters').copy()
+        else:
+            param_df = self.get_table_parameters(projDB_fp=projDB_fp)
+            
+        names_d = self.get_table_names(list(df_d.keys()), result_as_dict=True)
+        
+        #nothing new (a passed parameters table is always written)
+        if len(df_d)==0 and not params_passed and len(append_d)==0 and (param_d==dict() or 
+            param_df.set_index('varName')['value'].reindex(list(param_d.keys())).tolist()==[
+                normalize_parameter_value(v) for v in param_d.values()]):
+            log.debug(f'no changes to commit')
+            return
+        
+        #add the table names and other values
+        param_df = add_missing_parameters(param_df, list(param_d.keys()))
+        for varName, value in {**names_d, **param_d}.items():
+            param_df.loc[param_df['varName']==varName, 'value'] = value
+            
+        param_df = normalize_table_parameters(param_df)
+        
+        #=======================================================================
+        # write
+        #=======================================================================
+        names_d['table_parameters'] = self.get_table_names(['table_parameters'])[0]
+        write_d = {names_d[k]:df for k, df in {**df_d, 'table_parameters':param_df}.items()}
+        
+        #model index (with the new tables) so readers never see orphaned tables
+        #loaded before the transaction (a large write may lock out other connections)
+        model_index_dx = self.parent.get_model_index_dx_updated(self, 
+            model_index_s=self.get_model_index_ser(param_df=format_table_parameters(param_df), table_names_d={
+                **self.get_table_names_all(projDB_fp=projDB_fp, result_as_dict=True), **names_d}))
+        
+        with sqlite_transaction(projDB_fp, conn=self.parent.projDB_get_conn(projDB_fp)) as conn:
+            with (nullcontext(dict()) if profile is None else profile.stage('write')) as rec:
+                rec['rows_in'] = sum([len(df) for df in write_d.values() if isinstance(df, pd.DataFrame)])
+                
+                self.parent.projDB_set_tables(write_d, conn=conn, template_prefix=self.template_prefix_str, logger=log,
+                                          impacts_storage=get_impacts_storage(param_df), float_dtype=get_float_dtype(param_df))
+                self.parent.projDB_set_tables({'03_model_suite_index':model_index_dx}, conn=conn, logger=log)
+                
+                for table_name, df_l in append_d.items():
+                    self.parent.projDB_set_tables({table_name:pd.concat(df_l)}, conn=conn, if_exists='append', logger=log)
+                
+            if not profile is None:
+                self.parent.projDB_set_tables({'08_run_profile':profile.get_df()}, conn=conn, if_exists='append', logger=log)
+            
+        log.debug(f'wrote {len(write_d)} tables and the model index in a single transaction')
+        
+        #copy the write-ahead log into the projDB file (so it can be copied while open)
+        conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+        
+        #=======================================================================
+        # handle updates
+        #=======================================================================
+        self._set_param_cache(format_table_parameters(param_df), projDB_fp) #write-through
+        self._restamp_param_cache(projDB_fp)
+        
+        self.update_parameter_d(projDB_fp=projDB_fp)
+        self.compute_status()
+        
     def update_parameter_d(self, **kwargs):
         """set the parameters as a dictionary for faster retrival
         
@@ -1201,11 +2348,12 @@ class Model(Model_run_methods, Model_table_assertions):
             #===================================================================
             # tables
             #===================================================================
-            df_d = self.get_model_tables_all(result_as_dict=True)
+            #check existence and rows from the catalog (no need to load the tables)
+            populated_d = self.get_model_tables_populated_d()
             
             #check missing tables
                        
-            miss_l = set(self.compile_model_tables) - set(df_d.keys())
+            miss_l = set(self.compile_model_tables) - set(populated_d.keys())
             
             if len(miss_l)>0:
                 status = 'incomplete'
@@ -1215,7 +2363,7 @@ class Model(Model_run_methods, Model_table_assertions):
                 #tables populated
                 for table_name in self.compile_model_tables:
                     
-                    if df_d[table_name].shape[0]==0:
+                    if not populated_d[table_name]:
                         status = 'incomplete'
                         msg = f'empty table: {table_name}'
                         break
@@ -1248,6 +2396,10 @@ class Model(Model_run_methods, Model_table_assertions):
         #=======================================================================
         if logger is None:logger = self.logger
         log = logger.getChild('compute_status')
+        
+        if not self._uow_d is None:
+            log.debug(f'deferred until the unit_of_work is committed')
+            return self.status
  
         
         #=======================================================================
@@ -1269,11 +2421,12 @@ class Model(Model_run_methods, Model_table_assertions):
         
         #self.update_parameter_d()
         
-        #update the main dialog
-        try:
-            self.widget_d['label_mod_status']['widget'].setText(status)
-        except Exception as e:
-            raise IOError(f'failed to update Main_dialog status label w/ \n    {e}')
+        #update the main dialog (not present when running headless. see cli.py)
+        if not self.widget_d is None:
+            try:
+                self.widget_d['label_mod_status']['widget'].setText(status)
+            except Exception as e:
+                raise IOError(f'failed to update Main_dialog status label w/ \n    {e}')
         
         #update model config dialog
         if not self.Model_config_dialog is None:
@@ -1352,6 +2505,35 @@ class Model(Model_run_methods, Model_table_assertions):
 
 
 
+def _add_to_progressBar(progressBar, increment):
+    """helper for adding to the progress bar"""
+    if progressBar is not None:
+        current_value = progressBar.value()
+        if current_value<100:
+            progressBar.setValue(current_value + increment)
+            
+            
+def get_impacts_chunk_rows(max_memory_mb):
+    """rows of table_impacts to compute (or read) at once within the memory budget"""
+    return max(1, int(max_memory_mb*1e6/impacts_row_bytes))
+
+def get_index_chunks(index_ar, max_rows):
+    """split the index values into blocks of whole values
+    
+    each block has about max_rows rows (at least one value per block)
+    
+    Returns
+    ----------
+    list
+        np.ndarray of the sorted unique values in each block
+    """
+    values_ar, counts_ar = np.unique(np.asarray(index_ar), return_counts=True)
+    
+    #block of the first row of each value
+    block_ar = (np.cumsum(counts_ar) - counts_ar)//max_rows
+    
+    return np.split(values_ar, np.flatnonzero(np.diff(block_ar))+1)
+
 def get_area_from_ser(ser, dx=0.1):
     """
     Compute the area under the curve defined by a pandas Series,
@@ -1374,11 +2556,614 @@ def get_area_from_ser(ser, dx=0.1):
 
     y = ser.values
     return integration_func(y, x=x, dx=dx)
+
+
+def get_trapezoid_weights(x):
+    """weight vector for trapezoidal integration on the x-values
+    
+    area = y @ w  
+        equivalent to integration_func(y, x=x)
+    """
+    x = np.asarray(x, dtype=float)
+    assert x.ndim==1 and len(x)>1, 'need at least 2 x-values'
+    
+    d = np.diff(x)
+    w = np.zeros(len(x))
+    w[:-1] += d/2.0 #left side of each trapezoid
+    w[1:] += d/2.0 #right side
+    
+    return w
+
+
+def get_area_from_df(df):
+    """
+    Compute the area under the curve for each row of a pandas DataFrame,
+    where the x-values are taken from the columns (assumed numeric)
+    and the y-values are the row values.
+    
+    Vectorized version of df.apply(get_area_from_ser, axis=1):
+        the trapezoid weights are built once from the columns 
+        and all rows are integrated with a single matrix-vector product.
+        results match get_area_from_ser to floating point precision.
+    
+    Parameters:
+        df (pd.DataFrame): frame with numeric columns (x-values)
+    
+    Returns:
+        pd.Series: area under the curve for each row
+    """
+    try:
+        x = df.columns.astype(float)
+    except ValueError as e:
+        raise ValueError("DataFrame columns could not be converted to float. Ensure your column names are numeric.") from e
+    
+    w = get_trapezoid_weights(x)
+    
+    return pd.Series(df.to_numpy(dtype=float) @ w, index=df.index)
+    
+
+def get_vfunc_curve_arrays(vfunc_data_df, precision=3):
+    """stack the vfunc curves from 07_vfunc_data into padded arrays
+    
+    Returns
+    ----------
+    dict
+        tags: pd.Index of tags (row labels for the arrays)
+        exposure: np.ndarray (tags x points) sorted exposures padded with +inf
+        impact: np.ndarray (tags x points) impacts padded with nan
+        count: np.ndarray number of points per tag
+        impact_max: np.ndarray maximum impact per tag
+    """
+    df = vfunc_data_df.round(precision).astype({'exposure':float, 'impact':float}
+                                              ).sort_values(['tag', 'exposure'])
+    
+    tags = pd.Index(df['tag'].unique(), name='tag')
+    code_ar = tags.get_indexer(df['tag'])
+    count_ar = np.bincount(code_ar, minlength=len(tags))
+    
+    #position of each point on its curve
+    pos_ar = np.arange(len(df)) - np.repeat(np.cumsum(count_ar) - count_ar, count_ar)
+    
+    xp_ar = np.full((len(tags), count_ar.max()), np.inf)
+    fp_ar = np.full((len(tags), count_ar.max()), np.nan)
+    xp_ar[code_ar, pos_ar] = df['exposure'].to_numpy()
+    fp_ar[code_ar, pos_ar] = df['impact'].to_numpy()
+    
+    #check monotonocity
+    same_curve_bx = code_ar[1:]==code_ar[:-1]
+    exposure_ar, impact_ar = df['exposure'].to_numpy(), df['impact'].to_numpy()
+    assert np.all(np.diff(exposure_ar)[same_curve_bx]>0), 'exposure values must be increasing'
+    assert np.all(np.diff(impact_ar)[same_curve_bx]>=0), 'impact values must be non-decreasing'
+    
+    return {'tags':tags, 'exposure':xp_ar, 'impact':fp_ar, 'count':count_ar, 
+            'impact_max':np.nanmax(fp_ar, axis=1)}
+    
+
+#compiled vfunc curves {(07_vfunc_data hash, precision): curves_d}. see get_vfunc_curves_cached()
+_vfunc_curves_cache_d = dict()
+
+def get_vfunc_curves_cached(vfunc_data_df, precision=3):
+    """get_vfunc_curve_arrays(), rebuilt only when the curves change
+    
+    held in memory (keyed on the content of vfunc_data_df) so repeat runs, chunks, 
+        and Monte Carlo realizations share the compiled curves. do not modify the result
+        
+    the lookup grid ('grid') is added by get_vfunc_curves_grid() on first use
+    """
+    key = (get_data_hash(vfunc_data_df), precision)
+    
+    if not key in _vfunc_curves_cache_d:
+        if len(_vfunc_curves_cache_d)>=vfunc_cache_size: #drop the oldest
+            del _vfunc_curves_cache_d[next(iter(_vfunc_curves_cache_d))]
+            
+        curves_d = get_vfunc_curve_arrays(vfunc_data_df, precision=precision)
+        curves_d['precision'] = precision
+        
+        _vfunc_curves_cache_d[key] = curves_d
+        
+    return _vfunc_curves_cache_d[key]
+
+
+def get_vfunc_curves_grid(curves_d, lookup_cnt):
+    """lookup grid of some cached curves. built once the lookups outweigh the grid size
+    
+    Returns
+    ----------
+    dict from get_vfunc_curve_grid() or None
+    """
+    if not 'grid' in curves_d:
+        if not 'precision' in curves_d: #not from get_vfunc_curves_cached
+            return None
+        
+        if not 'grid_cells' in curves_d:
+            scale = 10**curves_d['precision']
+            curves_d['grid_cells'] = int((np.rint(curves_d['exposure'][np.arange(len(curves_d['count'])), curves_d['count']-1]*scale) - 
+                                          np.rint(curves_d['exposure'][:, 0]*scale) + 1).sum())
+            
+        if lookup_cnt<curves_d['grid_cells']:
+            return None
+        
+        curves_d['grid'] = get_vfunc_curve_grid(curves_d, precision=curves_d['precision'])
+        
+    return curves_d['grid']
+    
+    
+def get_vfunc_curve_grid(curves_d, precision=3, max_cells=vfunc_grid_max_cells):
+    """resample each curve onto the exposure rounding grid (10**-precision) for O(1) lookups
+    
+    grid values are computed with interp_vfunc_curves() so lookups match it exactly
+    
+    Returns
+    ----------
+    dict
+        start: first grid step of each curve (exposure*10**precision)
+        count: grid steps on each curve
+        offset: position of each curve on impact
+        impact: impacts of all curves on the grid (flat)
+        precision
+    None if the grid would exceed max_cells
+    """
+    scale = 10**precision
+    row_ar = np.arange(len(curves_d['count']))
+    
+    start_ar = np.rint(curves_d['exposure'][:, 0]*scale).astype(np.int64)
+    count_ar = np.rint(curves_d['exposure'][row_ar, curves_d['count']-1]*scale).astype(np.int64) - start_ar + 1
+    
+    if count_ar.sum()>max_cells:
+        return None
+    
+    offset_ar = np.cumsum(count_ar) - count_ar
+    
+    #grid exposures (same floats as np.round(x, precision))
+    code_ar = np.repeat(row_ar, count_ar)
+    x_ar = (np.arange(count_ar.sum()) - offset_ar[code_ar] + start_ar[code_ar])/scale
+    
+    return {'start':start_ar, 'count':count_ar, 'offset':offset_ar, 'precision':precision,
+            'impact':interp_vfunc_curves(x_ar, code_ar, curves_d['exposure'], curves_d['impact'], 
+                                        curves_d['count'], left=0.0, right_ar=curves_d['impact_max'])}
+    
+    
+def lookup_vfunc_grid(x_ar, code_ar, grid_d, right_ar):
+    """interp_vfunc_curves() (left=0) from the grid of get_vfunc_curve_grid()
+    
+    Returns
+    ----------
+    np.ndarray
+        None if some exposures are not on the grid (i.e., not rounded to the grid precision)
+    """
+    scale = 10**grid_d['precision']
+    
+    with np.errstate(invalid='ignore'):
+        k_ar = np.rint(x_ar*scale)
+        
+    null_bx = np.isnan(x_ar)
+    if not np.all((k_ar/scale==x_ar) | null_bx):
+        return None
+    
+    pos_ar = np.where(null_bx, 0, k_ar).astype(np.int64) - grid_d['start'][code_ar]
+    count_i_ar = grid_d['count'][code_ar]
+    
+    result_ar = grid_d['impact'][grid_d['offset'][code_ar] + np.clip(pos_ar, 0, count_i_ar-1)]
+    
+    result_ar = np.where(pos_ar<0, 0.0, result_ar)
+    result_ar = np.where(pos_ar>=count_i_ar, right_ar[code_ar], result_ar)
+    
+    return np.where(null_bx, np.nan, result_ar)
+    
+
+def interp_vfunc_curves(x_ar, code_ar, xp_ar, fp_ar, count_ar, left=0.0, right_ar=None):
+    """equivalent to calling np.interp on each curve, but for all curves at once
+    
+    Parameters
+    ----------
+    x_ar: np.ndarray
+        exposure values to find impacts on (1D)
+    code_ar: np.ndarray
+        row of xp_ar/fp_ar (curve) to use for each x_ar value
+    xp_ar, fp_ar: np.ndarray
+        padded curve arrays (see get_vfunc_curve_arrays)
+    count_ar: np.ndarray
+        number of points on each curve
+    left: float
+        value for exposures below the curve
+    right_ar: np.ndarray, optional
+        value for exposures above each curve. defaults to the last impact
+    """
+    count_i_ar = count_ar[code_ar]
+    
+    #find the segment (same search result as np.interp: xp[j] <= x < xp[j+1])
+    j_ar = np.full(x_ar.shape, -1, dtype=np.int64)
+    for k in range(xp_ar.shape[1]):
+        j_ar += xp_ar[code_ar, k] <= x_ar #padding and nulls are never counted
+        
+    #segment end points
+    jc_ar = np.maximum(np.minimum(j_ar, count_i_ar - 2), 0)
+    x0_ar, x1_ar = xp_ar[code_ar, jc_ar], xp_ar[code_ar, np.minimum(jc_ar + 1, xp_ar.shape[1]-1)]
+    y0_ar, y1_ar = fp_ar[code_ar, jc_ar], fp_ar[code_ar, np.minimum(jc_ar + 1, xp_ar.shape[1]-1)]
+    
+    #interpolate (same operation order as np.interp)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope_ar = (y1_ar - y0_ar) / (x1_ar - x0_ar)
+        result_ar = slope_ar * (x_ar - x0_ar) + y0_ar
+    
+    #exact hits and out of range values
+    last_i_ar = count_i_ar - 1
+    result_ar = np.where(x_ar == x0_ar, y0_ar, result_ar)
+    result_ar = np.where(j_ar == last_i_ar, fp_ar[code_ar, last_i_ar], result_ar)
+    result_ar = np.where(j_ar == -1, left, result_ar)
+    
+    if right_ar is None:
+        right_ar = fp_ar[np.arange(len(count_ar)), count_ar - 1]
+    result_ar = np.where(x_ar > xp_ar[code_ar, last_i_ar], right_ar[code_ar], result_ar)
+    
+    return np.where(np.isnan(x_ar), np.nan, result_ar)
+    
+    
+def get_impacts_from_depths(deps_ar, tag_ar=None, scale_ar=None, cap_ar=None,
+                            vfunc_data_df=None, precision=3, curves_d=None, code_ar=None, backend=None,
+                            dtype='float64'):
+    """compute the depth > impact > scale > cap chain on flat arrays
+    
+    Parameters
+    ----------
+    deps_ar: np.ndarray
+        rounded exposures (1D). nulls are carried through as null on all outputs
+    tag_ar, scale_ar, cap_ar: np.ndarray
+        asset parameters broadcast onto deps_ar
+    vfunc_data_df: pd.DataFrame, optional
+        07_vfunc_data. if None (and no curves_d), L1 (binary) impacts are computed
+    curves_d: dict, optional
+        precomputed get_vfunc_curves_cached(). with code_ar (curve row for each deps_ar) in place of tag_ar
+    backend: str, optional
+        L2 kernel (see parameters.impacts_backend_l). defaults to 'numba' if installed
+    dtype: str
+        precision of the results (computed in float64)
+    
+    Returns
+    ----------
+    tuple
+        impact, impact_scaled, impact_capped arrays
+    """
+    if backend is None:
+        backend = 'numba' if numba_available else 'numpy'
+    assert backend in impacts_backend_l, f'bad backend: {backend}'
+    
+    null_bx = np.isnan(deps_ar)
+    
+    #===========================================================================
+    # impacts
+    #===========================================================================
+    if vfunc_data_df is None and curves_d is None: #L1
+        impact_ar = (deps_ar>0.0).astype(float)
+    else: #L2
+        if curves_d is None:
+            curves_d = get_vfunc_curves_cached(vfunc_data_df, precision=precision)
+        
+        if code_ar is None:
+            code_ar = curves_d['tags'].get_indexer(tag_ar)
+        assert np.all(code_ar>=0), 'missing tags'
+        
+        if backend=='numba': #compiled chain (matches the below)
+            return get_impacts_jit(deps_ar, code_ar, curves_d, scale_ar, cap_ar, dtype=dtype)
+        
+        impact_ar = None
+        grid_d = get_vfunc_curves_grid(curves_d, deps_ar.size)
+        if not grid_d is None: #O(1) lookup
+            impact_ar = lookup_vfunc_grid(deps_ar, code_ar, grid_d, curves_d['impact_max'])
+            
+        if impact_ar is None: 
+            impact_ar = interp_vfunc_curves(deps_ar, code_ar, curves_d['exposure'], curves_d['impact'], 
+                                        curves_d['count'], left=0, right_ar=curves_d['impact_max'])
+        
+    #===========================================================================
+    # scale and cap
+    #===========================================================================
+    impact_scaled_ar = impact_ar*np.where(np.isnan(scale_ar), 1.0, scale_ar)
+    
+    impact_capped_ar = np.fmin(impact_scaled_ar, cap_ar) #ignores nans
+    
+    #null exposures are null throughout
+    return tuple(np.where(null_bx, np.nan, ar).astype(dtype, copy=False) 
+                 for ar in (impact_ar, impact_scaled_ar, impact_capped_ar))
+    
+
+#worker process copy of the Monte Carlo inputs. see _init_mc_worker()
+_mc_inputs_d = None
+
+def _init_mc_worker(inputs_d):
+    global _mc_inputs_d
+    _mc_inputs_d = inputs_d
+    
+def _get_mc_chunk_worker(seed_l, keep_ar):
+    return get_mc_chunk_summary(_mc_inputs_d, seed_l, keep_ar)
+
+def iter_pool_bounded(pool, func, args_l, max_pending=4):
+    """pool results in the order of args_l w/ at most max_pending tasks submitted (and results held) at once"""
+    pending = deque()
+    for args in args_l:
+        pending.append(pool.submit(func, *args))
+        if len(pending)>=max_pending:
+            yield pending.popleft().result()
+            
+    while len(pending)>0:
+        yield pending.popleft().result()
+
+
+def get_mc_inputs_d(expos_df, finv_dx, dem_df, vfunc_data_df, aep_s, 
+                    dist_d=dict(), tail_params=None, precision=3):
+    """prepare the arrays for get_mc_chunk()
+    
+    plain arrays so they are cheap to send to the worker processes
+    
+    Parameters
+    ----------
+    expos_df, finv_dx, dem_df, vfunc_data_df: 
+        see Model._get_impacts_inputs()
+    aep_s: pd.Series
+        AEP of each event. see Model._get_haz_events_aep()
+    tail_params: tuple
+        see Model._get_ead_tail_params()
+    """
+    finv_dx = finv_dx.sort_index()
+    ifield_ar = finv_dx.index.get_level_values('indexField')
+    
+    #events in ascending AEP order (see _table_impacts_prob_to_db)
+    assert set(expos_df.columns).issubset(aep_s.index), 'missing event probabilities'
+    aep_s = aep_s.loc[expos_df.columns].sort_values()
+    
+    #===========================================================================
+    # depths (see _get_impacts_dx_vectorized)
+    #===========================================================================
+    deps_ar = expos_df.loc[:, aep_s.index].to_numpy(dtype=float)[expos_df.index.get_indexer(ifield_ar), :]
+    
+    if not dem_df is None:
+        gels_ar = dem_df.iloc[:, 0].to_numpy(dtype=float)[dem_df.index.get_indexer(ifield_ar)]
+        deps_ar = deps_ar - gels_ar[:, None]
+        
+    deps_ar = deps_ar - finv_dx['elev'].to_numpy(dtype=float)[:, None] #rounded after perturbing
+    
+    #===========================================================================
+    # assets
+    #===========================================================================
+    assets = ifield_ar.unique() #sorted
+    asset_code_ar = assets.get_indexer(ifield_ar)
+    asset_start_ar = np.flatnonzero(np.r_[True, asset_code_ar[1:]!=asset_code_ar[:-1]])
+    
+    #===========================================================================
+    # curves
+    #===========================================================================
+    if vfunc_data_df is None: #L1
+        curves_d, tag_code_ar, n_tags = None, np.zeros(len(finv_dx), dtype=int), 1
+    else:
+        curves_d = get_vfunc_curves_cached(vfunc_data_df, precision=precision)
+        tag_code_ar = curves_d['tags'].get_indexer(finv_dx['tag'])
+        assert np.all(tag_code_ar>=0), 'missing tags'
+        n_tags = len(curves_d['tags'])
+        
+    scale_ar = finv_dx['scale'].to_numpy(dtype=float)
+    
+    return {'deps':deps_ar, 'aep':aep_s.to_numpy(dtype=float),
+            'assets':pd.Index(assets, name='indexField'), 'asset_code':asset_code_ar, 'asset_start':asset_start_ar,
+            'curves_d':curves_d, 'tag_code':tag_code_ar, 'n_tags':n_tags,
+            'scale':np.where(np.isnan(scale_ar), 1.0, scale_ar), 'cap':finv_dx['cap'].to_numpy(dtype=float),
+            'dist_d':dist_d, 'tail_params':tail_params, 'precision':precision}
+
+
+def get_mc_chunk(inputs_d, seed_l):
+    """compute the model-wide and per-asset EAD for a chunk of Monte Carlo realizations
+    
+    Parameters
+    ----------
+    inputs_d: dict
+        see get_mc_inputs_d()
+    seed_l: list
+        np.random.SeedSequence for each realization
+    
+    Returns
+    ----------
+    tuple
+        model-wide EAD (realizations), per-asset EAD (assets x realizations)
+    """
+    d = inputs_d
+    n = len(seed_l)
+    n_assets = len(d['assets'])
+    
+    #===========================================================================
+    # draw
+    #===========================================================================
+    shift_ar = np.zeros((n, n_assets))
+    factor_ar = np.ones((n, d['n_tags']))
+    
+    for i, seed_seq in enumerate(seed_l):
+        rng = np.random.default_rng(seed_seq)
+        for target in mc_targets_d.keys(): #fixed draw order
+            if not target in d['dist_d']:
+                continue
+            dist_name, kwargs = d['dist_d'][target]
+            draw = getattr(rng, dist_name)
+            
+            if target=='elev':
+                shift_ar[i] -= draw(size=n_assets, **kwargs)
+            elif target=='expos':
+                shift_ar[i] += draw(size=n_assets, **kwargs)
+            elif target=='vfunc':
+                factor_ar[i] = np.maximum(draw(size=d['n_tags'], **kwargs), 0.0)
+            else:
+                raise KeyError(target)
+            
+    #===========================================================================
+    # impacts (realizations x asset rows x events)
+    #===========================================================================
+    deps_ar = np.round(d['deps'][None, :, :] + shift_ar[:, d['asset_code']][:, :, None], d['precision'])
+    shape = deps_ar.shape
+    
+    _, _, impact_capped_ar = get_impacts_from_depths(
+        deps_ar.ravel(),
+        scale_ar=np.broadcast_to((d['scale'][None, :]*factor_ar[:, d['tag_code']])[:, :, None], shape).ravel(),
+        cap_ar=np.broadcast_to(d['cap'][None, :, None], shape).ravel(),
+        curves_d=d['curves_d'], 
+        code_ar=np.broadcast_to(d['tag_code'][None, :, None], shape).ravel())
+    
+    #sum on the function groups. null exposures have no impact (see _table_impacts_prob_to_db)
+    impacts_ar = np.add.reduceat(np.nan_to_num(impact_capped_ar.reshape(shape)), d['asset_start'], axis=1)
+    
+    #===========================================================================
+    # EAD
+    #===========================================================================
+    #per-asset w/ a flat low-probability tail (see _table_ead_to_db)
+    w = get_trapezoid_weights(np.r_[0.0, d['aep']])
+    asset_ead_ar = impacts_ar[:, :, 0]*w[0] + impacts_ar @ w[1:]
+    
+    #model-wide w/ the model's tails (see _set_ead_total)
+    ead_ar = get_ead_from_impacts_ar(impacts_ar.sum(axis=1), d['aep'], *d['tail_params'])
+    
+    return ead_ar, asset_ead_ar.T
+
+
+def get_mc_chunk_summary(inputs_d, seed_l, keep_ar):
+    """get_mc_chunk() reduced to what run_model_mc() keeps
+    
+    keep_ar: np.ndarray
+        positions (within the chunk) of the realizations kept for the asset quantiles
+    
+    Returns
+    ----------
+    tuple
+        model-wide EAD (realizations), per-asset EAD sum, per-asset EAD (assets x kept realizations)
+    """
+    ead_ar, asset_ead_ar = get_mc_chunk(inputs_d, seed_l)
+    
+    return ead_ar, asset_ead_ar.sum(axis=1), asset_ead_ar[:, keep_ar]
+
+
+def get_ead_from_impacts_ar(impacts_ar, aep_ar, 
+                            ead_lowPtail, ead_highPtail, ead_lowPtail_user=None, ead_highPtail_user=None):
+    """integrate many impact curves with tails
+    
+    vectorized version of the tails and integration in Model._set_ead_total()
+        the tails are added as trapezoids on either end of the shared AEP grid
+    
+    Parameters
+    ----------
+    impacts_ar: np.ndarray
+        impacts (curves x events) with events in ascending AEP order
+    aep_ar: np.ndarray
+        AEP of each event (ascending)
+    ead_lowPtail, ead_highPtail, ead_lowPtail_user, ead_highPtail_user: scalar or np.ndarray
+        tail parameters. either one for all curves or one per curve (see Model.get_ead_tail_sweep())
+        
+    Returns
+    ----------
+    np.ndarray
+        EAD of each curve. null where the highPtail can not be extrapolated (impacts not decreasing)
+    """
+    y_ar = np.asarray(impacts_ar, dtype=float)
+    x_ar = np.asarray(aep_ar, dtype=float)
+    assert y_ar.ndim==2 and y_ar.shape[1]==len(x_ar)>1, 'need at least 2 events'
+    
+    #broadcast the parameters onto the curves
+    get_ar = lambda v, dtype: np.broadcast_to(np.asarray(v, dtype=dtype), (len(y_ar),))
+    low_ar, high_ar = get_ar(ead_lowPtail, object), get_ar(ead_highPtail, object)
+    low_user_ar = get_ar(np.nan if ead_lowPtail_user is None else ead_lowPtail_user, float)
+    high_user_ar = get_ar(np.nan if ead_highPtail_user is None else ead_highPtail_user, float)
+    
+    low_user_bx = np.array(['user' in v for v in low_ar], dtype=bool)
+    high_user_bx = np.array(['user' in v for v in high_ar], dtype=bool)
+    
+    for k, ar, user_bx, allowed_l in [
+        ('ead_lowPtail', low_ar, low_user_bx, ['none', 'flat', 'extrapolate']),
+        ('ead_highPtail', high_ar, high_user_bx, ['none', 'extrapolate'])]:
+        miss_s = set(ar[~user_bx]) - set(allowed_l)
+        if len(miss_s)>0:
+            raise KeyError(f'unreecognized {k}: {miss_s}')
+    
+    #===========================================================================
+    # events
+    #===========================================================================
+    ead_ar = y_ar @ get_trapezoid_weights(x_ar)
+    
+    #===========================================================================
+    # low probability tail (leftward)
+    #===========================================================================
+    x0, x1 = x_ar[0:2]
+    
+    if low_user_bx.any():
+        assert np.all(low_user_ar[low_user_bx]>y_ar.max(axis=1)[low_user_bx]), \
+            f'specifeid lowPtail must be greater than the maximum impact value'
+    
+    #impact at AEP=0
+    y0_ar = np.select([low_ar=='flat', low_ar=='extrapolate', low_user_bx], [
+        y_ar[:, 0], 
+        y_ar[:, 0] + (0 - x0) * (y_ar[:, 1] - y_ar[:, 0]) / (x1 - x0),
+        low_user_ar], default=np.nan)
+    
+    ead_ar = ead_ar + np.where(low_ar=='none', 0.0, (y0_ar + y_ar[:, 0])/2*x0)
+    
+    #===========================================================================
+    # high probability tail (rightward)
+    #===========================================================================
+    xn, xn1, yn_ar, yn1_ar = x_ar[-2], x_ar[-1], y_ar[:, -2], y_ar[:, -1]
+    
+    if high_user_bx.any():
+        assert np.all(high_user_ar[high_user_bx]>xn1), \
+            f'specifeid highPtail must be greater than the maximum AEP value {xn1}'
+    
+    #x value at y=0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p_for_ead0_ar = xn - (yn_ar * (xn1 - xn)) / (yn1_ar - yn_ar)
+    
+    extrap_bx = high_ar=='extrapolate'
+    tail_ar = np.select([extrap_bx & (yn1_ar>0), high_user_bx], [
+        (p_for_ead0_ar - xn1)*yn1_ar/2,
+        (high_user_ar - xn1)*yn1_ar/2], default=0.0)
+    
+    bad_bx = extrap_bx & (yn1_ar>0) & ~(p_for_ead0_ar>xn1)
+    
+    return np.where(bad_bx, np.nan, ead_ar + tail_ar)
     
 
 def format_table_parameters(df_raw):
     return df_raw.copy().astype({'required':bool, 'model_index':bool}).fillna(np.nan)
 
+def normalize_parameter_value(value):
+    """parameter values are stored as text in the projDB"""
+    if pd.isnull(value):
+        return np.nan
+    return str(value)
+
+def get_impacts_storage(param_df):
+    """table_impacts encoding from the parameters table (projDBs from older versions are 'long')"""
+    return _get_parameter_or_default(param_df, 'impacts_storage')
+
+def get_float_dtype(param_df):
+    """damages precision from the parameters table (projDBs from older versions are 'float64')"""
+    return _get_parameter_or_default(param_df, 'float_dtype')
+
+def _get_parameter_or_default(param_df, varName):
+    """allowed parameter value w/ the template default for missing or blank values"""
+    value = param_df.set_index('varName')['value'].get(varName, np.nan)
+    if pd.isnull(value):
+        value = modelTable_params_d['table_parameters']['df'].set_index('varName').loc[varName, 'value']
+    
+    assert value in modelTable_params_allowed_d[varName], f'bad {varName}: {value}'
+    return value
+
+def add_missing_parameters(param_df, varName_l):
+    """append template rows for parameters missing from the table (e.g., projDBs from older versions)"""
+    template_df = modelTable_params_d['table_parameters']['df']
+    
+    bx = template_df['varName'].isin(varName_l) & ~template_df['varName'].isin(param_df['varName'])
+    if not bx.any():
+        return param_df
+    
+    return pd.concat([param_df, template_df.loc[bx]], ignore_index=True)
+
+def normalize_table_parameters(df):
+    """cast the parameter values to text so the in-memory table matches what is written"""
+    df = df.copy()
+    df['value'] = df['value'].map(normalize_parameter_value).astype(object)
+    return df
+
 def _get_proj_meta_d(log, 
  
                    ):
@@ -1392,7 +3177,7 @@ def _get_proj_meta_d(log,
             'script_name':[os.path.basename(__file__)],
             'script_path':[os.path.dirname(__file__)],
             'now':[datetime.now()], 
-            'username':[os.getlogin()], 
+            'username':[getpass.getuser()], 
 
             'canflood2_version':[__version__], 
             'python_version':[sys.version.split()[0]],
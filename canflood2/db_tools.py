@@ -7,14 +7,18 @@ basic functions for working with the project sqlite databases
 
 separated here for module dependence
 '''
-import warnings
+import warnings, json, weakref, sqlite3
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
-from .parameters import project_db_schema_d, projDB_schema_modelTables_d
-from .hp.sql import pd_dtype_to_sqlite_type, get_columns_names
+from .parameters import (project_db_schema_d, projDB_schema_modelTables_d, impacts_storage_d, impacts_binary_tag,
+    expos_store_prefix, projDB_pragma_d, projDB_table_cache_d, modelTable_sql_indexes_d)
+from .hp.sql import (pd_dtype_to_sqlite_type, get_columns_names, iter_sql_groups, get_table_names, drop_table,
+    get_sqlite_conn, bulk_to_sql, get_primary_key, iter_select_sql, get_filter_values)
 from .hp.assertions import (
     assert_df_template_match,  assert_sqlite_table_exists, assert_intersection
     )
-from .hp.pd import map_multiindex_dtypes
+from .hp.pd import map_multiindex_dtypes, get_data_hash
 
 """need some very simple functions here to workaround module dependence"""
 
@@ -28,6 +32,107 @@ from .hp.pd import map_multiindex_dtypes
 
 
     
+#===============================================================================
+# CONNECTIONS---------
+#===============================================================================
+def get_projDB_conn(projDB_fp, read_only=False):
+    """session connection on the project database (see hp.sql.get_sqlite_conn)"""
+    return get_sqlite_conn(projDB_fp, read_only=read_only, pragma_d=projDB_pragma_d)
+
+    
+#===============================================================================
+# TABLE CACHE---------
+#===============================================================================
+class Table_cache(object):
+    """LRU cache of the tables read through one connection (see sql_to_df_cached)
+    
+    entries are dropped when their table is written by df_to_sql (or dropped)
+        and all of them when the database is changed by anything else:
+            PRAGMA data_version: commits by other connections (and processes)
+            total_changes: writes on this connection outside of df_to_sql
+    """
+    
+    def __init__(self, max_tables=64, max_table_mb=4, max_mb=32):
+        self.max_tables, self.max_table_mb, self.max_mb = max_tables, max_table_mb, max_mb
+        self.entry_d = OrderedDict() #{(table_name, template_prefix): (df, mb)}
+        self.state = None
+        self.hits, self.misses = 0, 0
+        
+    def sync(self, conn):
+        """clear everything if the database has changed since the last call"""
+        state = (conn.execute('PRAGMA data_version').fetchone()[0], conn.total_changes)
+        if not state==self.state:
+            self.entry_d.clear()
+            self.state = state
+            
+    def get(self, conn, key):
+        self.sync(conn)
+        if key in self.entry_d:
+            self.entry_d.move_to_end(key)
+            self.hits+=1
+            return self.entry_d[key][0].copy()
+        
+        self.misses+=1
+        return None
+    
+    def put(self, conn, key, df):
+        if conn.in_transaction: #may be rolled back
+            return
+        
+        mb = (df.memory_usage(index=True, deep=False).sum())/1024**2
+        if mb>self.max_table_mb:
+            return
+        
+        self.entry_d[key] = (df, mb)
+        while (len(self.entry_d)>self.max_tables) or (sum([v[1] for v in self.entry_d.values()])>self.max_mb):
+            self.entry_d.popitem(last=False)
+            
+    def drop(self, conn, table_names):
+        """drop the tables after a write (call sync() before the write)"""
+        for key in [k for k in self.entry_d.keys() if k[0] in table_names]:
+            del self.entry_d[key]
+            
+        if not self.state is None:
+            self.state = (self.state[0], conn.total_changes)
+
+
+_table_cache_d = weakref.WeakKeyDictionary() #{connection: Table_cache}
+
+def get_table_cache(conn, create=False):
+    """the Table_cache of a connection (or None)
+    
+    only for connection subclasses (e.g., the session connections of get_projDB_conn)
+        plain sqlite3.Connection objects can not be weakly referenced
+    """
+    if not type(conn) is sqlite3.Connection:
+        if create and not conn in _table_cache_d:
+            _table_cache_d[conn] = Table_cache(**projDB_table_cache_d)
+        return _table_cache_d.get(conn)
+
+
+def sql_to_df_cached(table_name, conn, template_prefix=None, columns=None, filters=None):
+    """sql_to_df() through the connection's Table_cache
+    
+    returns a copy (cached frames can not be mutated by the caller)
+    partial reads (columns or filters) are taken from a cached table or read from the database (not cached)
+    """
+    cache = get_table_cache(conn, create=True)
+    if cache is None:
+        return sql_to_df(table_name, conn, template_prefix=template_prefix, columns=columns, filters=filters)
+    
+    key = (table_name, template_prefix)
+    df = cache.get(conn, key)
+    if df is None:
+        if not (columns is None and filters is None):
+            return sql_to_df(table_name, conn, template_prefix=template_prefix, columns=columns, filters=filters)
+        
+        df = sql_to_df(table_name, conn, template_prefix=template_prefix)
+        cache.put(conn, key, df)
+        df = df.copy()
+        
+    return filter_df(df, columns=columns, filters=filters)
+
+
 #===============================================================================
 # HELPER FUNCS---------
 #===============================================================================
@@ -38,6 +143,9 @@ def get_sqlalchemy_dtypes_from_template(template_df):
 
 
 def get_template_df(table_name, template_prefix=None):
+    if table_name.startswith(expos_store_prefix): #shared exposures
+        template_prefix, table_name = expos_store_prefix, 'table_expos'
+        
     if not template_prefix is None:
         assert isinstance(template_prefix, str)
         template_name = table_name.replace(template_prefix, '')
@@ -59,19 +167,17 @@ def get_template_df(table_name, template_prefix=None):
  
 
 
-def sql_to_df(table_name, conn, template_prefix=None, **kwargs):
-    """wrapper for reading a panads dataframe from a sqlite table respecing the template types
+def _get_read_params(table_name, conn, template_prefix=None):
+    """template, wide encoding flag, dtypes, and index columns for sql_to_df (checked against the table)"""
+    assert_sqlite_table_exists(conn, table_name)
     
-    duplicated here for module dependence reasons
-    """
-    #===========================================================================
-    # get template parameters
-    #===========================================================================
     index_col, dtype=None, None
     
     template_df = get_template_df(table_name, template_prefix=template_prefix)
     
-    if not template_df is None:        
+    wide = is_impacts_wide(table_name, conn, template_prefix=template_prefix)
+    
+    if not template_df is None and not wide:
         """
         template_df.index
         template_df.dtypes
@@ -103,19 +209,68 @@ def sql_to_df(table_name, conn, template_prefix=None, **kwargs):
                     dtype.keys())
             except Exception as e:
                 raise AssertionError(f"template columns not found in table \n    {e}") from None
-        
- 
+            
+    return template_df, wide, dtype, index_col
+
 
+def _concat_batches(df_l):
+    """concat the frames read by iter_select_sql (empty batches are dropped so the dtypes are kept)"""
+    data_l = [df for df in df_l if len(df)>0]
+    if len(data_l)==0: #nothing matched
+        return df_l[0]
+    
+    return data_l[0] if len(data_l)==1 else pd.concat(data_l)
+
+
+def sql_to_df(table_name, conn, template_prefix=None, columns=None, filters=None, **kwargs):
+    """wrapper for reading a panads dataframe from a sqlite table respecing the template types
+    
+    duplicated here for module dependence reasons
+    
+    columns: list, optional
+        columns to read (the index columns are always read)
+    filters: dict, optional
+        {column: value or list of values} rows to read, e.g., {'indexField':[1, 2], 'event_names':'0100yr'}
+        read with a parameterized WHERE clause (see hp.sql.iter_select_sql)
+    """
+    #===========================================================================
+    # get template parameters
+    #===========================================================================
+    template_df, wide, dtype, index_col = _get_read_params(table_name, conn, template_prefix=template_prefix)
+    
+    column_names = None
+    if not (columns is None and filters is None):
+        column_names = get_columns_names(conn, table_name)
+        
+    if not filters is None and not wide:
+        assert set(filters.keys()).issubset(column_names), \
+            f'unknown filter columns on \'{table_name}\': {set(filters.keys()).difference(column_names)}'
+        
+    #compact damages
+    if wide:
+        return _sql_to_df_wide(table_name, conn, column_names, columns=columns, filters=filters, **kwargs)
+    
+    #column projection
+    if not columns is None:
+        index_l = [] if index_col is None else ([index_col] if isinstance(index_col, str) else list(index_col))
+        columns = index_l + [c for c in columns if not c in index_l]
+        assert set(columns).issubset(column_names), \
+            f'unknown columns on \'{table_name}\': {set(columns).difference(column_names)}'
+        
+        if not dtype is None:
+            dtype = {k:v for k, v in dtype.items() if k in columns}
     
     #===========================================================================
     # read
     #===========================================================================
-    assert_sqlite_table_exists(conn, table_name)
     try:
-        df = pd.read_sql(f'SELECT * FROM [{table_name}]', conn, dtype=dtype, index_col=index_col,  **kwargs)
+        df_l = [pd.read_sql(sql, conn, params=params, dtype=dtype, index_col=index_col,  **kwargs)
+                for sql, params in iter_select_sql(table_name, columns=columns, filters=filters)]
     except Exception as e:
         raise IOError(f'failed to read table \'{table_name}\' from db w/ \n    {e}')
     
+    df = _concat_batches(df_l)
+    
     #===========================================================================
     # set index dtype
     #===========================================================================
@@ -132,7 +287,7 @@ def sql_to_df(table_name, conn, template_prefix=None, **kwargs):
     #===========================================================================
     # dev
     #===========================================================================
-    if table_name=='03_model_suite_index':
+    if table_name=='03_model_suite_index' and columns is None:
         
         assert_df_template_match(df, template_df, check_dtypes=True)
         
@@ -151,10 +306,8 @@ def sql_to_df(table_name, conn, template_prefix=None, **kwargs):
     return df
 
 
-def df_to_sql(df, table_name, conn, template_prefix=None,if_exists='replace', **kwargs):
-    """wrapper for writing a panads dataframe to a sqlite table respecing the template types"""
- 
-    
+def _get_write_params(df, table_name, template_prefix=None):
+    """check the data against the template and get the template, dtypes, and index flag for df_to_sql"""
     #===========================================================================
     # data checks
     #===========================================================================
@@ -162,7 +315,9 @@ def df_to_sql(df, table_name, conn, template_prefix=None,if_exists='replace', **
         warnings.warn(f'attempting to write empty dataframe to table \'{table_name}\'')
         pass #do this alot w/ L1
         
-    if df.isin(['nan']).any().any():
+    #text columns only (numeric columns can not hold the string)
+    text_df = df.select_dtypes(include=['object', 'string'])
+    if text_df.shape[1]>0 and text_df.isin(['nan']).any().any():
         raise AssertionError(f'found nan in {table_name}')
     
     #check the index is unique
@@ -170,7 +325,7 @@ def df_to_sql(df, table_name, conn, template_prefix=None,if_exists='replace', **
         raise AssertionError(f'found duplicate index values in \'{table_name}\'')
     
     #===========================================================================
-    # get template parameters
+    # template parameters
     #===========================================================================
     write_index=False
     dtype=None
@@ -199,14 +354,103 @@ def df_to_sql(df, table_name, conn, template_prefix=None,if_exists='replace', **
                 raise AssertionError(f"passed \'{table_name}\' ({df.shape}) does not match template \n    {e}") 
  
     
+    return template_df, dtype, write_index
+
+
+def get_table_keys_d(df, template_name):
+    """primary key and secondary indexes for writing a model table (see hp.sql.bulk_to_sql)
+    
+    the index is the primary key
+        frames passed in key order are stored by key (WITHOUT ROWID for composite keys)
+        otherwise a unique index keeps the rows in the order passed
+    binary layouts (large float32 blob rows) always use a unique index on a rowid table
+    """
+    if not template_name in projDB_schema_modelTables_d or None in df.index.names:
+        return dict()
+    
+    if any([f':{impacts_binary_tag}:' in str(c) for c in df.columns]):
+        index_key = 'unique'
+    elif df.index.is_monotonic_increasing:
+        index_key = 'primary' if df.index.nlevels==1 else 'without_rowid'
+    else:
+        index_key = 'unique'
+        
+    col_l = list(df.index.names) + list(df.columns)
+    
+    return dict(index_key=index_key, 
+                indexes=[cols for cols in modelTable_sql_indexes_d.get(template_name, []) if set(cols).issubset(col_l)])
+
+
+def _check_append_order(df, table_name, conn):
+    """warn if rows appended to a table stored by key do not follow the stored rows (reads are in key order)"""
+    key_l = get_primary_key(conn, table_name)
+    if len(df)==0 or len(key_l)==0 or not key_l==list(df.index.names):
+        return
+    
+    key_str = ', '.join([f'[{k}]' for k in key_l])
+    last = conn.execute(f'SELECT {key_str} FROM [{table_name}] ORDER BY ' + 
+                        ', '.join([f'[{k}] DESC' for k in key_l]) + ' LIMIT 1').fetchone()
+    
+    first = df.index[0] if df.index.nlevels>1 else (df.index[0],)
+    
+    if not df.index.is_monotonic_increasing or (not last is None and not tuple(first)>tuple(last)):
+        warnings.warn(f'rows appended to \'{table_name}\' out of key order')
+
+
+def df_to_sql(df, table_name, conn, template_prefix=None,if_exists='replace', impacts_storage=None, 
+              float_dtype=None, **kwargs):
+    """wrapper for writing a panads dataframe to a sqlite table respecing the template types
+    
+    impacts_storage: str, optional
+        on-disk encoding for table_impacts (see parameters.impacts_storage_d). ignored for other tables
+    float_dtype: str, optional
+        'float32' stores table_impacts as binary wide columns (long is stored as wide_full)
+    """
+ 
+    
     #===========================================================================
-    # write
+    # checks and template parameters
     #===========================================================================
+    template_df, dtype, write_index = _get_write_params(df, table_name, template_prefix=template_prefix)
     
+    cache = get_table_cache(conn)
+    if not cache is None:
+        cache.sync(conn)
     
-    result = df.to_sql(table_name, conn, dtype=dtype, index=write_index, if_exists=if_exists, **kwargs)
+    #===========================================================================
+    # write
+    #===========================================================================
+    binary = float_dtype=='float32'
+    if binary and impacts_storage in [None, 'long']:
+        impacts_storage = 'wide_full'
+        
+    template_name = _get_template_name(table_name, template_prefix)
     
-    assert result==len(df), f'failed to write table \'{table_name}\''
+    if template_name=='table_expos' and not template_prefix is None: #shared exposures
+        assert if_exists=='replace', f'only if_exists=\'replace\' is supported for \'{table_name}\''
+        result = expos_to_store(df, table_name, conn, dtype=dtype, **kwargs)
+        
+    elif impacts_storage in [None, 'long'] or not template_name=='table_impacts':
+        if if_exists=='append':
+            _check_append_order(df, table_name, conn)
+            
+        result = bulk_to_sql(df, table_name, conn, dtype=dtype, index=write_index, if_exists=if_exists, 
+                             **(get_table_keys_d(df, template_name) if write_index else dict()), **kwargs)
+        
+        assert result==len(df), f'failed to write table \'{table_name}\''
+        
+    else: #compact damages
+        wide_df = impacts_to_wide(df, impacts_storage, binary=binary)
+        if if_exists=='append':
+            _check_append_order(wide_df, table_name, conn)
+            
+        result = bulk_to_sql(wide_df, table_name, conn, index=True, if_exists=if_exists, 
+                             **get_table_keys_d(wide_df, template_name), **kwargs)
+        
+        assert result==len(wide_df), f'failed to write table \'{table_name}\''
+        
+    if not cache is None:
+        cache.drop(conn, [table_name])
     
     #===========================================================================
     # dev
@@ -218,4 +462,249 @@ def df_to_sql(df, table_name, conn, template_prefix=None,if_exists='replace', **
         if len(df)>0:
             assert df.index.names == ['category_code', 'modelid'], f'bad index names on \'{table_name}\''
     
-    return result
\ No newline at end of file
+    return result
+
+
+#===============================================================================
+# SHARED EXPOSURES-------------
+#===============================================================================
+"""models sampling the same inventory on the same hazard rasters have identical table_expos
+    each distinct table_expos is stored once in a '{expos_store_prefix}{content hash}' project table
+        and the model's table_expos is a view on it (read transparently by sql_to_df)
+    store tables no longer referenced by a view are dropped
+    
+    09_expos_store records the compile inputs of each store table so the compiler can skip sampling
+        (see dialog_model.Model_compiler._table_expos_to_db)
+"""
+
+def get_expos_store_name(df):
+    """store table name for a table_expos (content hash)"""
+    return f'{expos_store_prefix}{get_data_hash(df.astype(float))[:16]}'
+
+
+def expos_to_store(df, table_name, conn, dtype=None, **kwargs):
+    """write a table_expos to the store (if new) and replace the model table with a view on it"""
+    store_name = get_expos_store_name(df)
+    
+    drop_table(conn, table_name) #pandas can not replace a view
+    
+    if not store_name in get_table_names(conn):
+        result = bulk_to_sql(df, store_name, conn, dtype=dtype, index=True, if_exists='fail', 
+                             **get_table_keys_d(df, 'table_expos'), **kwargs)
+        assert result==len(df), f'failed to write table \'{store_name}\''
+        
+    conn.execute(f'CREATE VIEW [{table_name}] AS SELECT * FROM [{store_name}]')
+    
+    drop_unreferenced_expos(conn)
+    conn.commit()
+    
+    return len(df)
+
+
+def get_expos_store_refs_d(conn):
+    """{store table name: [views on it]}"""
+    view_d = {name:sql for name, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type='view'")}
+    
+    return {name:[k for k, sql in view_d.items() if f'[{name}]' in sql] 
+            for name in get_table_names(conn) if name.startswith(expos_store_prefix) and not name in view_d}
+
+
+def drop_unreferenced_expos(conn):
+    """drop the store tables without a view (and the 09_expos_store entries without a store table)"""
+    drop_l = [k for k, v in get_expos_store_refs_d(conn).items() if len(v)==0]
+    
+    for name in drop_l:
+        drop_table(conn, name)
+        
+    table_names = get_table_names(conn)
+    if '09_expos_store' in table_names:
+        keep_l = [k for k in table_names if k.startswith(expos_store_prefix)]
+        conn.execute(f'DELETE FROM [09_expos_store] WHERE table_name NOT IN ({", ".join(["?"]*len(keep_l))})', keep_l)
+        
+    cache = get_table_cache(conn) #synced by the caller
+    if not cache is None:
+        cache.drop(conn, drop_l+['09_expos_store'])
+        
+    return drop_l
+
+
+#===============================================================================
+# COMPACT DAMAGES-------------
+#===============================================================================
+"""table_impacts is the largest table by far (asset x function group x event rows)
+    the wide encodings store one row per asset and function group w/ a '{variable}:{event_name}' column
+    for each event (and each variable kept). the event names are only stored in the header
+    
+    the binary encoding (float32 models) instead stores a single '{variable}:float32:{event_names json}'
+        column per variable w/ the float32 values of all events in a blob
+    
+    read back transparently by sql_to_df (dropped variables are null)
+"""
+
+def _get_template_name(table_name, template_prefix):
+    if template_prefix is None:
+        return table_name
+    return table_name.replace(template_prefix, '')
+
+def is_impacts_wide(table_name, conn, template_prefix=None):
+    """check if this is a table_impacts stored with a wide encoding"""
+    if not _get_template_name(table_name, template_prefix)=='table_impacts':
+        return False
+    
+    return not 'event_names' in get_columns_names(conn, table_name)
+    
+
+def impacts_to_wide(df, impacts_storage, binary=False):
+    """encode table_impacts w/ one column per event (and variable)
+    
+    see parameters.impacts_storage_d
+    
+    binary: bool
+        one float32 blob column per variable instead
+    """
+    var_l = impacts_storage_d[impacts_storage]
+    assert not var_l is None, f'bad impacts_storage: {impacts_storage}'
+    
+    wide_df = df.loc[:, var_l].unstack('event_names')
+    
+    assert len(wide_df)*len(wide_df.columns)==len(df)*len(var_l), 'incomplete asset x event grid'
+    
+    if binary:
+        event_names = wide_df.columns.unique('event_names')
+        return pd.DataFrame({
+            f'{var}:{impacts_binary_tag}:{json.dumps(event_names.tolist())}':[
+                row.tobytes() for row in wide_df[var].loc[:, event_names].to_numpy(dtype='<f4')]
+            for var in var_l}, index=wide_df.index)
+    
+    wide_df.columns = [f'{var}:{event_name}' for var, event_name in wide_df.columns]
+    
+    return wide_df
+
+
+def _get_wide_columns_d(columns):
+    """{variable: (event_names, columns)} of a wide table_impacts. columns is a single blob column for binary"""
+    d = dict()
+    for c in columns:
+        var, event_name = c.split(':', 1)
+        
+        if event_name.startswith(f'{impacts_binary_tag}:'):
+            d[var] = (pd.Index(json.loads(event_name.split(':', 1)[1]), dtype=object), c)
+        else:
+            d.setdefault(var, ([], []))
+            d[var][0].append(event_name)
+            d[var][1].append(c)
+            
+    return {k:(pd.Index(v[0], dtype=object), v[1]) for k, v in d.items()}
+
+
+def impacts_from_wide(wide_df):
+    """decode impacts_to_wide() back to table_impacts"""
+    template_df = projDB_schema_modelTables_d['table_impacts']
+    
+    #events and columns of each variable
+    col_d = _get_wide_columns_d(wide_df.columns)
+    event_names = next(iter(col_d.values()))[0]
+    assert all(v[0].equals(event_names) for v in col_d.values()), 'event mismatch'
+    
+    #asset x event index (matches the raveled values)
+    n, m = len(wide_df), len(event_names)
+    index = pd.MultiIndex.from_arrays([
+        np.repeat(wide_df.index.get_level_values('indexField').to_numpy(dtype='int64'), m),
+        np.repeat(wide_df.index.get_level_values('fg_index').to_numpy(dtype='int64'), m),
+        np.tile(event_names.to_numpy(dtype=object), n),
+        ], names=template_df.index.names)
+    
+    #dropped variables are null
+    d = dict()
+    for var in template_df.columns:
+        if not var in col_d:
+            d[var] = np.full(n*m, np.nan)
+        elif isinstance(col_d[var][1], str): #binary
+            d[var] = np.frombuffer(b''.join(wide_df[col_d[var][1]].tolist()), dtype='<f4').astype(float)
+        else:
+            d[var] = wide_df[col_d[var][1]].to_numpy(dtype=float).ravel()
+        
+    return pd.DataFrame(d, index=index)
+
+
+def _sql_to_df_wide(table_name, conn, column_names, columns=None, filters=None, **kwargs):
+    """read a wide table_impacts (see sql_to_df)
+    
+    indexField and fg_index filters are read with SQL. event_names filters and columns select the wide columns
+        (all events of the binary encoding are read). the remaining filters are applied to the decoded frame
+    """
+    if column_names is None: #everything
+        select_l = None
+    else:
+        index_l = ['indexField', 'fg_index']
+        col_d = _get_wide_columns_d([c for c in column_names if not c in index_l])
+        
+        #variables (at least one to decode the index)
+        var_l = [k for k in col_d.keys() if columns is None or k in columns]
+        if len(var_l)==0:
+            var_l = list(col_d.keys())[:1]
+        
+        #events
+        select_l = list(index_l)
+        for var in var_l:
+            event_names, wide_columns = col_d[var]
+            if isinstance(wide_columns, str): #binary
+                select_l.append(wide_columns)
+            elif filters is None or not 'event_names' in filters:
+                select_l+=wide_columns
+            else:
+                select_l+=[c for e, c in zip(event_names, wide_columns) 
+                           if e in get_filter_values(filters['event_names'])]
+                
+        if len(select_l)==len(index_l): #no matching events
+            select_l.append(col_d[var_l[0]][1][0])
+            
+    sql_filters = None if filters is None else {k:v for k, v in filters.items() if k in ['indexField', 'fg_index']}
+    
+    df_l = [pd.read_sql(sql, conn, params=params, index_col=['indexField', 'fg_index'], **kwargs)
+            for sql, params in iter_select_sql(table_name, columns=select_l, filters=sql_filters)]
+    
+    return filter_df(impacts_from_wide(_concat_batches(df_l)), columns=columns, filters=filters)
+
+
+def filter_df(df, columns=None, filters=None):
+    """apply the sql_to_df() columns and filters to a frame in memory"""
+    if not filters is None and len(filters)>0:
+        bx = np.full(len(df), True)
+        for k, v in filters.items():
+            s = df.index.get_level_values(k) if k in df.index.names else df[k]
+            bx&= np.asarray(s.isin(get_filter_values(v)))
+        df = df.loc[bx]
+        
+    if not columns is None:
+        df = df.loc[:, [c for c in columns if c in df.columns]]
+        
+    return df
+
+
+def iter_impacts_chunks(conn, table_name, chunksize=100000):
+    """read table_impacts in chunks of whole assets (either encoding)
+    
+    see hp.sql.iter_sql_groups
+    
+    Yields
+    ------
+    pd.DataFrame
+        indexField, fg_index, event_names, impact_capped (about chunksize rows)
+    """
+    if not 'event_names' in get_columns_names(conn, table_name):
+        event_names, column_l = _get_wide_columns_d(
+            [c for c in get_columns_names(conn, table_name) if c.startswith('impact_capped:')])['impact_capped']
+        
+        if isinstance(column_l, str): #binary
+            column_l = [column_l]
+        
+        for chunk_df in iter_sql_groups(conn, table_name, 'indexField', 
+                                        columns=['indexField', 'fg_index']+column_l, 
+                                        chunksize=max(1, chunksize//len(event_names))):
+            yield impacts_from_wide(chunk_df.set_index(['indexField', 'fg_index'])
+                                    ).loc[:, ['impact_capped']].reset_index()
+    else:
+        yield from iter_sql_groups(conn, table_name, 'indexField', 
+                                   columns=['indexField', 'fg_index', 'event_names', 'impact_capped'],
+                                   chunksize=chunksize)
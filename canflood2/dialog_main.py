@@ -63,7 +63,7 @@ from .hp.plug import (
 
 from .hp.basic import view_web_df as view
 from .hp.qt import set_widget_value
-from .hp.sql import get_table_names
+from .hp.sql import get_table_names, close_sqlite_conns
 from .hp.Q import get_unique_layer_by_name
 from .hp.plt import get_figure_hash, PltWindow
  
@@ -81,6 +81,8 @@ from .assertions import (
     )
 
 from .core import _get_proj_meta_d, Model
+from .projDB import Main_dialog_projDB
+from .cli import iter_models_pool
 from .db_tools import df_to_sql, get_template_df, sql_to_df
 from .dialog_model import Model_config_dialog
 
@@ -115,214 +117,6 @@ get_fn = lambda x: os.path.splitext(os.path.basename(x))[0]
 # Dialog class------------------
 #===============================================================================
 
-class Main_dialog_projDB(object):
-    """methods for dealing with the project database"""
-    def get_projDB_fp(self):
-        """get the project database file path and do some formatting and checks"""
-        fp = self.lineEdit_PS_projDB_fp.text()
-        if fp=='':
-            fp = None
-        
-        if not fp is None:
-            assert isinstance(fp, str)
-            assert os.path.exists(fp), f'bad filepath for projDB: {fp}'
-            
-        return fp
-        
-
-    def projDB_get_tables(self, table_names, projDB_fp=None, result_as_dict=False, template_prefix=None):
-        """Convenience wrapper to get multiple tables as DataFrames.
-    
-        Parameters:
-        *table_names: Variable number of table names (str) to fetch.
-        projDB_fp: Optional; path to the project database file. If None, it will use the value from self.lineEdit_PS_projDB_fp.text().
-        result_as_dict: Optional; if True, returns a dictionary {name: df} instead of a tuple.
-    
-        Returns:
-        If a single table name is passed, returns a DataFrame; otherwise, returns a tuple of DataFrames in the same order as table_names or a dictionary {name: df} if result_as_dict is True.
-        """
-        assert isinstance(table_names, list)
-        if projDB_fp is None:
-            projDB_fp = self.get_projDB_fp()
-        
-        assert isinstance(projDB_fp, str)
-        assert os.path.exists(projDB_fp)
-    
-        with sqlite3.connect(projDB_fp) as conn: 
-            dfs = {name: sql_to_df(name, conn, template_prefix=template_prefix) for name in table_names}
-    
-        if result_as_dict:
-            return dfs
-        else:
-            return list(dfs.values()) 
-             
-
-    
-
-    def projDB_set_tables(self, df_d, projDB_fp=None, conn=None, logger=None, **kwargs):
-        """Convenience wrapper to set multiple tables from DataFrames.
-    
-        Parameters:
-        df_d: dict
-            Dictionary of DataFrames to set in the project database.
-        projDB_fp: Optional; path to the project database file. If None, it will use the value from self.lineEdit_PS_projDB_fp.text().
-        conn: Optional; SQLite connection object. If None, a new connection will be created.
-        """
-        
-        if logger is None: logger=self.logger
-        log = logger.getChild('projDB_set_tables')
-        
-        if projDB_fp is None:
-            projDB_fp = self.get_projDB_fp()
-    
-
-    
-        #assert_projDB_fp(projDB_fp)
-    
-        # Check if conn is provided, if not, create a new connection
-        close_conn = False
-        if conn is None:
-            conn = sqlite3.connect(projDB_fp)
-            close_conn = True
-    
-        try:
-            for k, df in df_d.items():
-                df_to_sql(df, k, conn,  **kwargs)
-                log.debug(f'    wrote table \'{k}\' w/ {df.shape}')
- #==============================================================================
- #                try:
- #                    #handling schema checks in the df_to_sql function
- # 
- #   #============================================================================
- #   #                  if k in project_db_schema_d.keys():
- #   #                      """this test happens before we re-cast the types and indicies"""
- #   #                      
- #   #                      assert_df_matches_projDB_schema(k, df, check_dtypes=False)
- #   # 
- #   #                  elif k.startswith('model_'):
- #   #                      pass
- #   #  
- #   #                  elif k.startswith('vfunc_'):
- #   #                      pass
- #   #  
- #   #                  else:
- #   #                      raise KeyError(f'bad table name: {k}')
- #   #============================================================================
- #    
- #                    df_to_sql(df, k, conn, if_exists='replace', **kwargs)
- #                    log.debug(f'    wrote table \'{k}\' w/ {df.shape}')
- # 
- #                except Exception as e:
- #                    raise IOError(f'failed to set table \'{k}\' to project database:\n     {e}') from None
- #==============================================================================
-        finally:
-            #assert_projDB_conn(conn)
-            if close_conn:
-                conn.close()
-    
-        log.debug(f'updated {list(df_d.keys())} tables in project database at\n    {projDB_fp}')
-
-                
-    def projDB_drop_tables(self, *table_names, projDB_fp=None, logger=None):
-        """Convenience wrapper to drop multiple tables from the project database.
-    
-        Parameters:
-        *table_names: Variable number of table names (str) to drop.
-        projDB_fp: Optional; path to the project database file. If None, it will use the value from self.lineEdit_PS_projDB_fp.text().
-        """
-        if projDB_fp is None:
-            projDB_fp = self.get_projDB_fp()
-        if logger is None: logger=self.logger
-        log = logger.getChild('projDB_drop_tables')
-    
-        assert_projDB_fp(projDB_fp)
-    
- 
-
-        with sqlite3.connect(projDB_fp) as conn:
-            for name in table_names:
-                assert name in get_table_names(conn), name
-                conn.execute(f'DROP TABLE IF EXISTS [{name}]')
-        
-                # Check if the table still exists
-                if name in get_table_names(conn):
-                    raise RuntimeError(f'Failed to drop table: {name}')
-        
-        log.debug(f'dropped {len(table_names)} tables from project database\n    {table_names}')
-        
-    def projDB_get_table_names_all(self, projDB_fp=None):
-        """Convenience wrapper to get all table names from the project database.
-    
-        Parameters:
-        projDB_fp: Optional; path to the project database file. If None, it will use the value from self.lineEdit_PS_projDB_fp.text().
-    
-        Returns:
-        List of table names in the project database.
-        """
-        if projDB_fp is None:
-            projDB_fp = self.get_projDB_fp()
-    
-        with sqlite3.connect(projDB_fp) as conn:
- 
-            return get_table_names(conn)
-
- 
-        
-
-    def update_model_index_dx(self, model, **kwargs):
-        """Update the model-suite index table for a single model."""
-        # ------------------------------------------------------------------
-        # 1. Load the table and enforce the reference dtypes up front
-        # ------------------------------------------------------------------
-        dx = self.projDB_get_tables(['03_model_suite_index'])[0]
-    
-        # Expected dtypes from your schema definition
-        schema_dtypes = (
-            parameters.project_db_schema_d['03_model_suite_index']
-            .dtypes
-            .to_dict()
-        )
-        dx = dx.astype(schema_dtypes)
-    
-        # ------------------------------------------------------------------
-        # 2. Build a 1-row DataFrame for the incoming model record
-        # ------------------------------------------------------------------
-        s = model.get_model_index_ser()            # original Series
-    
-        # Promote to DataFrame (keeps column order) …
-        
-        row_df = pd.DataFrame([s]).set_index(project_db_schema_d['03_model_suite_index'].index.names).astype(schema_dtypes)
-        
-        #make the MultiIndex types match the expectation
-        """dont know why this is so complicated...."""
-        for i, target_type in enumerate(parameters.ms_MultiIndex.dtypes):
-            row_df.index = row_df.index.set_levels(row_df.index.levels[i].astype(target_type),level=i)
-        
-        
-        # Ensure the data types of the MultiIndex levels match the expected types
-        for i, (actual_dtype, expected_dtype) in enumerate(zip(row_df.index.levels, parameters.ms_MultiIndex.dtypes)):
-            assert actual_dtype.dtype == expected_dtype, f"Mismatch in level {i}: {actual_dtype.dtype} != {expected_dtype}"
-
-        #=======================================================================
-        # add
-        #=======================================================================
-        #add the indexer
-        dx = dx.reindex(dx.index.union(row_df.index)) 
- 
-        dx.loc[row_df.index] = row_df.values  
- 
-
-        #check the new indexer made it in there
-        assert row_df.index.isin(dx.index).all(), f'Failed to add model indexer {row_df.index} to the model suite index table'
-        
-        #check there are no duplicate indexes
-        assert dx.index.is_unique, f'Duplicate indexes found in model suite index table: {dx.index}'
-        # ------------------------------------------------------------------
-        # 4. Persist
-        # ------------------------------------------------------------------
-        self.projDB_set_tables({'03_model_suite_index': dx}, **kwargs)
-
-        
  
 
 class Main_dialog_dev(object):
@@ -531,6 +325,7 @@ class Main_dialog_dev(object):
             projDB_fp = data_d['projDB']
             #copy over the project database file
             """dont want the user to make changes to the plugin version"""
+            close_sqlite_conns(os.path.join(home_dir, os.path.basename(projDB_fp))) #may be overwritten
             projDB_fp = shutil.copyfile(projDB_fp, os.path.join(home_dir, os.path.basename(projDB_fp)))
             log.debug(f'copied project database to\n    {projDB_fp}')
             
@@ -766,7 +561,7 @@ class Main_dialog_haz(object):
         """
         if not (projDB_fp is None or projDB_fp == ''):
             log.debug(f'updating project database w/ hazard tables \n    {projDB_fp}')
-            with sqlite3.connect(projDB_fp) as conn:
+            with self.projDB_get_conn(projDB_fp) as conn:
                 for k, df in df_d.items():
                     assert k in project_db_schema_d.keys(), k
                     df_to_sql(df, k, conn, if_exists='replace')
@@ -927,6 +722,7 @@ class Main_dialog_modelSuite(object):
  
         self.pushButton_MS_clear.clicked.connect(self._clear_all_models)
         self.pushButton_MS_runAll.clicked.connect(self._run_all_models)
+        self.spinBox_MS_workers.setMaximum(os.cpu_count() or 1)
         
         
         #=======================================================================
@@ -1177,7 +973,7 @@ class Main_dialog_modelSuite(object):
             
         log.debug(f'creating model parameter table for \'{modelName}\'')
         df_d = dict()
-        with sqlite3.connect(projDB_fp) as conn:
+        with self.projDB_get_conn(projDB_fp) as conn:
             
             #===================================================================
             # #add the parameter table
@@ -1323,8 +1119,15 @@ class Main_dialog_modelSuite(object):
         model.run_model(projDB_fp=projDB_fp, progressBar=progressBar, logger=log)
         progressBar.setValue(100)  # Set progress bar to 100 after completion
         
-    def _run_all_models(self):
-        """run all models in the index"""
+    def _run_all_models(self, *args, max_workers=None):
+        """run all models in the index
+        
+        Parameters
+        ----------
+        max_workers: int, optional
+            number of worker processes. 1: run sequentially on this thread
+            defaults to spinBox_MS_workers
+        """
         log = self.logger.getChild('_run_all_models')
         log.info('running all models')
         
@@ -1334,12 +1137,24 @@ class Main_dialog_modelSuite(object):
         projDB_fp = self.get_projDB_fp()
         assert not projDB_fp is None, 'must set a project database file'
         
+        if max_workers is None:
+            max_workers = self.spinBox_MS_workers.value()
+            
+        models_l = [model for d in self.model_index_d.values() for model in d.values()]
+        
+        #=======================================================================
+        # compute in worker processes and write from here
+        #=======================================================================
+        if min(max_workers, len(models_l))>1:
+            cnt = self._run_all_models_pool(models_l, projDB_fp, max_workers=max_workers, logger=log)
+        
         #=======================================================================
         # loop through each model and run it
         #=======================================================================
-        cnt=0
-        for category_code, d in self.model_index_d.items():
-            for modelid, model in d.items():
+        else:
+            cnt=0
+            for model in models_l:
+                category_code, modelid = model.category_code, model.modelid
                 log.debug(f'running model {category_code}_{modelid}')
                 progressBar = model.widget_d['progressBar_mod']['widget']
                 progressBar.setValue(0)
@@ -1357,6 +1172,43 @@ class Main_dialog_modelSuite(object):
         #=======================================================================
         log.info(f'ran {cnt} models')
         
+    def _run_all_models_pool(self, models_l, projDB_fp, max_workers=None, logger=None):
+        """compute the models in a process pool and write each result as it finishes
+        
+        the workers only read the projDB. this process is the single writer
+        """
+        log = logger.getChild('pool')
+        
+        model_d = {(model.category_code, model.modelid):model for model in models_l}
+        get_progressBar = lambda key: model_d[key].widget_d['progressBar_mod']['widget']
+        
+        for key in model_d.keys():
+            get_progressBar(key).setValue(0)
+            
+        def progress_fn(key, value):
+            get_progressBar(key).setValue(value)
+            QtWidgets.QApplication.processEvents()
+        
+        cnt=0
+        for key, result in iter_models_pool(projDB_fp, list(model_d.keys()), 
+                                            max_workers=max_workers, progress_fn=progress_fn, logger=log):
+            model = model_d[key]
+            try:
+                if isinstance(result, Exception):
+                    raise result
+                
+                _, df_d, param_d, profile = result
+                model._commit_tables(df_d, param_d=param_d, projDB_fp=projDB_fp, logger=log, profile=profile)
+                cnt+=1
+                get_progressBar(key).setValue(100)
+            except Exception as e:
+                log.error(f'failed to run model {model.name} w/ error:\n    {e}')
+                get_progressBar(key).setValue(0)
+                
+            QtWidgets.QApplication.processEvents()
+            
+        return cnt
+        
     
     
     
@@ -1952,7 +1804,7 @@ class Main_dialog_reporting(object):
         
         log.debug(f'on {projDB_fp}')
         
-        with sqlite3.connect(projDB_fp) as conn: 
+        with self.projDB_get_conn(projDB_fp) as conn: 
             table_names = get_table_names(conn)
             
             log.info(f'exporting {len(table_names)} tables')
@@ -2178,6 +2030,7 @@ class Main_dialog(Main_dialog_projDB, Main_dialog_haz, Main_dialog_modelSuite,
         if os.path.exists(fp):
             if overwrite:
                 log.warning(f'specified project database already exists and will be overwritten')
+                close_sqlite_conns(fp)
                 os.remove(fp)
             else:
                 raise FileExistsError(f'specified project database already exists and overwrite is not set')
@@ -2250,7 +2103,7 @@ class Main_dialog(Main_dialog_projDB, Main_dialog_haz, Main_dialog_modelSuite,
         # #build/write to the database
         #=======================================================================
         log.debug(f'init project SQLite db at\n    {fp}')
-        with sqlite3.connect(fp) as conn:
+        with self.projDB_get_conn(fp) as conn:
             for k, df in df_d.items():                
                 df_to_sql(df, k, conn, if_exists='replace')
  
@@ -2351,7 +2204,7 @@ class Main_dialog(Main_dialog_projDB, Main_dialog_haz, Main_dialog_modelSuite,
         
         
         df_d=dict()
-        with sqlite3.connect(projDB_fp) as conn:
+        with self.projDB_get_conn(projDB_fp) as conn:
 
             
             #===================================================================
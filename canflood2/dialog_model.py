@@ -9,7 +9,7 @@ ui dialog class for model config window
 # imports-----------
 #==============================================================================
 #python
-import sys, os, datetime, time, configparser, logging, sqlite3
+import sys, os, datetime, time, configparser, logging, sqlite3, hashlib, json
 import pprint
 import pandas as pd
 
@@ -38,9 +38,9 @@ from .parameters import (
     consequence_category_d, home_dir, project_db_schema_d, finv_index,plugin_dir
     )
 from .hp.vfunc import  load_vfunc_to_df_d, vfunc_df_to_dict, vfunc_cdf_chk_d, vfunc_df_to_meta_and_ddf
-from .db_tools import sql_to_df
+from .db_tools import sql_to_df, get_expos_store_name
 
-from .core import Model
+from .core import Model, Run_profiler
 
 
 #===============================================================================
@@ -60,6 +60,36 @@ FORM_CLASS, _ = uic.loadUiType(ui_fp, resource_suffix='') #Unknown C++ class: Qg
 
  
 
+#===============================================================================
+# helpers------------------
+#===============================================================================
+def get_expos_source_key(finv_vlay, finv_indexField, haz_rlay_d):
+    """hash of the table_expos compile inputs (see parameters.project_db_schema_d['09_expos_store'])
+    
+    covers the layer sources (w/ the file size and modification time), the index field, 
+        and the index and geometry of each asset
+    """
+    def get_source_sig(layer):
+        source = layer.source()
+        fp = source.split('|')[0]
+        if os.path.exists(fp):
+            stat = os.stat(fp)
+            return f'{source}|{stat.st_size}|{stat.st_mtime_ns}'
+        return source
+    
+    h = hashlib.sha1()
+    h.update(f'{get_source_sig(finv_vlay)}\n{finv_indexField}\n'.encode())
+    
+    for event_name in sorted(haz_rlay_d.keys()):
+        h.update(f'{event_name}={get_source_sig(haz_rlay_d[event_name])}\n'.encode())
+        
+    for feat in finv_vlay.getFeatures():
+        h.update(f'{feat[finv_indexField]}:'.encode())
+        h.update(bytes(feat.geometry().asWkb()))
+        
+    return h.hexdigest()
+
+
 #===============================================================================
 # Dialog class------------------
 #===============================================================================
@@ -91,14 +121,20 @@ class Model_compiler(object):
         #=======================================================================
         # compile sequence
         #=======================================================================
-        #asset inventory
-        _ = self._table_finv_to_db(**skwargs)
-        
-        #sample DEM
-        _ = self._table_gels_to_db(**skwargs)
+        #hold the table writes and commit once (also updates the index and status once)
+        profile = Run_profiler(category_code=self.model.category_code, modelid=self.model.modelid)
+        with self.model.unit_of_work(logger=self.logger, profile=profile):
+            #asset inventory
+            with profile.stage('compile_finv'):
+                _ = self._table_finv_to_db(**skwargs)
             
-        #asset exposures
-        _ = self._table_expos_to_db(**skwargs)
+            #sample DEM
+            with profile.stage('sample_gels'):
+                _ = self._table_gels_to_db(**skwargs)
+                
+            #asset exposures
+            with profile.stage('sample_expos'):
+                _ = self._table_expos_to_db(**skwargs)
         
         #=======================================================================
         # wrap
@@ -277,6 +313,7 @@ class Model_compiler(object):
         # #write it to the database
         #=======================================================================
         model.set_tables({'table_finv':dx}, logger=log)
+        model._profile_rows(rows_in=len(df_raw), rows_out=len(dx))
         
         log.debug(f'finished on table_finv with {dx.shape} records')
         return dx
@@ -361,6 +398,7 @@ class Model_compiler(object):
         samples_s.index.dtype
         """
         model.set_tables({'table_gels':samples_s.to_frame()}, logger=log)
+        model._profile_rows(rows_out=len(samples_s))
         
         
         
@@ -391,6 +429,18 @@ class Model_compiler(object):
         
         assert finv_indexField in finv_vlay.fields().names(), 'bad finv_indexField'
         
+        #=======================================================================
+        # shared exposures
+        #=======================================================================
+        source_key = get_expos_source_key(finv_vlay, finv_indexField, haz_rlay_d)
+        expos_df = self.parent.projDB_get_expos_shared(source_key)
+        
+        if not expos_df is None:
+            log.info(f'loaded {expos_df.shape} exposures from the project store (skipping sampling)')
+            model.set_tables({'table_expos':expos_df}, logger=log)
+            model._profile_rows(rows_out=expos_df.size)
+            return expos_df
+        
         #=======================================================================
         # loop through and sample each
         #=======================================================================
@@ -431,6 +481,15 @@ class Model_compiler(object):
         #=======================================================================
         expos_df.index.name='indexField'
         model.set_tables({'table_expos':expos_df}, logger=log)
+        model._profile_rows(rows_out=expos_df.size) #asset x event samples
+        
+        #register for other models (written with the store table when in a unit_of_work)
+        model.append_project_tables({'09_expos_store':pd.DataFrame({
+            'table_name':[get_expos_store_name(expos_df)], 'source_key':[source_key],
+            'finv_source':[finv_vlay.source()], 'finv_indexField':[finv_indexField],
+            'event_names':[json.dumps(list(expos_df.columns))], 'asset_cnt':[len(expos_df)],
+            'created':[datetime.datetime.now().strftime('%Y-%m-%d %H.%M.%S')],
+            })}, logger=log)
         
         return expos_df
     
@@ -894,7 +953,7 @@ class Model_config_dialog(Model_compiler, Model_config_dialog_assetInventory,
         #=======================================================================
         # update projDB
         #=======================================================================
-        with sqlite3.connect(projDB_fp) as conn:
+        with self.parent.projDB_get_conn(projDB_fp) as conn:
             #assert_projDB_conn(conn)
             
             set_df = lambda df, table_name: self.parent.projDB_set_tables({table_name:df}, logger=log, conn=conn)
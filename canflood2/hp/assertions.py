@@ -75,7 +75,7 @@ def assert_series_match( actual_series, expected_series):
         raise AssertionError("Value mismatches found for common keys:\n" + diff.to_string()) from None
 
 def assert_sqlite_table_exists(conn, table_name): 
-    cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name, ))
+    cursor = conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view') AND name=?", (table_name, ))
     result = cursor.fetchone()
     if not result:
         raise AssertionError(f"Table '{table_name}' not found in database") # Check if DRF table exists
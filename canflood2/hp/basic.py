@@ -4,7 +4,7 @@ Created on Mar 8, 2025
 @author: cef
 '''
 
-import os, logging
+import os, sys, logging, multiprocessing
 import pandas as pd
 
 def sanitize_filename(filename: str,
@@ -38,4 +38,53 @@ def view_web_df(df):
         #type(f)
         df.to_html(buf=f)
         
-    webbrowser.open(f.name)
\ No newline at end of file
+    webbrowser.open(f.name)
+
+
+def get_mp_context():
+    """multiprocessing context for the model workers
+
+    spawn: forking a process with a live Qt application is unsafe
+    within QGIS, sys.executable is the QGIS application rather than python
+    """
+    ctx = multiprocessing.get_context('spawn')
+
+    if not os.path.basename(sys.executable).lower().startswith('python'):
+        for fn in ['python.exe', 'python3.exe', os.path.join('bin', 'python3')]:
+            python_exe = os.path.join(sys.exec_prefix, fn)
+            if os.path.exists(python_exe):
+                ctx.set_executable(python_exe)
+                break
+
+    return ctx
+
+
+def get_peak_rss_mb():
+    """peak resident memory of this process (MB) so far. nan if unavailable
+    
+    cheap (unlike tracemalloc) but can not be reset
+    """
+    try:
+        if sys.platform.startswith('win'):
+            import ctypes
+            from ctypes import wintypes
+            
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + \
+                    [(k, ctypes.c_size_t) for k in ['PeakWorkingSetSize', 'WorkingSetSize',
+                        'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage', 'QuotaPeakNonPagedPoolUsage',
+                        'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage']]
+                    
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            if not ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                            ctypes.byref(counters), counters.cb):
+                return float('nan')
+            return counters.PeakWorkingSetSize/1e6
+        
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak/1e6 if sys.platform=='darwin' else peak/1e3 #bytes on macOS, KB on linux
+    
+    except Exception:
+        return float('nan')
@@ -0,0 +1,116 @@
+'''
+Created on Oct 18, 2026
+
+@author: cef
+
+optional numba kernels. numba_available is False (and the callers fall back to numpy) if numba is not installed
+'''
+
+import os, tempfile, logging
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+#keep numba's on-disk cache out of the (possibly read-only) plugin directory
+os.environ.setdefault('NUMBA_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'canflood2_numba'))
+
+try:
+    import numba
+    numba_available = True
+except ImportError as e:
+    log.info(f'numba not available ({e}). falling back to numpy kernels')
+    numba = None
+    numba_available = False
+
+
+
+def _get_impacts_kernel(deps_ar, code_ar, xp_ar, fp_ar, count_ar, right_ar, scale_ar, cap_ar,
+                        impact_ar, impact_scaled_ar, impact_capped_ar):
+    """depth > impact > scale > cap for each element (results written to the last 3 arrays)
+
+    same operations (and order) as core.interp_vfunc_curves and core.get_impacts_from_depths
+        so results match bit-for-bit (no fastmath)
+    """
+    k_max = xp_ar.shape[1] - 1
+
+    for i in range(deps_ar.shape[0]):
+        x = deps_ar[i]
+
+        if np.isnan(x):
+            impact_ar[i] = np.nan
+            impact_scaled_ar[i] = np.nan
+            impact_capped_ar[i] = np.nan
+            continue
+
+        c = code_ar[i]
+        cnt = count_ar[c]
+
+        #segment (xp[j] <= x < xp[j+1])
+        j = -1
+        for k in range(cnt):
+            if xp_ar[c, k] <= x:
+                j = k
+            else:
+                break
+
+        #interpolate
+        jc = max(min(j, cnt - 2), 0)
+        jc1 = min(jc + 1, k_max)
+        x0, x1 = xp_ar[c, jc], xp_ar[c, jc1]
+        y0, y1 = fp_ar[c, jc], fp_ar[c, jc1]
+
+        if x > xp_ar[c, cnt - 1]:
+            impact = right_ar[c]
+        elif j == -1:
+            impact = 0.0
+        elif j == cnt - 1:
+            impact = fp_ar[c, cnt - 1]
+        elif x == x0:
+            impact = y0
+        else:
+            impact = (y1 - y0) / (x1 - x0) * (x - x0) + y0
+
+        #scale and cap
+        scale = scale_ar[i]
+        impact_scaled = impact * (1.0 if np.isnan(scale) else scale)
+
+        cap = cap_ar[i] #np.fmin (ignores nans)
+        if np.isnan(cap):
+            impact_capped = impact_scaled
+        elif np.isnan(impact_scaled) or cap < impact_scaled:
+            impact_capped = cap
+        else:
+            impact_capped = impact_scaled
+
+        impact_ar[i] = impact
+        impact_scaled_ar[i] = impact_scaled
+        impact_capped_ar[i] = impact_capped
+
+
+if numba_available:
+    _get_impacts_kernel = numba.njit(cache=True, nogil=True)(_get_impacts_kernel)
+
+
+def get_impacts_jit(deps_ar, code_ar, curves_d, scale_ar, cap_ar, dtype='float64'):
+    """compiled core.get_impacts_from_depths() for L2 curves
+
+    computed in float64 and stored in dtype
+
+    Returns
+    ----------
+    tuple
+        impact, impact_scaled, impact_capped arrays
+    """
+    assert numba_available, 'numba not installed'
+
+    n = len(deps_ar)
+    result_l = [np.empty(n, dtype=dtype) for _ in range(3)]
+
+    _get_impacts_kernel(np.ascontiguousarray(deps_ar, dtype=float),
+                        np.ascontiguousarray(code_ar, dtype=np.int64),
+                        curves_d['exposure'], curves_d['impact'], curves_d['count'].astype(np.int64),
+                        curves_d['impact_max'],
+                        np.ascontiguousarray(scale_ar, dtype=float), np.ascontiguousarray(cap_ar, dtype=float),
+                        *result_l)
+
+    return tuple(result_l)
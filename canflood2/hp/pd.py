@@ -4,6 +4,7 @@ Created on Mar 21, 2025
 @author: cef
 '''
 
+import hashlib
 import pandas as pd
 
 def map_multiindex_dtypes(index, dtype_dict):
@@ -34,4 +35,22 @@ def map_multiindex_dtypes(index, dtype_dict):
     assert result.dtypes.to_dict() == dtype_dict, f'failed to rebuild the index properly'
     
     return result
- 
\ No newline at end of file
+ 
+
+def get_data_hash(*objs):
+    """content hash of some DataFrames, Series, and scalars (order matters)
+    
+    includes the labels and dtypes, so a re-typed column changes the hash
+    """
+    m = hashlib.sha1()
+    for obj in objs:
+        if isinstance(obj, (pd.DataFrame, pd.Series)):
+            labels = list(obj.columns) if isinstance(obj, pd.DataFrame) else [obj.name]
+            dtypes = obj.dtypes.tolist() if isinstance(obj, pd.DataFrame) else [obj.dtype]
+            m.update(repr((type(obj).__name__, labels, list(obj.index.names), dtypes)).encode())
+            m.update(pd.util.hash_pandas_object(obj, index=True).values.tobytes())
+        else:
+            m.update(repr(obj).encode())
+        m.update(b'|')
+        
+    return m.hexdigest()
@@ -6,13 +6,15 @@ Created on Apr. 30, 2024
 NOTE: qgis does not have sqlalchemy
 '''
 
-import sqlite3
+import os, re, sqlite3, threading, atexit, itertools
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
  
  
 
 def get_table_names(conn):
-    """Retrieves a list of all tables (excluding default tables) from a SQLite database connection.
+    """Retrieves a list of all tables and views (excluding default tables) from a SQLite database connection.
 
     Args:
         conn: A connection object to the SQLite database.
@@ -24,7 +26,7 @@ def get_table_names(conn):
     cursor = conn.cursor()
     cursor.execute("""
         SELECT name FROM sqlite_master
-        WHERE type='table' AND name NOT LIKE 'sqlite_%';
+        WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%';
     """)
     table_names = [row[0] for row in cursor.fetchall()]
     return table_names
@@ -50,6 +52,302 @@ def get_columns_names(conn, table_name):
  
 
 
+def get_primary_key(conn, table_name):
+    """primary key columns of a table (in key order. empty if the table has none)"""
+    rows = conn.execute(f'PRAGMA table_info([{table_name}])').fetchall()
+    return [row[1] for row in sorted([row for row in rows if row[5]>0], key=lambda row:row[5])]
+
+
+def is_without_rowid(conn, table_name):
+    """check if a table is stored in primary key order without a rowid"""
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE name=? AND type='table'", (table_name,)).fetchone()
+    return (not row is None) and bool(re.search(r'WITHOUT\s+ROWID\s*$', row[0], flags=re.IGNORECASE))
+
+
+def drop_table(conn, table_name):
+    """drop a table or view (if it exists)"""
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name=? AND type IN ('table', 'view')", 
+                       (table_name,)).fetchone()
+    if not row is None:
+        conn.execute(f'DROP {row[0].upper()} [{table_name}]')
+
+
+def get_table_populated_d(conn, table_names):
+    """check which tables exist and have rows without reading them
+    
+    Args:
+        conn: A connection object to the SQLite database.
+        table_names: list of table names to check.
+
+    Returns:
+        dict of {table_name: True (has rows) or False (empty)}. missing tables are omitted.
+    """
+    existing_l = get_table_names(conn)
+    
+    cursor = conn.cursor()
+    d = dict()
+    for table_name in table_names:
+        if table_name in existing_l:
+            cursor.execute(f"""
+                SELECT EXISTS (SELECT 1 FROM [{table_name}] LIMIT 1);
+            """)
+            d[table_name] = bool(cursor.fetchone()[0])
+    return d
+
+
+def _get_file_id(fp):
+    st = os.stat(fp)
+    return (st.st_dev, st.st_ino)
+
+
+_header_fd_d = dict() #{path: (file descriptor, file id)}
+_header_fd_lock = threading.Lock()
+
+def get_sqlite_file_signature(fp):
+    """cheap fingerprint of the state of a database file (no connection needed)
+    
+    changes whenever a transaction is committed by any connection/process:
+        file change counter (header offset 24) 
+        modification time and size of the database and any write-ahead log
+        
+    the header is read from a descriptor held open until close_sqlite_conns()
+        closing a descriptor releases all of the process's (POSIX) locks on the file
+        including those of open sqlite connections (which then lose their WAL to the next closing process)
+    """
+    key = os.path.normcase(os.path.abspath(fp))
+    with _header_fd_lock:
+        fd, file_id = _header_fd_d.get(key, (None, None))
+        if (fd is None) or (file_id!=_get_file_id(fp)): #new or replaced
+            if not fd is None:
+                os.close(fd) #only releases locks on the replaced file
+            fd = os.open(fp, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+            _header_fd_d[key] = (fd, _get_file_id(fp))
+            
+        os.lseek(fd, 24, os.SEEK_SET)
+        change_counter = os.read(fd, 4)
+        
+    sig = [change_counter]
+    for suffix in ['', '-wal']:
+        if os.path.exists(fp+suffix):
+            st = os.stat(fp+suffix)
+            sig.append((st.st_mtime_ns, st.st_size))
+        
+    return tuple(sig)
+
+
+class DeferredCommitConnection(sqlite3.Connection):
+    """sqlite3 connection which ignores commit() calls while defer_commit=True
+    
+    pandas.to_sql commits after every table. 
+        this lets several writes share a single transaction (see sqlite_transaction)
+    """
+    defer_commit=True
+    
+    def commit(self):
+        if not self.defer_commit:
+            super().commit()
+            
+    def __exit__(self, *args):
+        """'with conn:' also leaves the transaction to its owner"""
+        if self.defer_commit:
+            return False
+        return super().__exit__(*args)
+
+
+@contextmanager
+def sqlite_transaction(fp, conn=None):
+    """write everything in a single transaction
+    
+    commits on exit. rolls back everything (including DDL) on an exception
+    
+    conn: DeferredCommitConnection, optional
+        open connection to use (e.g., from get_sqlite_conn). otherwise one is opened on fp (and closed)
+    """
+    close_conn = conn is None
+    if close_conn:
+        conn = sqlite3.connect(fp, factory=DeferredCommitConnection)
+    assert isinstance(conn, DeferredCommitConnection)
+    
+    if conn.in_transaction:
+        conn.defer_commit=False
+        conn.commit() #leftovers from implicit transactions
+        
+    conn.defer_commit=True
+    try:
+        conn.execute('BEGIN') #explicit so DDL (DROP/CREATE) is also transacted
+        yield conn
+        
+        conn.defer_commit=False
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.defer_commit=False
+        if close_conn:
+            conn.close()
+
+
+#===============================================================================
+# SESSIONS-------------
+#===============================================================================
+"""opening a connection re-reads the schema and discards the page cache
+    get_sqlite_conn() keeps one connection per file (and mode) for each thread
+    sqlite3 connections can not be shared between threads (or processes)
+"""
+_sessions = threading.local()
+_sessions_l = list() #all session containers (for close_sqlite_conns)
+_sessions_lock = threading.Lock()
+
+def get_sqlite_conn(fp, read_only=False, pragma_d=dict()):
+    """long-lived connection on the database for this thread
+    
+    reopened if the file is replaced (call close_sqlite_conns() before deleting or overwriting)
+    'with conn:' commits (or rolls back) but does not close
+    
+    read_only: bool
+        PRAGMA query_only (e.g., for worker processes)
+    pragma_d: dict
+        applied when the connection is opened (e.g., {'journal_mode':'WAL'})
+    """
+    if not hasattr(_sessions, 'd'):
+        _sessions.d = dict()
+        with _sessions_lock:
+            _sessions_l.append(_sessions.d)
+            
+    key = (os.path.normcase(os.path.abspath(fp)), read_only)
+    
+    if key in _sessions.d:
+        conn, file_id = _sessions.d[key]
+        if os.path.exists(fp) and _get_file_id(fp)==file_id:
+            return conn
+        
+        conn.close()
+        del _sessions.d[key]
+        
+    #open a new connection (closed from any thread by close_sqlite_conns)
+    conn = sqlite3.connect(fp, factory=DeferredCommitConnection, check_same_thread=False)
+    conn.defer_commit=False
+    
+    for k, v in pragma_d.items():
+        try:
+            conn.execute(f'PRAGMA {k}={v}')
+        except sqlite3.OperationalError: #e.g., journal_mode while another connection is writing
+            pass
+        
+    if read_only:
+        conn.execute('PRAGMA query_only=ON')
+        
+    _sessions.d[key] = (conn, _get_file_id(fp))
+    
+    return conn
+
+
+def close_sqlite_conns(fp=None):
+    """close the session connections on a file (or all files) in every thread
+    
+    the last connection on a WAL database checkpoints it (and removes the -wal file)
+    """
+    path = None if fp is None else os.path.normcase(os.path.abspath(fp))
+    with _sessions_lock:
+        for d in _sessions_l:
+            for key in list(d.keys()):
+                if path is None or key[0]==path:
+                    conn, _ = d.pop(key)
+                    conn.close()
+                    
+    with _header_fd_lock: #see get_sqlite_file_signature
+        for key in list(_header_fd_d.keys()):
+            if path is None or key==path:
+                os.close(_header_fd_d.pop(key)[0])
+
+
+atexit.register(close_sqlite_conns)
+
+
+def iter_sql_groups(conn, table_name, group_col, columns=None, chunksize=100000):
+    """read a table in chunks of whole groups
+    
+    rows are read in storage order (rowid, or the primary key of WITHOUT ROWID tables), 
+        so each group must be contiguous (e.g., written sorted)
+        the rows of the last group in each chunk are carried over to the next
+    
+    Yields
+    ------
+    pd.DataFrame
+        roughly chunksize rows
+    """
+    #double quotes (escaped) as column names may contain brackets
+    col_str = '*' if columns is None else ', '.join(['"{}"'.format(c.replace('"', '""')) for c in columns])
+    
+    if is_without_rowid(conn, table_name):
+        order_str = ', '.join(['"{}"'.format(c.replace('"', '""')) for c in get_primary_key(conn, table_name)])
+    else:
+        order_str = 'rowid'
+    
+    carry_df = None
+    for chunk_df in pd.read_sql(f'SELECT {col_str} FROM [{table_name}] ORDER BY {order_str}', conn, chunksize=chunksize):
+        if not carry_df is None:
+            chunk_df = pd.concat([carry_df, chunk_df], ignore_index=True)
+            
+        bx = chunk_df[group_col]==chunk_df[group_col].iloc[-1]
+        carry_df = chunk_df.loc[bx]
+        
+        if not bx.all():
+            yield chunk_df.loc[~bx]
+            
+    if not carry_df is None:
+        yield carry_df
+            
+
+def get_filter_values(values):
+    """filter values as a list of sqlite parameters (a scalar is a list of one)"""
+    return np.atleast_1d(np.asarray(values, dtype=object if isinstance(values, str) else None)).tolist()
+
+
+def iter_select_sql(table_name, columns=None, filters=None, max_params=900):
+    """parameterized SELECT statements for a column projection and '='/'IN' filters (combined w/ AND)
+    
+    filters: dict
+        {column: value or list of values}
+    
+    the longest list is split over several statements (older sqlite builds allow 999 parameters)
+    
+    Yields
+    ------
+    tuple
+        (sql, params)
+    """
+    quote = lambda k: '"{}"'.format(str(k).replace('"', '""'))
+    
+    col_str = '*' if columns is None else ', '.join([quote(c) for c in columns])
+    sql = f'SELECT {col_str} FROM {quote(table_name)}'
+    
+    if filters is None or len(filters)==0:
+        yield sql, []
+        return
+    
+    values_d = {k:list(dict.fromkeys(get_filter_values(v))) for k, v in filters.items()} #unique (rows match once)
+    
+    split_k = max(values_d, key=lambda k:len(values_d[k]))
+    step = max_params - sum([len(v) for k, v in values_d.items() if not k==split_k])
+    assert step>0, f'too many filter values for one statement on \'{table_name}\''
+    
+    for start in range(0, max(len(values_d[split_k]), 1), step):
+        cond_l, params = list(), list()
+        for k, v in values_d.items():
+            if k==split_k:
+                v = v[start:start+step]
+                
+            if len(v)==1:
+                cond_l.append(f'{quote(k)} = ?')
+            else:
+                cond_l.append(f'{quote(k)} IN ({",".join(["?"]*len(v))})') #empty matches nothing
+            params+=v
+            
+        yield sql + ' WHERE ' + ' AND '.join(cond_l), params
+            
+
 def pd_dtype_to_sqlite_type(dtype):
     """
     Convert a pandas dtype to a SQLite column type.
@@ -79,3 +377,147 @@ def pd_dtype_to_sqlite_type(dtype):
     else:
         # Default to TEXT for object and other types.
         return "TEXT"
+
+
+#===============================================================================
+# BULK WRITES-------------
+#===============================================================================
+#column types for pd.api.types.infer_dtype() (as in pandas.io.sql.SQLiteTable)
+_infer_sqlite_type_d = {'string':'TEXT', 'bytes':'TEXT', 'floating':'REAL', 'integer':'INTEGER', 'boolean':'INTEGER',
+                        'empty':'TEXT'}
+
+
+def _get_sql_values(values):
+    """values as an array of sqlite parameters (None for missing. NaN floats bind as NULL)"""
+    arr = np.asarray(values)
+    if arr.dtype.kind in 'fiub':
+        return arr
+    
+    arr = arr.astype(object) #copy
+    arr[pd.isna(arr)] = None
+    return arr
+
+
+def bulk_to_sql(df, table_name, conn, dtype=None, index=True, if_exists='replace', index_key='index', indexes=None,
+                block_rows=100000, **kwargs):
+    """write a frame with multi-row executemany inserts (drop-in for DataFrame.to_sql on sqlite3)
+    
+    same table as pandas (column types, and an 'ix_' index on the index columns)
+        but values are bound from column arrays in one transaction (including the DDL)
+    dates, times, and other unsupported types (or any kwargs, e.g., chunksize) are passed to DataFrame.to_sql
+    
+    index_key: str
+        how new tables are keyed on the index columns
+            'index': non-unique 'ix_' index (as pandas)
+            'unique': unique 'ix_' index
+            'primary': PRIMARY KEY (a single INTEGER column is the rowid)
+            'without_rowid': PRIMARY KEY on a WITHOUT ROWID table (rows are stored in key order)
+    indexes: list, optional
+        column lists for secondary indexes on new tables
+    
+    Returns
+    -------
+    int
+        rows written
+    """
+    if len(kwargs)>0:
+        return df.to_sql(table_name, conn, dtype=dtype, index=index, if_exists=if_exists, **kwargs)
+    
+    if dtype is None: dtype = dict()
+    if indexes is None: indexes = list()
+    assert if_exists in ['fail', 'replace', 'append'], if_exists
+    assert index_key in ['index', 'unique', 'primary', 'without_rowid'], index_key
+    
+    #===========================================================================
+    # columns
+    #===========================================================================
+    col_d = dict()
+    index_labels = list()
+    if index:
+        for i, name in enumerate(df.index.names):
+            if name is None:
+                name = 'index' if df.index.nlevels==1 else f'level_{i}'
+            index_labels.append(name)
+            col_d[name] = df.index.get_level_values(i)
+            
+    for name in df.columns:
+        col_d[name] = df[name]
+        
+    assert len(col_d)==len(index_labels)+len(df.columns), f'duplicate column names on \'{table_name}\''
+    assert len(index_labels)>0 or index_key=='index', f'no index columns to key \'{table_name}\''
+    
+    type_d = dict()
+    for name, values in col_d.items():
+        if name in dtype:
+            type_d[name] = dtype[name]
+            continue
+        
+        col_type = pd.api.types.infer_dtype(values, skipna=True)
+        if not col_type in _infer_sqlite_type_d:
+            return df.to_sql(table_name, conn, dtype=dtype, index=index, if_exists=if_exists)
+        type_d[name] = _infer_sqlite_type_d[col_type]
+        
+    #===========================================================================
+    # write
+    #===========================================================================
+    quote = lambda k: '"{}"'.format(str(k).replace('"', '""'))
+    
+    own_transaction = not conn.in_transaction
+    if own_transaction:
+        conn.execute('BEGIN') #DDL and rows together
+    try:
+        exists = table_name in get_table_names(conn)
+        if exists and if_exists=='fail':
+            raise ValueError(f'Table \'{table_name}\' already exists.')
+        
+        if exists and if_exists=='replace':
+            drop_table(conn, table_name)
+            
+        if not exists or if_exists=='replace':
+            def_l = [f'{quote(k)} {v}' for k, v in type_d.items()]
+            table_opts = ''
+            if index_key in ['primary', 'without_rowid']:
+                def_l.append(f'PRIMARY KEY ({",".join([quote(k) for k in index_labels])})')
+                if index_key=='without_rowid':
+                    table_opts = ' WITHOUT ROWID'
+                    
+            conn.execute(f'CREATE TABLE {quote(table_name)} (\n' + ',\n  '.join(def_l) + '\n)' + table_opts)
+            
+            if index_key in ['index', 'unique'] and len(index_labels)>0:
+                idx_l = [(index_key=='unique', index_labels)]
+            else:
+                idx_l = list()
+            idx_l+= [(False, list(cols)) for cols in indexes]
+            
+            for unique, cols in idx_l:
+                assert set(cols).issubset(col_d.keys()), f'bad index columns for \'{table_name}\': {cols}'
+                conn.execute(f'CREATE {"UNIQUE " if unique else ""}INDEX ' + 
+                             f'{quote("ix_" + table_name + "_" + "_".join(cols))}ON ' + 
+                             f'{quote(table_name)} ({",".join([quote(k) for k in cols])})')
+                
+        #rows (as many per statement as the default variable limit of older sqlite builds allows)
+        col_cnt = len(col_d)
+        stmt_rows = max(1, 999//col_cnt)
+        row_sql = '(' + ','.join(['?']*col_cnt) + ')'
+        insert_sql = f'INSERT INTO {quote(table_name)} ({",".join([quote(k) for k in col_d.keys()])}) VALUES '
+        
+        arr_l = [_get_sql_values(v) for v in col_d.values()]
+        for start in range(0, len(df), block_rows):
+            flat_l = list(itertools.chain.from_iterable(zip(*[a[start:start+block_rows].tolist() for a in arr_l])))
+            
+            full_cnt = (len(flat_l)//col_cnt)//stmt_rows*stmt_rows*col_cnt
+            step = stmt_rows*col_cnt
+            if full_cnt>0:
+                conn.executemany(insert_sql + ','.join([row_sql]*stmt_rows), 
+                                 (flat_l[i:i+step] for i in range(0, full_cnt, step)))
+            if full_cnt<len(flat_l):
+                conn.execute(insert_sql + ','.join([row_sql]*((len(flat_l)-full_cnt)//col_cnt)), flat_l[full_cnt:])
+                
+    except Exception:
+        if own_transaction:
+            conn.rollback()
+        raise
+    
+    conn.commit()
+    
+    return len(df)
@@ -51,6 +51,27 @@ project_db_schema_d = {
 
     }
 
+#applied to each projDB session connection (see db_tools.get_projDB_conn)
+projDB_pragma_d = {
+    'journal_mode':'WAL', #readers (e.g., model workers) do not block the writer
+    'synchronous':'NORMAL', #safe w/ WAL (a power loss may roll back the last commit)
+    'cache_size':-65536, #KiB
+    'mmap_size':268435456, #bytes
+    'temp_store':'MEMORY',
+    }
+
+#parsed tables held for each projDB connection (see db_tools.Table_cache)
+projDB_table_cache_d = {
+    'max_tables':64,
+    'max_table_mb':4, #larger tables (e.g., table_impacts) are always read
+    'max_mb':32,
+    }
+
+#secondary indexes on model tables {template name: [columns]}. the template index is the primary key (see db_tools.get_table_keys_d)
+    #e.g., {'table_impacts':[['event_names']]}. not by default: with few events, a scan of the key is as fast
+    #    and the index adds ~60% to the table_impacts write
+modelTable_sql_indexes_d = dict()
+
 
 
 #===============================================================================
@@ -167,6 +188,16 @@ impacts_multiIndex = pd.MultiIndex.from_arrays(
     names=['indexField', 'fg_index', 'event_names']
 )
 
+#on-disk encodings of table_impacts {storage: variables stored}. see db_tools.impacts_to_wide
+impacts_storage_d = {
+    'long':None, #one row per asset, function group, and event (all variables)
+    'wide':['impact_capped'], #one row per asset and function group, one column per event
+    'wide_full':['exposure', 'impact', 'impact_scaled', 'impact_capped'],
+    }
+
+#binary encoding of float32 table_impacts. see db_tools.impacts_to_wide
+impacts_binary_tag = 'float32'
+
 #these will be prefixed by the model name
  
 modelTable_params_d = {
@@ -179,6 +210,8 @@ modelTable_params_d = {
         'allowed': {
             'ead_highPtail': ['extrapolate', 'none', 'user'],
             'ead_lowPtail': ['flat', 'extrapolate', 'none', 'user'],
+            'impacts_storage': list(impacts_storage_d.keys()),
+            'float_dtype': ['float64', 'float32'],
         },
         'required': True
     },
@@ -308,10 +341,87 @@ project_db_schema_d['07_vfunc_data'] = pd.DataFrame({
 
         
 
+#===============================================================================
+# RUN PROFILE---------
+#===============================================================================
+#one row per stage of each model run (see core.Run_profiler)
+project_db_schema_d['08_run_profile'] = pd.DataFrame({
+    'run_id': pd.Series(dtype=str),
+    'category_code': pd.Series(dtype=str),
+    'modelid': pd.Series(dtype='int64'),
+    'stage': pd.Series(dtype=str),
+    'start_time': pd.Series(dtype=str),
+    'wall_secs': pd.Series(dtype=float),
+    'cpu_secs': pd.Series(dtype=float),
+    'peak_rss_mb': pd.Series(dtype=float), #process peak resident memory at the end of the stage
+    'peak_traced_mb': pd.Series(dtype=float), #tracemalloc peak above the stage start (nan unless trace_memory)
+    'rows_in': pd.Series(dtype='Int64'),
+    'rows_out': pd.Series(dtype='Int64'),
+    'rows_per_sec': pd.Series(dtype=float),
+    'version': pd.Series(dtype=str),
+})
+
+#===============================================================================
+# SHARED EXPOSURES---------
+#===============================================================================
+#each distinct table_expos is stored once in a '{prefix}{content hash}' table (see db_tools.expos_to_store)
+expos_store_prefix = 'expos_'
+
+#compile inputs of each stored table_expos (see dialog_model.get_expos_source_key)
+project_db_schema_d['09_expos_store'] = pd.DataFrame({
+    'table_name': pd.Series(dtype=str),
+    'source_key': pd.Series(dtype=str), #hash of the inventory, index field, and hazard rasters
+    'finv_source': pd.Series(dtype=str),
+    'finv_indexField': pd.Series(dtype=str),
+    'event_names': pd.Series(dtype=str), #json
+    'asset_cnt': pd.Series(dtype='int64'),
+    'created': pd.Series(dtype=str),
+})
+
+#created on first use (missing from projDBs of older versions)
+projDB_optional_tables_l = ['08_run_profile', '09_expos_store']
+
 #===============================================================================
 # RISK===============
 #===============================================================================
 impact_max = 1e12
+
+#damage calculation engines for core.Model._table_impacts_to_db (first is the default)
+impacts_engine_l = ['vectorized', 'loop']
+
+#damage kernel backends for core.get_impacts_from_depths (numba is used when installed)
+impacts_backend_l = ['numba', 'numpy']
+
+#peak bytes per table_impacts row while computing and writing (see core.get_impacts_chunk_rows)
+impacts_row_bytes = 500
+
+#model run stages {stage: (result table, upstream stage)}. see core.Model.get_stale_stages_d
+run_stages_d = {
+    'impacts':('table_impacts', None),
+    'impacts_prob':('table_impacts_prob', 'impacts'),
+    'ead':('table_ead', 'impacts_prob'),
+    'ead_total':('table_impacts_sum', 'impacts_prob'),
+    }
+
+#compiled vfunc curves held in memory (see core.get_vfunc_curves_cached)
+vfunc_cache_size = 4
+
+#maximum cells of the uniform exposure grid for O(1) vfunc lookups (see core.get_vfunc_curve_grid)
+vfunc_grid_max_cells = int(5e6)
+
+#Monte Carlo perturbation targets for core.Model.run_model_mc
+mc_targets_d = {
+    'elev':'additive, per asset (subtracted from the depths)',
+    'expos':'additive, per asset (added to the depths on all events)',
+    'vfunc':'multiplicative, per vfunc tag (applied to the impacts before the cap)',
+    }
+
+#maximum depth cells (realizations x asset rows x events) computed at once by run_model_mc
+mc_chunk_cells = int(2e6)
+
+#memory cap for the per-asset EAD kept by run_model_mc for the asset quantiles (assets x realizations)
+    #a seeded sample of the realizations is kept when they do not fit
+mc_asset_band_mb = 256
  
 #===============================================================================
 # PLOTTING--------
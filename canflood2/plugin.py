@@ -31,6 +31,7 @@ from qgis.PyQt.QtWidgets import QAction
 #from .resources import *
 # Import the code for the dialog
 from .dialog_main import Main_dialog
+from .hp.sql import close_sqlite_conns
 
 
 class Canflood_plugin:
@@ -184,6 +185,8 @@ class Canflood_plugin:
                 action)
             self.iface.removeToolBarIcon(action)
             
+        close_sqlite_conns() #release the projDB files
+            
             
     def launch_dialog(self):
         """main launch action
@@ -0,0 +1,292 @@
+'''
+Created on Oct 18, 2026
+
+@author: cef
+
+project database methods shared by the Main_dialog and the headless runner (see cli.py)
+    no Qt imports here
+'''
+#===============================================================================
+# IMPORTS-------------
+#===============================================================================
+import os
+import pandas as pd
+
+from .hp.sql import get_table_names, drop_table
+
+from .parameters import project_db_schema_d
+import canflood2.parameters as parameters
+
+from .assertions import assert_projDB_fp
+from .db_tools import (df_to_sql, sql_to_df, sql_to_df_cached, drop_unreferenced_expos, get_projDB_conn, 
+    get_table_cache)
+
+#===============================================================================
+# classes------------------
+#===============================================================================
+class Main_dialog_projDB(object):
+    """methods for dealing with the project database"""
+    projDB_read_only = False #session connections w/ PRAGMA query_only (e.g., model workers)
+    
+    def get_projDB_fp(self):
+        """get the project database file path and do some formatting and checks"""
+        fp = self.lineEdit_PS_projDB_fp.text()
+        if fp=='':
+            fp = None
+        
+        if not fp is None:
+            assert isinstance(fp, str)
+            assert os.path.exists(fp), f'bad filepath for projDB: {fp}'
+            
+        return fp
+    
+    def projDB_get_conn(self, projDB_fp=None):
+        """session connection on the project database (kept open between calls)"""
+        if projDB_fp is None:
+            projDB_fp = self.get_projDB_fp()
+            
+        return get_projDB_conn(projDB_fp, read_only=self.projDB_read_only)
+        
+
+    def projDB_get_tables(self, table_names, projDB_fp=None, result_as_dict=False, template_prefix=None,
+                          columns=None, filters=None):
+        """Convenience wrapper to get multiple tables as DataFrames.
+    
+        Parameters:
+        *table_names: Variable number of table names (str) to fetch.
+        projDB_fp: Optional; path to the project database file. If None, it will use the value from self.lineEdit_PS_projDB_fp.text().
+        result_as_dict: Optional; if True, returns a dictionary {name: df} instead of a tuple.
+        columns, filters: Optional; partial reads applied to each table (see db_tools.sql_to_df).
+    
+        Returns:
+        If a single table name is passed, returns a DataFrame; otherwise, returns a tuple of DataFrames in the same order as table_names or a dictionary {name: df} if result_as_dict is True.
+        """
+        assert isinstance(table_names, list)
+        if projDB_fp is None:
+            projDB_fp = self.get_projDB_fp()
+        
+        assert isinstance(projDB_fp, str)
+        assert os.path.exists(projDB_fp)
+    
+        with self.projDB_get_conn(projDB_fp) as conn: 
+            dfs = {name: sql_to_df_cached(name, conn, template_prefix=template_prefix, columns=columns, filters=filters) 
+                   for name in table_names}
+    
+        if result_as_dict:
+            return dfs
+        else:
+            return list(dfs.values()) 
+             
+
+    
+
+    def projDB_set_tables(self, df_d, projDB_fp=None, conn=None, logger=None, **kwargs):
+        """Convenience wrapper to set multiple tables from DataFrames.
+    
+        Parameters:
+        df_d: dict
+            Dictionary of DataFrames to set in the project database.
+            a value may also be an iterable of DataFrame chunks (appended in order)
+        projDB_fp: Optional; path to the project database file. If None, it will use the value from self.lineEdit_PS_projDB_fp.text().
+        conn: Optional; SQLite connection object. If None, the session connection is used (see projDB_get_conn).
+        """
+        
+        if logger is None: logger=self.logger
+        log = logger.getChild('projDB_set_tables')
+        
+        if projDB_fp is None:
+            projDB_fp = self.get_projDB_fp()
+    
+
+    
+        #assert_projDB_fp(projDB_fp)
+    
+        # Check if conn is provided, if not, use the session connection
+        own_conn = conn is None
+        if own_conn:
+            conn = self.projDB_get_conn(projDB_fp)
+    
+        try:
+            for k, df in df_d.items():
+                if isinstance(df, pd.DataFrame):
+                    df_to_sql(df, k, conn,  **kwargs)
+                    log.debug(f'    wrote table \'{k}\' w/ {df.shape}')
+                else:
+                    cnt = 0
+                    for i, chunk_df in enumerate(df):
+                        df_to_sql(chunk_df, k, conn, if_exists='replace' if i==0 else 'append', **kwargs)
+                        cnt+=len(chunk_df)
+                    assert cnt>0, f'no chunks passed for table \'{k}\''
+                    log.debug(f'    wrote table \'{k}\' w/ {cnt} rows in {i+1} chunks')
+ #==============================================================================
+ #                try:
+ #                    #handling schema checks in the df_to_sql function
+ # 
+ #   #============================================================================
+ #   #                  if k in project_db_schema_d.keys():
+ #   #                      """this test happens before we re-cast the types and indicies"""
+ #   #                      
+ #   #                      assert_df_matches_projDB_schema(k, df, check_dtypes=False)
+ #   # 
+ #   #                  elif k.startswith('model_'):
+ #   #                      pass
+ #   #  
+ #   #                  elif k.startswith('vfunc_'):
+ #   #                      pass
+ #   #  
+ #   #                  else:
+ #   #                      raise KeyError(f'bad table name: {k}')
+ #   #============================================================================
+ #    
+ #                    df_to_sql(df, k, conn, if_exists='replace', **kwargs)
+ #                    log.debug(f'    wrote table \'{k}\' w/ {df.shape}')
+ # 
+ #                except Exception as e:
+ #                    raise IOError(f'failed to set table \'{k}\' to project database:\n     {e}') from None
+ #==============================================================================
+        except Exception:
+            if own_conn:
+                conn.rollback()
+            raise
+        else:
+            #assert_projDB_conn(conn)
+            if own_conn:
+                conn.commit()
+    
+        log.debug(f'updated {list(df_d.keys())} tables in project database at\n    {projDB_fp}')
+
+                
+    def projDB_drop_tables(self, *table_names, projDB_fp=None, logger=None):
+        """Convenience wrapper to drop multiple tables from the project database.
+    
+        Parameters:
+        *table_names: Variable number of table names (str) to drop.
+        projDB_fp: Optional; path to the project database file. If None, it will use the value from self.lineEdit_PS_projDB_fp.text().
+        """
+        if projDB_fp is None:
+            projDB_fp = self.get_projDB_fp()
+        if logger is None: logger=self.logger
+        log = logger.getChild('projDB_drop_tables')
+    
+        assert_projDB_fp(projDB_fp)
+    
+ 
+
+        with self.projDB_get_conn(projDB_fp) as conn:
+            cache = get_table_cache(conn, create=True)
+            if not cache is None:
+                cache.sync(conn)
+            
+            for name in table_names:
+                assert name in get_table_names(conn), name
+                drop_table(conn, name) #or view
+        
+                # Check if the table still exists
+                if name in get_table_names(conn):
+                    raise RuntimeError(f'Failed to drop table: {name}')
+                
+            #shared exposures no longer used by any model
+            store_l = drop_unreferenced_expos(conn)
+            
+            if not cache is None:
+                cache.drop(conn, list(table_names))
+        
+        log.debug(f'dropped {len(table_names)} tables (and {len(store_l)} exposure store tables) from project database\n    {table_names}')
+        
+    def projDB_get_table_names_all(self, projDB_fp=None):
+        """Convenience wrapper to get all table names from the project database.
+    
+        Parameters:
+        projDB_fp: Optional; path to the project database file. If None, it will use the value from self.lineEdit_PS_projDB_fp.text().
+    
+        Returns:
+        List of table names in the project database.
+        """
+        if projDB_fp is None:
+            projDB_fp = self.get_projDB_fp()
+    
+        return get_table_names(self.projDB_get_conn(projDB_fp))
+
+    def projDB_get_expos_shared(self, source_key, projDB_fp=None):
+        """retrieve a stored table_expos compiled from the same inputs (see db_tools.expos_to_store)
+
+        Returns:
+        DataFrame, or None if no store table matches source_key
+        """
+        if projDB_fp is None:
+            projDB_fp = self.get_projDB_fp()
+
+        with self.projDB_get_conn(projDB_fp) as conn:
+            table_names = get_table_names(conn)
+            if not '09_expos_store' in table_names:
+                return None
+
+            store_df = sql_to_df('09_expos_store', conn)
+            store_l = [k for k in store_df.loc[store_df['source_key']==source_key, 'table_name'] if k in table_names]
+
+            if len(store_l)==0:
+                return None
+
+            return sql_to_df(store_l[-1], conn)
+
+
+        
+
+    def update_model_index_dx(self, model, **kwargs):
+        """Update the model-suite index table for a single model."""
+        dx = self.get_model_index_dx_updated(model)
+        
+        self.projDB_set_tables({'03_model_suite_index': dx}, **kwargs)
+        
+    def get_model_index_dx_updated(self, model, model_index_s=None):
+        """load the model-suite index table and update the row for a single model
+        
+        model_index_s: optional row for this model (see Model.get_model_index_ser)
+        """
+        # ------------------------------------------------------------------
+        # 1. Load the table and enforce the reference dtypes up front
+        # ------------------------------------------------------------------
+        dx = self.projDB_get_tables(['03_model_suite_index'])[0]
+    
+        # Expected dtypes from your schema definition
+        schema_dtypes = (
+            parameters.project_db_schema_d['03_model_suite_index']
+            .dtypes
+            .to_dict()
+        )
+        dx = dx.astype(schema_dtypes)
+    
+        # ------------------------------------------------------------------
+        # 2. Build a 1-row DataFrame for the incoming model record
+        # ------------------------------------------------------------------
+        s = model.get_model_index_ser() if model_index_s is None else model_index_s
+    
+        # Promote to DataFrame (keeps column order) …
+        
+        row_df = pd.DataFrame([s]).set_index(project_db_schema_d['03_model_suite_index'].index.names).astype(schema_dtypes)
+        
+        #make the MultiIndex types match the expectation
+        """dont know why this is so complicated...."""
+        for i, target_type in enumerate(parameters.ms_MultiIndex.dtypes):
+            row_df.index = row_df.index.set_levels(row_df.index.levels[i].astype(target_type),level=i)
+        
+        
+        # Ensure the data types of the MultiIndex levels match the expected types
+        for i, (actual_dtype, expected_dtype) in enumerate(zip(row_df.index.levels, parameters.ms_MultiIndex.dtypes)):
+            assert actual_dtype.dtype == expected_dtype, f"Mismatch in level {i}: {actual_dtype.dtype} != {expected_dtype}"
+
+        #=======================================================================
+        # add
+        #=======================================================================
+        #add the indexer
+        dx = dx.reindex(dx.index.union(row_df.index)) 
+ 
+        dx.loc[row_df.index] = row_df.values  
+ 
+
+        #check the new indexer made it in there
+        assert row_df.index.isin(dx.index).all(), f'Failed to add model indexer {row_df.index} to the model suite index table'
+        
+        #check there are no duplicate indexes
+        assert dx.index.is_unique, f'Duplicate indexes found in model suite index table: {dx.index}'
+        return dx
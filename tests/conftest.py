@@ -27,6 +27,8 @@ from qgis.core import (
 
 from canflood2.hp.logr import get_log_stream
 from canflood2.hp.basic import sanitize_filename
+from canflood2.hp.sql import close_sqlite_conns
+from canflood2.bench import build_projDB
 
 from canflood2.parameters import src_dir, hazDB_schema_d
 
@@ -72,6 +74,8 @@ def log_to_python(message, tag, level):
 
 def pytest_runtest_teardown(item, nextitem):
     """custom teardown message"""
+    close_sqlite_conns() #release the test's projDB files
+    
     test_name = item.name
     print(f"\n{'='*20} Test completed: {test_name} {'='*20}\n\n\n")
     
@@ -163,6 +167,17 @@ def test_name(request):
 def projDB_fp(request):
     return getattr(request, "param", None)
 
+
+@pytest.fixture
+def bench_model(tmpdir, request):
+    """small synthetic projDB with one ready model (see bench.build_projDB)
+    
+    indirect parametrize with a dict of build_projDB kwargs to override the defaults"""
+    kwargs = dict(asset_cnt=50, event_cnt=3)
+    kwargs.update(getattr(request, "param", dict()))
+    
+    return build_projDB(os.path.join(tmpdir, 'bench.canflood2'), **kwargs)
+
  
     
 
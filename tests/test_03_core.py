@@ -5,11 +5,22 @@ Created on Mar 6, 2025
 '''
 
 
-import pytest, os, shutil, copy
+import pytest, os, shutil, copy, itertools, sqlite3
+import pandas as pd
+import numpy as np
  
 from PyQt5.QtWidgets import QWidget
-from canflood2.core import Model, Model_table_assertions
+from canflood2.core import (Model, Model_table_assertions, get_area_from_ser, get_area_from_df,
+    get_vfunc_curves_cached, get_vfunc_curves_grid, lookup_vfunc_grid, interp_vfunc_curves,
+    get_impacts_from_depths
+    )
 from canflood2.dialog_main import Main_dialog_projDB 
+from canflood2.cli import main as cli_main, Headless_projDB, iter_models_pool
+from canflood2.bench import run_case, compare_baseline
+from canflood2.bench_db import run_bench_db, bench_db_tables_d
+from canflood2.hp.sql import get_sqlite_file_signature, close_sqlite_conns, bulk_to_sql, get_primary_key, is_without_rowid
+from canflood2.db_tools import (get_expos_store_refs_d, get_expos_store_name, get_table_cache, df_to_sql, impacts_to_wide,
+    sql_to_df, filter_df)
 
 from tests.test_02_dialog_model import oj as oj_dModel
 
@@ -19,7 +30,7 @@ from .conftest import (
     result_write_filename_prep, click
     )
 
-from canflood2.parameters import modelTable_params_d
+from canflood2.parameters import modelTable_params_d, impacts_engine_l
 
 modelTable_params_allowed_d = copy.copy(modelTable_params_d['table_parameters']['allowed'])
 
@@ -142,6 +153,19 @@ def test_core_02_table_impacts_to_db(model,
     write_projDB(model, test_name)
     
 
+
+
+@pytest.mark.parametrize(*DM_save_args)
+def test_core_02_table_impacts_to_db_engines(model,
+                     tutorial_name, #dont really need this
+                     ):
+    """all damage engines should produce the same table_impacts"""
+    
+    result_d = {engine:model._table_impacts_to_db(engine=engine) for engine in impacts_engine_l}
+    
+    for engine, dx in result_d.items():
+        pd.testing.assert_frame_equal(dx, result_d['loop'], check_exact=True, obj=engine)
+    
  
 
 @pytest.mark.parametrize("tutorial_name, projDB_fp", [
@@ -221,3 +245,697 @@ def test_core_05_set_ead_total(model,
                          )
     
     #write_projDB(model, test_name)
+
+
+
+
+
+@pytest.mark.parametrize(*DM_save_args)
+def test_core_06_run_model_in_memory(model,
+                     tutorial_name, #dont really need this
+                     ):
+    """the in_memory pipeline should write the same results as the stage-by-stage projDB round trips"""
+    table_names = ['table_impacts', 'table_impacts_prob', 'table_ead', 'table_impacts_sum']
+    
+    result_d, tables_d = dict(), dict()
+    for in_memory in [False, True]:
+        result_d[in_memory] = model.run_model(in_memory=in_memory, use_cache=False)
+        tables_d[in_memory] = model.get_tables(table_names, result_as_dict=True)
+        
+    #check
+    assert result_d[True][1]==result_d[False][1]
+    for table_name in table_names:
+        pd.testing.assert_frame_equal(tables_d[True][table_name], tables_d[False][table_name], obj=table_name)
+        
+    assert float(model.get_parameter_value('result_ead'))==pytest.approx(result_d[True][1])
+
+
+
+
+@pytest.mark.parametrize("aep_l", [
+    [0.0, 0.001, 0.01, 0.1],
+    [0.0, 0.002, 0.005, 0.01, 0.02, 0.5],
+    [0.1, 0.2],
+])
+def test_core_07_get_area_from_df(aep_l):
+    """the vectorized integrator should match the row-wise get_area_from_ser"""
+    df = pd.DataFrame(np.random.default_rng(0).uniform(0, 1e5, (50, len(aep_l))),
+                      columns=pd.Index(aep_l, name='AEP'))
+    
+    result_s = get_area_from_df(df)
+    
+    pd.testing.assert_series_equal(result_s, df.apply(get_area_from_ser, axis=1), rtol=1e-12)
+
+
+
+
+@pytest.mark.parametrize(*DM_save_args)
+def test_core_08_parameter_cache(model,
+                     tutorial_name, #dont really need this
+                     ):
+    """cached parameters should match a fresh projDB read through writes and batches"""
+    def assert_cache_fresh():
+        pd.testing.assert_frame_equal(model.get_table_parameters(),
+                                      model.get_table_parameters(use_cache=False))
+    
+    assert_cache_fresh()
+    
+    #single write
+    model.set_parameter_value('finv_date', 'single')
+    assert_cache_fresh()
+    assert model.get_parameter_value('finv_date')=='single'
+    
+    #batched writes are only flushed on exit
+    with model.parameter_batch():
+        model.set_parameter_value('finv_date', 'batch')
+        assert model.get_parameter_value('finv_date')=='batch'
+        fresh_df = model.get_table_parameters(use_cache=False)
+        assert fresh_df.loc[fresh_df['varName']=='finv_date', 'value'].values[0]=='single'
+        
+    assert_cache_fresh()
+    assert model.get_parameter_value('finv_date')=='batch'
+    
+    #nothing written on failure
+    with pytest.raises(ValueError):
+        with model.parameter_batch():
+            model.set_parameter_value('finv_date', 'failed')
+            raise ValueError('abort')
+        
+    assert_cache_fresh()
+    assert model.get_parameter_value('finv_date')=='batch'
+
+
+
+
+@pytest.mark.parametrize(*DM_save_args)
+def test_core_09_unit_of_work(model,
+                     tutorial_name, #dont really need this
+                     ):
+    """tables and parameters set within a unit_of_work should only be written on exit"""
+    finv_dx = model.get_tables(['table_finv'])[0]
+    subset_dx = finv_dx.iloc[:2, :]
+    get_fresh_finv = lambda: model.parent.projDB_get_tables(model.get_table_names(['table_finv']),
+                                                        template_prefix=model.template_prefix_str)[0]
+    
+    #nothing written on failure
+    with pytest.raises(ValueError):
+        with model.unit_of_work():
+            model.set_tables({'table_finv':subset_dx})
+            raise ValueError('abort')
+        
+    assert len(get_fresh_finv())==len(finv_dx)
+    
+    #pending values are served until the commit
+    with model.unit_of_work():
+        model.set_tables({'table_finv':subset_dx})
+        model.set_parameter_value('finv_date', 'uow')
+        
+        assert len(model.get_tables(['table_finv'])[0])==2
+        assert model.get_parameter_value('finv_date')=='uow'
+        assert len(get_fresh_finv())==len(finv_dx)
+        
+    assert len(get_fresh_finv())==2
+    pd.testing.assert_frame_equal(model.get_table_parameters(),
+                                  model.get_table_parameters(use_cache=False))
+    assert model.get_parameter_value('finv_date')=='uow'
+    
+    #parameter values are the only write
+    with model.unit_of_work():
+        model.set_parameter_value('finv_date', 'uow_values')
+        
+    assert model.get_table_parameters(use_cache=False).set_index('varName').loc['finv_date', 'value']=='uow_values'
+    
+    #a parameters table is the only write
+    param_df = model.get_table_parameters()
+    param_df.loc[param_df['varName']=='finv_date', 'value'] = 'uow_table'
+    with model.unit_of_work():
+        model.set_tables({'table_parameters':param_df})
+        
+    fresh_df = model.parent.projDB_get_tables(model.get_table_names(['table_parameters']),
+                                              template_prefix=model.template_prefix_str)[0]
+    assert fresh_df.set_index('varName').loc['finv_date', 'value']=='uow_table'
+    assert model.get_parameter_value('finv_date')=='uow_table'
+
+
+
+
+@pytest.mark.parametrize(*DM_save_args)
+def test_core_10_get_model_tables_populated_d(model,
+                     tutorial_name, #dont really need this
+                     ):
+    """catalog checks should agree with loading the tables"""
+    populated_d = model.get_model_tables_populated_d()
+    
+    df_d = model.get_model_tables_all(result_as_dict=True)
+    
+    assert set(populated_d.keys())==set(df_d.keys())
+    for table_name, df in df_d.items():
+        assert populated_d[table_name]==(df.shape[0]>0), table_name
+
+
+
+
+
+@pytest.mark.parametrize(*DM_save_args)
+def test_core_11_cli(model,
+                     tutorial_name, #dont really need this
+                     ):
+    """run all models in the projDB without the dialogs"""
+    projDB_fp = model.parent.get_projDB_fp()
+    
+    assert cli_main([projDB_fp, '--log-level', 'DEBUG'])==0
+    
+    #check results were written
+    parent = Headless_projDB(projDB_fp, logger=conftest_logger)
+    parent.load_models()
+    for name, m in parent.get_models_d().items():
+        assert not pd.isnull(m.get_parameter_value('result_ead')), name
+        assert m.compute_status()=='complete', name
+        
+    #unknown models
+    assert cli_main([projDB_fp, '--models', 'xxx_99'])==2
+
+
+
+
+
+@pytest.mark.parametrize(*DM_save_args)
+def test_core_12_iter_models_pool(model,
+                     tutorial_name, #dont really need this
+                     ):
+    """computing in a worker process should match computing in this process"""
+    projDB_fp = model.parent.get_projDB_fp()
+    key = (model.category_code, model.modelid)
+    
+    progress_l = list()
+    result_l = list(iter_models_pool(projDB_fp, [key], max_workers=2,
+                                     progress_fn=lambda k, v: progress_l.append(v)))
+    
+    assert len(result_l)==1
+    assert result_l[0][0]==key
+    _, df_d, param_d, _ = result_l[0][1]
+    
+    #compare against this process
+    _, df_d_chk, param_d_chk = model.compute_model()
+    
+    assert param_d==param_d_chk
+    for table_name, df in df_d.items():
+        pd.testing.assert_frame_equal(df, df_d_chk[table_name], obj=table_name)
+        
+    assert progress_l==sorted(progress_l) and len(progress_l)>0
+
+
+
+
+@pytest.mark.parametrize(*DM_save_args)
+def test_core_13_run_model_mc(model,
+                     tutorial_name, #dont really need this
+                     ):
+    """Monte Carlo realizations w/o perturbation should reproduce the deterministic run"""
+    _, result_ead = model.run_model()
+    ead_df = model.get_tables(['table_ead'])[0]
+    
+    ead_stats_s, asset_ead_df, ead_s = model.run_model_mc(n_realizations=3, max_workers=1)
+    
+    assert ead_s.values==pytest.approx(result_ead, rel=1e-10)
+    assert asset_ead_df['q0.5'].values==pytest.approx(ead_df['ead'].values, rel=1e-10)
+    
+    #perturbed results should not depend on the chunking
+    dist_d = {'elev':('normal', {'scale':0.1}), 'vfunc':('lognormal', {'sigma':0.2})}
+    kwargs = dict(n_realizations=10, dist_d=dist_d, seed=0, max_workers=1)
+    
+    result_l = [model.run_model_mc(chunk_size=chunk_size, **kwargs) for chunk_size in [3, 10]]
+    
+    pd.testing.assert_series_equal(result_l[0][2], result_l[1][2])
+    pd.testing.assert_frame_equal(result_l[0][1], result_l[1][1])
+    assert ead_s.std()==0.0 and result_l[0][2].std()>0.0
+    
+    #worker processes should match the serial result
+    pool_result = model.run_model_mc(chunk_size=3, **{**kwargs, 'max_workers':2})
+    pd.testing.assert_series_equal(result_l[0][2], pool_result[2])
+    pd.testing.assert_frame_equal(result_l[0][1], pool_result[1])
+    
+    #capped asset bands are a seeded sample of the realizations (exact mean)
+    max_band_mb = len(asset_ead_df)*8*4/1e6 #4 realizations
+    band_l = [model.run_model_mc(chunk_size=chunk_size, max_band_mb=max_band_mb, **kwargs) for chunk_size in [3, 10]]
+    pd.testing.assert_frame_equal(band_l[0][1], band_l[1][1])
+    pd.testing.assert_series_equal(band_l[0][1]['mean'], result_l[0][1]['mean'])
+
+
+
+@pytest.mark.parametrize(*DM_save_args)
+def test_core_14_get_ead_tail_sweep(model,
+                     tutorial_name, #dont really need this
+                     ):
+    """each tail configuration in the sweep should match _set_ead_total()"""
+    _, result_ead = model.run_model()
+    impacts_s = model.get_tables(['table_impacts_prob'])[0].sum()
+    
+    configs_l = [dict()] #model parameters
+    for ead_lowPtail, ead_highPtail in itertools.product(['flat', 'extrapolate', 'none', 'user'], 
+                                                         ['none', 'extrapolate', 'user']):
+        configs_l.append(dict(ead_lowPtail=ead_lowPtail, ead_highPtail=ead_highPtail,
+                              ead_lowPtail_user=impacts_s.max()*1.5 if ead_lowPtail=='user' else None,
+                              ead_highPtail_user=0.9 if ead_highPtail=='user' else None))
+    
+    sweep_df = model.get_ead_tail_sweep(configs_l)
+    
+    assert len(sweep_df)==len(configs_l)
+    assert sweep_df['ead'].iloc[0]==pytest.approx(result_ead, rel=1e-12)
+    
+    for i, row in sweep_df.iloc[1:].iterrows():
+        _, ead = model._set_ead_total(write=False, 
+                          **{k:None if pd.isnull(v) else v for k,v in row.drop('ead').items()})
+        assert row['ead']==pytest.approx(ead, rel=1e-12), f'config {i} mismatch'
+    
+    #w/o the fancy tails the model-wide EAD is the sum of the asset EAD
+    flat_s = sweep_df.loc[(sweep_df['ead_lowPtail']=='flat') & (sweep_df['ead_highPtail']=='none'), 'ead']
+    assert flat_s.iloc[0]==pytest.approx(model._table_ead_to_db(write=False)['ead'].sum(), rel=1e-12)
+
+
+
+
+@pytest.mark.parametrize(*DM_save_args)
+def test_core_15_run_model_cache(model,
+                     tutorial_name, #dont really need this
+                     ):
+    """stages with unchanged inputs should be skipped"""
+    projDB_fp = model.parent.get_projDB_fp()
+    _, result_ead = model.run_model()
+    
+    #nothing changed
+    assert not any(model.get_stale_stages_d()[1].values())
+    
+    signature = get_sqlite_file_signature(projDB_fp)
+    assert model.run_model()[1]==result_ead
+    assert get_sqlite_file_signature(projDB_fp)==signature, 'cached run wrote to the projDB'
+    
+    #only the model-wide EAD depends on the tails
+    model.set_parameter_values({'ead_lowPtail':'none', 'ead_highPtail':'none'})
+    assert model.get_stale_stages_d()[1]=={'impacts':False, 'impacts_prob':False, 'ead':False, 'ead_total':True}
+    
+    assert model.run_model()[1]==model.run_model(use_cache=False)[1]
+
+
+
+
+@pytest.mark.parametrize(*DM_save_args)
+@pytest.mark.parametrize("max_memory_mb", [0.001, 0.1]) #one asset per chunk, a few chunks
+def test_core_16_run_model_chunked(model,
+                     tutorial_name, #dont really need this
+                     max_memory_mb,
+                     ):
+    """streaming the damages through the projDB in chunks should match the unchunked run"""
+    table_names = ['table_impacts', 'table_impacts_prob', 'table_ead', 'table_impacts_sum']
+    
+    _, result_ead = model.run_model(use_cache=False)
+    tables_d = model.get_tables(table_names, result_as_dict=True)
+    
+    _, result_ead_chunked = model.run_model(use_cache=False, max_memory_mb=max_memory_mb)
+    
+    assert result_ead_chunked==result_ead
+    for table_name, df in model.get_tables(table_names, result_as_dict=True).items():
+        pd.testing.assert_frame_equal(df, tables_d[table_name], check_exact=True, obj=table_name)
+
+
+
+@pytest.mark.parametrize(*DM_save_args)
+@pytest.mark.parametrize("impacts_storage", ['wide', 'wide_full'])
+def test_core_17_impacts_storage(model,
+                     tutorial_name, #dont really need this
+                     impacts_storage,
+                     ):
+    """compact table_impacts encodings should read back transparently"""
+    table_names = ['table_impacts', 'table_impacts_prob', 'table_ead', 'table_impacts_sum']
+    
+    _, result_ead = model.run_model()
+    tables_d = model.get_tables(table_names, result_as_dict=True)
+    
+    model.set_parameter_value('impacts_storage', impacts_storage)
+    assert model.run_model()[1]==result_ead
+    
+    for table_name, df in model.get_tables(table_names, result_as_dict=True).items():
+        if table_name=='table_impacts' and impacts_storage=='wide': #intermediates are dropped
+            df, tables_d[table_name] = df.loc[:, ['impact_capped']], tables_d[table_name].loc[:, ['impact_capped']]
+            
+        pd.testing.assert_frame_equal(df, tables_d[table_name], check_exact=True, obj=table_name)
+
+
+
+@pytest.mark.parametrize("precision", [1, 3])
+def test_core_18_vfunc_grid(precision):
+    """grid lookups should match interp_vfunc_curves exactly"""
+    rng = np.random.default_rng(0)
+    scale = 10**precision
+    
+    df = pd.concat([pd.DataFrame({'tag':f'tag{i}',
+                'exposure':np.sort(rng.choice(np.arange(-2*scale, 5*scale), 10, replace=False))/scale,
+                'impact':np.sort(rng.uniform(0, 100, 10))}) for i in range(20)], ignore_index=True)
+    
+    curves_d = get_vfunc_curves_cached(df, precision=precision)
+    assert get_vfunc_curves_cached(df.copy(), precision=precision) is curves_d, 'not cached'
+    
+    x_ar = np.round(rng.uniform(-3, 6, 1000), precision)
+    x_ar[::7] = np.nan
+    code_ar = rng.integers(0, 20, len(x_ar))
+    
+    grid_d = get_vfunc_curves_grid(curves_d, np.inf) #force the build
+    
+    result_ar = lookup_vfunc_grid(x_ar, code_ar, grid_d, curves_d['impact_max'])
+    
+    np.testing.assert_array_equal(result_ar, interp_vfunc_curves(x_ar, code_ar, curves_d['exposure'], 
+                        curves_d['impact'], curves_d['count'], left=0, right_ar=curves_d['impact_max']))
+    
+    #off-grid exposures fall back
+    assert lookup_vfunc_grid(x_ar+0.1/scale, code_ar, grid_d, curves_d['impact_max']) is None
+
+
+
+@pytest.mark.parametrize("offset", [0.0, 1e-7]) #on and off the rounding grid
+def test_core_19_impacts_backend(offset):
+    """the numba kernel should match the numpy chain bit-for-bit"""
+    pytest.importorskip('numba')
+    rng = np.random.default_rng(0)
+    
+    df = pd.concat([pd.DataFrame({'tag':f'tag{i}',
+                'exposure':np.sort(rng.choice(np.arange(-2000, 5000), n, replace=False))/1000,
+                'impact':np.sort(rng.uniform(0, 100, n))}) for i, n in enumerate(rng.integers(1, 12, 20))], 
+                   ignore_index=True)
+    
+    curves_d = get_vfunc_curves_cached(df)
+    
+    n = 10000
+    deps_ar = np.round(rng.uniform(-3, 6, n), 3) + offset
+    deps_ar[::7] = np.nan
+    deps_ar[::13] = curves_d['exposure'][0, 0] #exact hits
+    
+    kwargs = dict(curves_d=curves_d, code_ar=np.where(np.arange(n)%13==0, 0, rng.integers(0, 20, n)),
+                  scale_ar=np.where(np.arange(n)%11==0, np.nan, rng.uniform(0.5, 2, n)),
+                  cap_ar=np.where(np.arange(n)%5==0, np.nan, rng.uniform(0, 150, n)))
+    
+    for numpy_ar, numba_ar in zip(get_impacts_from_depths(deps_ar, backend='numpy', **kwargs),
+                                  get_impacts_from_depths(deps_ar, backend='numba', **kwargs)):
+        np.testing.assert_array_equal(numba_ar, numpy_ar)
+
+
+
+def test_core_19_impacts_fallback(monkeypatch, caplog):
+    """without numba the jit module should log and the default backend fall back to numpy"""
+    import importlib, sys, logging
+    import canflood2.hp.jit as jit
+    import canflood2.core as core
+    
+    #re-import w/o numba
+    monkeypatch.setitem(sys.modules, 'numba', None)
+    with caplog.at_level(logging.INFO, logger=jit.__name__):
+        importlib.reload(jit)
+    try:
+        assert not jit.numba_available
+        assert 'falling back to numpy' in caplog.text
+        assert jit.os.environ['NUMBA_CACHE_DIR'] #never the plugin directory
+        with pytest.raises(AssertionError):
+            jit.get_impacts_jit(np.zeros(1), np.zeros(1, dtype=int), None, np.ones(1), np.ones(1))
+    finally:
+        monkeypatch.undo()
+        importlib.reload(jit)
+    
+    #default backend
+    monkeypatch.setattr(core, 'numba_available', False)
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'tag':'tag0', 'exposure':[0.0, 1.0, 2.0], 'impact':[0.0, 50.0, 100.0]})
+    kwargs = dict(curves_d=get_vfunc_curves_cached(df), code_ar=np.zeros(100, dtype=int),
+                  scale_ar=np.ones(100), cap_ar=np.full(100, np.nan))
+    deps_ar = rng.uniform(-1, 3, 100)
+    
+    for default_ar, numpy_ar in zip(get_impacts_from_depths(deps_ar, **kwargs),
+                                    get_impacts_from_depths(deps_ar, backend='numpy', **kwargs)):
+        np.testing.assert_array_equal(default_ar, numpy_ar)
+
+
+
+@pytest.mark.parametrize(*DM_save_args)
+@pytest.mark.parametrize("impacts_storage", ['long', 'wide'])
+def test_core_20_float_dtype(model,
+                     tutorial_name, #dont really need this
+                     impacts_storage,
+                     ):
+    """float32 damages should be the float64 damages rounded (EAD accumulated in float64)"""
+    _, result_ead = model.run_model()
+    impacts_dx = model.get_tables(['table_impacts'])[0]
+    
+    model.set_parameter_value('impacts_storage', impacts_storage)
+    model.set_parameter_value('float_dtype', 'float32')
+    _, result_ead_f4 = model.run_model()
+    
+    columns = ['impact_capped'] if impacts_storage=='wide' else impacts_dx.columns
+    pd.testing.assert_frame_equal(model.get_tables(['table_impacts'])[0].loc[:, columns],
+                                  impacts_dx.loc[:, columns].astype('float32').astype(float), check_exact=True)
+    
+    assert result_ead_f4==pytest.approx(result_ead, rel=1e-6)
+
+
+
+@pytest.mark.parametrize(*DM_save_args)
+def test_core_21_run_profile(model,
+                     tutorial_name, #dont really need this
+                     ):
+    """each run should append one 08_run_profile row per stage (none for a cached run)"""
+    model.run_model()
+    
+    profile_df = model.parent.projDB_get_tables(['08_run_profile'])[0]
+    assert profile_df['run_id'].nunique()==1
+    assert profile_df['stage'].tolist()==['prechecks', 'impacts', 'impacts_prob', 'ead', 'ead_total', 'write']
+    assert (profile_df['wall_secs']>=0).all()
+    assert profile_df['peak_traced_mb'].isna().all()
+    
+    #impacts rows out are the impacts_prob rows in
+    stage_df = profile_df.set_index('stage')
+    assert stage_df.loc['impacts', 'rows_out']==stage_df.loc['impacts_prob', 'rows_in']
+    
+    #nothing changed
+    model.run_model()
+    assert len(model.parent.projDB_get_tables(['08_run_profile'])[0])==len(profile_df)
+
+
+
+@pytest.mark.parametrize("level", ['L1', 'L2'])
+def test_core_22_bench(level, tmpdir):
+    """synthetic benchmark case (no tutorial data)"""
+    df = run_case({'asset_cnt':50, 'event_cnt':3, 'fg_cnt':2, 'level':level}, work_dir=tmpdir)
+    
+    assert df['stage'].tolist()==['build', 'prechecks', 'impacts', 'impacts_prob', 'ead', 'ead_total', 'write', 'total']
+    assert df.loc[df['stage']=='impacts', 'rows_out'].iloc[0]==50*2*3
+    assert (df['wall_secs']>0).all()
+    
+    #against itself
+    cdf = compare_baseline(df, df)
+    assert len(cdf)==len(df)
+    assert not cdf['slower'].any()
+
+
+
+def test_core_23_bench_db(tmpdir):
+    """df_to_sql/sql_to_df time split (validation, sqlite, conversion)"""
+    df = run_bench_db(asset_cnt_l=[50], repeats=1, work_dir=tmpdir)
+    
+    assert set(df.index.unique('table'))==set(bench_db_tables_d.keys())
+    assert set(df.index.unique('op'))=={'write', 'read'}
+    
+    secs_df = df.loc[:, ['validation_secs', 'sqlite_secs', 'conversion_secs']]
+    assert (secs_df>=0).all().all()
+    assert (secs_df.sum(axis=1)>=df['total_secs']*0.999).all()
+    assert (df['sqlite_secs']>0).all()
+
+
+
+def test_core_24_expos_store(bench_model):
+    """table_expos is a view on a shared (content hashed) store table"""
+    model = bench_model
+    table_name = model.get_table_names(['table_expos'])[0]
+    expos_df = model.get_tables(['table_expos'])[0]
+    
+    def get_refs_d():
+        with sqlite3.connect(model.parent.get_projDB_fp()) as conn:
+            return get_expos_store_refs_d(conn)
+    
+    assert get_refs_d()=={get_expos_store_name(expos_df):[table_name]}
+    
+    #replace: old store table is dropped
+    model.set_tables({'table_expos':expos_df+1.0})
+    assert get_refs_d()=={get_expos_store_name(expos_df+1.0):[table_name]}
+    pd.testing.assert_frame_equal(model.get_tables(['table_expos'])[0], expos_df+1.0)
+    
+    #registered with the store table (like the compiler)
+    def set_expos(df, source_key):
+        model.set_tables({'table_expos':df})
+        model.append_project_tables({'09_expos_store':pd.DataFrame({
+            'table_name':[get_expos_store_name(df)], 'source_key':[source_key], 'finv_source':['finv'], 
+            'finv_indexField':['indexField'], 'event_names':['[]'], 'asset_cnt':[len(df)], 'created':['now']})})
+        assert model.parent.projDB_get_expos_shared(source_key) is None, 'written before the commit'
+        
+    with pytest.raises(KeyError): #nothing written on an exception
+        with model.unit_of_work():
+            set_expos(expos_df+2.0, 'failed')
+            raise KeyError('compile failed')
+    assert model.parent.projDB_get_expos_shared('failed') is None
+    
+    with model.unit_of_work():
+        set_expos(expos_df+2.0, 'compiled')
+    pd.testing.assert_frame_equal(model.parent.projDB_get_expos_shared('compiled'), expos_df+2.0, check_names=False)
+    
+    #drop the model table
+    model.parent.projDB_drop_tables(table_name)
+    assert get_refs_d()==dict()
+    assert model.parent.projDB_get_expos_shared('compiled') is None
+
+
+
+def test_core_25_projDB_session(bench_model):
+    """one long-lived connection per projDB (WAL) and read-only sessions for workers"""
+    model = bench_model
+    parent = model.parent
+    
+    conn = parent.projDB_get_conn()
+    assert parent.projDB_get_conn() is conn
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0]=='wal'
+    
+    model.run_model(use_cache=False)
+    assert parent.projDB_get_conn() is conn
+    
+    #read-only
+    ro_parent = Headless_projDB(parent.get_projDB_fp(), read_only=True)
+    assert not ro_parent.projDB_get_conn() is conn
+    assert len(ro_parent.projDB_get_tables(['03_model_suite_index'])[0])==1
+    
+    with pytest.raises(sqlite3.OperationalError):
+        ro_parent.projDB_drop_tables(model.get_table_names(['table_expos'])[0])
+        
+    #close
+    close_sqlite_conns(parent.get_projDB_fp())
+    assert not parent.projDB_get_conn() is conn
+
+
+
+def test_core_26_table_cache(bench_model):
+    """projDB_get_tables serves copies from the connection's cache until the table changes"""
+    model = bench_model
+    parent = model.parent
+    table_name = '04_haz_meta'
+    
+    df = parent.projDB_get_tables([table_name])[0]
+    cache = get_table_cache(parent.projDB_get_conn())
+    hits = cache.hits
+    
+    #served from the cache (as a copy)
+    df.iloc[0, 0] = 'mutated'
+    df1 = parent.projDB_get_tables([table_name])[0]
+    assert cache.hits==hits+1
+    assert not df1.iloc[0, 0]=='mutated'
+    
+    #written through the projDB
+    df1.loc[df1.index[0], 'value'] = 'set_tables'
+    parent.projDB_set_tables({table_name:df1})
+    pd.testing.assert_frame_equal(parent.projDB_get_tables([table_name])[0], df1)
+    
+    #written by another connection
+    df1.loc[df1.index[0], 'value'] = 'other'
+    with sqlite3.connect(parent.get_projDB_fp()) as conn:
+        df_to_sql(df1, table_name, conn)
+    pd.testing.assert_frame_equal(parent.projDB_get_tables([table_name])[0], df1)
+
+
+@pytest.mark.parametrize("impacts_storage", ['long', 'wide'])
+def test_core_27_bulk_to_sql(impacts_storage, bench_model, tmpdir):
+    """bulk_to_sql writes the same table (schema and rows) as DataFrame.to_sql"""
+    model = bench_model
+    model.run_model(use_cache=False)
+    df = model.get_tables(['table_impacts'])[0]
+    
+    if impacts_storage=='wide':
+        df = impacts_to_wide(df, impacts_storage)
+    else:
+        df = df.copy()
+    df.iloc[0, 0] = np.nan #NULL
+    
+    d = dict()
+    for k, write_func in {'bulk':bulk_to_sql, 'pandas':pd.DataFrame.to_sql}.items():
+        with sqlite3.connect(os.path.join(tmpdir, f'{k}.sqlite')) as conn:
+            write_func(df, 'table_impacts', conn, index=True, if_exists='replace')
+            write_func(df.iloc[:10], 'table_impacts', conn, index=True, if_exists='append')
+            d[k] = (conn.execute('SELECT type, name, sql FROM sqlite_master ORDER BY name').fetchall(),
+                    conn.execute('SELECT * FROM table_impacts').fetchall())
+        conn.close()
+    
+    assert d['bulk'][0]==d['pandas'][0], 'schema mismatch'
+    assert str(d['bulk'][1])==str(d['pandas'][1]), 'rows mismatch' #str for NULL/nan
+
+
+@pytest.mark.parametrize('bench_model', [dict(fg_cnt=2)], indirect=True)
+def test_core_28_table_keys(bench_model, tmpdir):
+    """model tables are keyed on the template index (stored by key when written in key order)"""
+    model = bench_model
+    model.run_model(use_cache=False)
+    
+    table_name = model.get_table_names(['table_impacts'])[0]
+    df = model.get_tables(['table_impacts'])[0]
+    
+    with model.parent.projDB_get_conn() as conn:
+        assert get_primary_key(conn, table_name)==['indexField', 'fg_index', 'event_names']
+        assert is_without_rowid(conn, table_name)
+        
+        plan = conn.execute(f'EXPLAIN QUERY PLAN SELECT * FROM [{table_name}] WHERE indexField=?', (1,)).fetchall()
+        assert 'PRIMARY KEY' in plan[0][-1], plan
+    
+    #rows passed out of key order keep their order (unique index on a rowid table)
+    shuffled_df = df.sample(frac=1.0, random_state=0)
+    with sqlite3.connect(os.path.join(tmpdir, 'shuffled.sqlite')) as conn:
+        df_to_sql(shuffled_df, table_name, conn, template_prefix=model.template_prefix_str)
+        assert not is_without_rowid(conn, table_name)
+        pd.testing.assert_index_equal(
+            sql_to_df(table_name, conn, template_prefix=model.template_prefix_str).index, shuffled_df.index)
+        
+        with pytest.raises(sqlite3.IntegrityError):
+            df_to_sql(shuffled_df.iloc[:1], table_name, conn, template_prefix=model.template_prefix_str, 
+                      if_exists='append')
+    conn.close()
+    
+    #binary (float32 blob) rows stay on a rowid table
+    with sqlite3.connect(os.path.join(tmpdir, 'binary.sqlite')) as conn:
+        df_to_sql(df, table_name, conn, template_prefix=model.template_prefix_str, float_dtype='float32')
+        assert not is_without_rowid(conn, table_name)
+        assert get_primary_key(conn, table_name)==[]
+        assert [r[2] for r in conn.execute(f'PRAGMA index_list([{table_name}])').fetchall()]==[1] #unique
+        
+        with pytest.raises(sqlite3.IntegrityError):
+            df_to_sql(df.xs(df.index[0][0], level='indexField', drop_level=False), table_name, conn, #all events
+                      template_prefix=model.template_prefix_str, float_dtype='float32', if_exists='append')
+    conn.close()
+
+
+@pytest.mark.parametrize("impacts_storage", ['long', 'wide'])
+@pytest.mark.parametrize("columns, filters", [
+    (None, {'indexField':[1, 2]}),
+    (['impact_capped'], {'event_names':'haz_0001', 'fg_index':0}),
+    (['impact'], None),
+    (None, {'indexField':list(range(-1000, 3))}), #several IN batches (the first is empty)
+    ])
+@pytest.mark.filterwarnings('error::FutureWarning') #pd.concat of empty batches
+def test_core_29_filtered_reads(impacts_storage, columns, filters, bench_model):
+    """columns and filters read in SQL match the same slice of the full table"""
+    model = bench_model
+    model.run_model(use_cache=False)
+    table_name = model.get_table_names(['table_impacts'])[0]
+    
+    #plain connection (no table cache)
+    with sqlite3.connect(model.parent.get_projDB_fp()) as conn:
+        df_to_sql(model.get_tables(['table_impacts'])[0], table_name, conn, template_prefix=model.template_prefix_str, 
+                  impacts_storage=impacts_storage)
+        full_df = sql_to_df(table_name, conn, template_prefix=model.template_prefix_str)
+        df = sql_to_df(table_name, conn, template_prefix=model.template_prefix_str, columns=columns, filters=filters)
+    conn.close()
+    
+    assert len(df)>0
+    pd.testing.assert_frame_equal(df, filter_df(full_df, columns=columns, filters=filters))
+    
+    #through the model
+    pd.testing.assert_frame_equal(model.get_tables(['table_impacts'], columns=columns, filters=filters)[0], df)